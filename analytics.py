@@ -0,0 +1,144 @@
+import math
+import time
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import text, bindparam
+from extensions import db
+
+PERCENTILES = (25, 50, 75, 90, 95, 99)
+PREFIX_DELIMITER = '_'
+# Safety net for multi-worker deployments: other processes' writes are only
+# seen here once the cached entry is this old
+CACHE_TTL_SECONDS = 300
+
+# SQL expression and the matching Python function for each grouping
+GROUPINGS = {
+    'all': ("'all'", lambda row: 'all'),
+    'day': ("date(created_at)", lambda row: row['created_at'].date().isoformat() if row['created_at'] else None),
+    'file_type': ("COALESCE(file_type, 'Unknown')", lambda row: row['file_type'] or 'Unknown'),
+    'prefix': (
+        f"CASE WHEN instr(filename, '{PREFIX_DELIMITER}') > 0 "
+        f"THEN substr(filename, 1, instr(filename, '{PREFIX_DELIMITER}') - 1) ELSE filename END",
+        lambda row: (row['filename'] or '').split(PREFIX_DELIMITER, 1)[0]
+    ),
+}
+
+
+def _percentile_columns() -> str:
+    # Lower and upper neighbours of each percentile rank; interpolated in Python
+    columns = []
+    for p in PERCENTILES:
+        position = f"CAST({p / 100.0} * (cnt - 1) AS INTEGER)"
+        columns.append(f"MAX(CASE WHEN rn = {position} + 1 THEN wer_score END) AS p{p}_lo")
+        columns.append(f"MAX(CASE WHEN rn = min({position} + 2, cnt) THEN wer_score END) AS p{p}_hi")
+    return ',\n               '.join(columns)
+
+
+def compute_wer_aggregates(group_by: str, groups: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+    """Mean, median and percentile WER per group, computed in SQLite with window functions"""
+    key_sql = GROUPINGS[group_by][0]
+    where = ''
+    params = {}
+    if groups is not None:
+        groups = list(groups)
+        if not groups:
+            return {}
+        where = f'AND {key_sql} IN :groups'
+        params['groups'] = groups
+    sql = text(f"""
+        WITH ranked AS (
+            SELECT {key_sql} AS grp, wer_score,
+                   ROW_NUMBER() OVER (PARTITION BY {key_sql} ORDER BY wer_score) AS rn,
+                   COUNT(*) OVER (PARTITION BY {key_sql}) AS cnt
+            FROM transcription
+            WHERE wer_score IS NOT NULL {where}
+        )
+        SELECT grp, cnt, AVG(wer_score) AS mean, MIN(wer_score) AS min, MAX(wer_score) AS max,
+               {_percentile_columns()}
+        FROM ranked
+        GROUP BY grp, cnt
+    """)
+    if groups is not None:
+        sql = sql.bindparams(bindparam('groups', expanding=True))
+    results = {}
+    for row in db.session.execute(sql, params).mappings():
+        count = row['cnt']
+        stats = {'count': count, 'mean': row['mean'], 'min': row['min'], 'max': row['max']}
+        for p in PERCENTILES:
+            rank = p / 100.0 * (count - 1)
+            fraction = rank - math.floor(rank)
+            lo, hi = row[f'p{p}_lo'], row[f'p{p}_hi']
+            stats[f'p{p}'] = lo + fraction * (hi - lo)
+        stats['median'] = stats['p50']
+        results[row['grp']] = stats
+    return results
+
+
+class AnalyticsCache:
+    """Per-group aggregate cache with incremental invalidation.
+
+    Saving or deleting an analysis only marks the groups that row belongs to
+    (its day, file type and filename prefix) as dirty; the next request
+    recomputes just those groups instead of the whole table.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._groups = {name: {} for name in GROUPINGS}
+            self._dirty = {name: set() for name in GROUPINGS}
+            self._loaded_at = {name: None for name in GROUPINGS}
+
+    def invalidate(self, rows: Iterable[Dict]):
+        """Mark the groups of the given rows (dicts of created_at, file_type, filename) dirty"""
+        with self._lock:
+            for row in rows:
+                for name, (_, key_func) in GROUPINGS.items():
+                    self._dirty[name].add(key_func(row))
+
+    def get(self, group_by: str) -> Dict[str, Dict]:
+        with self._lock:
+            loaded_at = self._loaded_at[group_by]
+            dirty = set(self._dirty[group_by])
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+            fresh = compute_wer_aggregates(group_by)
+            with self._lock:
+                self._groups[group_by] = fresh
+                self._dirty[group_by] -= dirty
+                self._loaded_at[group_by] = time.monotonic()
+                return dict(fresh)
+        if dirty:
+            fresh = compute_wer_aggregates(group_by, dirty)
+            with self._lock:
+                groups = self._groups[group_by]
+                for key in dirty:
+                    if key in fresh:
+                        groups[key] = fresh[key]
+                    else:
+                        groups.pop(key, None)  # group emptied by deletes
+                self._dirty[group_by] -= dirty
+        with self._lock:
+            return dict(self._groups[group_by])
+
+
+wer_analytics_cache = AnalyticsCache()
+
+
+def row_keys(transcription) -> Dict:
+    """The fields of a Transcription that decide its analytics groups"""
+    return {
+        'created_at': transcription.created_at,
+        'file_type': transcription.file_type,
+        'filename': transcription.filename,
+    }
+
+
+def wer_analytics(group_by: str) -> List[Dict]:
+    if group_by not in GROUPINGS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUPINGS)}")
+    groups = wer_analytics_cache.get(group_by)
+    return [dict(group=key, **stats) for key, stats in sorted(groups.items(), key=lambda item: str(item[0]))]
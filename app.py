@@ -1,32 +1,165 @@
-from flask import Flask, render_template, request, jsonify, send_file, session
-from datetime import datetime
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 import os
 from werkzeug.utils import secure_filename
-import json
 from extensions import db
 from file_handler import FileHandler
+from asr_backends import backend_options, create_backend, get_backend, set_backend
+from inference_scheduler import SchedulerBusy, inference_scheduler
 from nlp_processor import NLPProcessor
-from wer_calculator import WERCalculator
-from pydub import AudioSegment
+from wer_calculator import WERCalculator, normalize_text
 import io
 import re
-import whisper
+import tempfile
+from sqlalchemy import text as sql_text
+from metrics import init_metrics, timed
+from profiling import init_profiling, note_inputs, profile_store
+from result_store import ResultNotFound, result_store
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this in production
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///wer_analysis.db'
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///wer_analysis.db')
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['IMPORT_MAX_CONTENT_LENGTH'] = None  # /api/import streams, so no size cap
+app.config['PLOT_CACHE_DIR'] = 'plot_cache'  # rendered PDF figures, see plot_cache.py
+app.config['PLOT_PRERENDER'] = True  # render PDF figures in the background after saving
+app.config['PLOT_RENDER_WORKERS'] = min(4, os.cpu_count() or 1)  # warm Kaleido processes
+app.config['PLOT_RENDER_TIMEOUT'] = 60  # seconds per batch of figures
+app.config['PDF_CHART_BACKEND'] = 'vector'  # 'vector' (ReportLab drawings) or 'plotly' (Kaleido PNGs)
+app.config['PDF_MAX_PAGES'] = 200  # upper bound for ?max_pages on /api/download-pdf
+app.config['BATCH_REPORT_DIR'] = 'batch_reports'
+app.config['BATCH_REPORT_MAX_ANALYSES'] = 1000
+app.config['COMPARE_MAX_HYPOTHESES'] = 20  # hypotheses per /api/compare-hypotheses call
+app.config['WARMUP_ON_START'] = os.environ.get('WARMUP_ON_START', '1') == '1'  # load ASR/NLP models once serving
+# 'whisper', 'faster-whisper', or 'fake' (fixed text after ASR_FAKE_LATENCY seconds) for load tests,
+# see asr_backends.py and benchmarks/asr_accuracy.py for the speed/accuracy of each mode
+app.config['ASR_BACKEND'] = os.environ.get('ASR_BACKEND', 'whisper')
+app.config['ASR_MODE'] = os.environ.get('ASR_MODE', 'fp32')  # whisper: 'fp32' or 'int8' (dynamic quantization)
+app.config['ASR_COMPUTE_TYPE'] = os.environ.get('ASR_COMPUTE_TYPE', 'int8')  # faster-whisper
+app.config['ASR_BEAM_SIZE'] = int(os.environ.get('ASR_BEAM_SIZE', '0'))  # 0 = greedy decoding
+app.config['ASR_TEMPERATURE_FALLBACK'] = os.environ.get('ASR_TEMPERATURE_FALLBACK', '1') == '1'
+app.config['ASR_FAKE_TEXT'] = os.environ.get('ASR_FAKE_TEXT', '')
+app.config['ASR_FAKE_LATENCY'] = float(os.environ.get('ASR_FAKE_LATENCY', '0'))
+app.config['ASR_FAKE_RTF'] = float(os.environ.get('ASR_FAKE_RTF', '0'))
+app.config['ASR_FAKE_CPU_BOUND'] = os.environ.get('ASR_FAKE_CPU_BOUND', '0') == '1'
+# Concurrent ASR inferences, torch threads per inference (default cores // slots), queued
+# requests and how long one may wait for a slot before getting 503 + Retry-After
+app.config['INFERENCE_SLOTS'] = int(os.environ.get('INFERENCE_SLOTS', '1'))
+app.config['INFERENCE_THREADS_PER_SLOT'] = int(os.environ.get('INFERENCE_THREADS_PER_SLOT', '0')) or None
+app.config['INFERENCE_MAX_QUEUE'] = int(os.environ.get('INFERENCE_MAX_QUEUE', '16'))
+app.config['INFERENCE_DEADLINE'] = float(os.environ.get('INFERENCE_DEADLINE', '120'))
+inference_scheduler.slots = app.config['INFERENCE_SLOTS']
+inference_scheduler.threads_per_slot = app.config['INFERENCE_THREADS_PER_SLOT']
+inference_scheduler.max_queue = app.config['INFERENCE_MAX_QUEUE']
+inference_scheduler.deadline = app.config['INFERENCE_DEADLINE']
+set_backend(create_backend(app.config['ASR_BACKEND'], **backend_options(app.config)))
+# Per-request profiling (X-Profile: 1 or ?profile=1 plus X-Admin-Token), see profiling.py
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '0') == '1'
+app.config['PROFILING_TOKEN'] = os.environ.get('PROFILING_TOKEN', '')
+app.config['PROFILE_DIR'] = 'profiles'
+app.config['PROFILE_MAX_FILES'] = 50
+app.config['PROFILE_MAX_AGE_DAYS'] = 7
+
+# Stage/request timings: Prometheus text at /metrics, Server-Timing on /api/ responses
+init_metrics(app)
+
+# Admin-only request profiles, listed at /api/admin/profiles
+init_profiling(app)
+profile_store.directory = app.config['PROFILE_DIR']
+profile_store.max_files = app.config['PROFILE_MAX_FILES']
+profile_store.max_age_days = app.config['PROFILE_MAX_AGE_DAYS']
+
+# Uploads, transcripts and NLP results between requests, by opaque id (see result_store.py)
+app.config['RESULT_STORE_PATH'] = os.environ.get('RESULT_STORE_PATH', os.path.join(app.instance_path, 'results.db'))
+app.config['RESULT_TTL_SECONDS'] = int(os.environ.get('RESULT_TTL_SECONDS', '3600'))
+result_store.path = app.config['RESULT_STORE_PATH']
+result_store.ttl = app.config['RESULT_TTL_SECONDS']
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-db.init_app(app)
+# SQLite tuning (WAL, busy timeout, pool) is applied while binding db to the app
+from persistence import init_persistence
+init_persistence(app)
 
 # Import models after db initialization
-from models import Transcription
+from models import Transcription, preload_blobs, preload_texts
+from migrations import run_migrations
+from history_query import parse_history_args, paginate, apply_filters
+from analytics import wer_analytics
+from persistence import (save_analysis as save_analysis_record, delete_analysis as delete_analysis_record,
+                         delete_all_analyses as delete_all_records)
+import error_stats
+import history_io
+from plot_cache import plot_image_cache
+from plot_renderer import plot_renderer
+import report_pdf
+from report_jobs import report_jobs
+report_jobs.output_dir = app.config['BATCH_REPORT_DIR']
+plot_image_cache.cache_dir = app.config['PLOT_CACHE_DIR']
+plot_renderer.workers = app.config['PLOT_RENDER_WORKERS']
+plot_renderer.timeout = app.config['PLOT_RENDER_TIMEOUT']
+
+def init_db():
+    # Create missing tables and bring older databases up to the current schema
+    with app.app_context():
+        db.create_all()
+        run_migrations(db)
+
+init_db()
+
+# Whisper/spaCy load in the background; text-only routes are served meanwhile
+from warmup import warmup
+
+@app.before_request
+def start_warmup():
+    # On the first request of each server process, not at import: the batch CLI and other
+    # scripts import app too, and must not load models or fork their pools with a loader running
+    if app.config['WARMUP_ON_START'] and not warmup.started:
+        warmup.start()
 
-model = whisper.load_model("base")  # or your preferred model size
+def stored_value(data, field, kind):
+    # Value behind an id in the request body; ResultNotFound (404) if it has expired
+    result_id = data.get(field)
+    return result_store.require(result_id, kind) if result_id else None
+
+def summary_query():
+    # Transcription query that loads only the summary columns
+    from sqlalchemy.orm import load_only
+    columns = [getattr(Transcription, name) for name in Transcription.SUMMARY_COLUMNS]
+    return Transcription.query.options(load_only(*columns))
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: 200 once the database answers; ?require=asr,nlp also waits for those models
+    components = warmup.status()
+    try:
+        db.session.execute(sql_text('SELECT 1'))
+        database = 'ready'
+    except Exception as e:
+        database = f'error: {e}'
+    required = [name for name in request.args.get('require', '').split(',') if name]
+    unknown = [name for name in required if name not in components]
+    if unknown:
+        return jsonify({'status': 'error', 'message': f"Unknown components: {', '.join(unknown)}"}), 400
+    ready = database == 'ready' and all(components[name]['status'] == 'ready' for name in required)
+    body = {'status': 'ready' if ready else 'not ready', 'database': database, 'components': components}
+    return jsonify(body), 200 if ready else 503
+
+@app.route('/api/warmup', methods=['POST'])
+def warmup_endpoint():
+    # Start loading models in the background, e.g. {"components": ["asr", "nlp", "plot_renderer"]}
+    data = request.get_json(silent=True) or {}
+    try:
+        warmup.start(data.get('components'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'components': warmup.status()}), 202
 
 @app.route('/')
 def index():
@@ -38,8 +171,13 @@ def wer_analysis():
 
 @app.route('/history')
 def history():
-    transcriptions = Transcription.query.order_by(Transcription.created_at.desc()).all()
-    return render_template('history.html', transcriptions=transcriptions)
+    try:
+        params = parse_history_args(request.args)
+    except ValueError as e:
+        return str(e), 400
+    page = paginate(summary_query(), params)
+    return render_template('history.html', transcriptions=page['items'],
+                           next_cursor=page['next_cursor'], total=page.get('total'), filters=request.args)
 
 @app.route('/api/transcribe', methods=['POST'])
 def transcribe():
@@ -53,6 +191,7 @@ def transcribe():
         # If webm, convert to wav and transcribe directly
         if filename.endswith('.webm'):
             try:
+                from pydub import AudioSegment
                 audio = AudioSegment.from_file(file, format='webm')
                 wav_io = io.BytesIO()
                 audio.export(wav_io, format='wav')
@@ -64,17 +203,23 @@ def transcribe():
                 text = handler.extract_text_from_audio(temp_wav_path)
                 os.remove(temp_wav_path)
                 return jsonify({'status': 'success', 'text': text})
+            except SchedulerBusy:
+                raise
             except Exception as e:
                 return jsonify({'error': f'Failed to process webm audio: {str(e)}'}), 500
         file_path = handler.save_file(file, filename)
         if not file_path:
             return jsonify({'error': 'File could not be saved'}), 500
-        session['uploaded_filename'] = filename
-        return jsonify({'status': 'success', 'message': 'File uploaded'})
+        upload_id = result_store.put('upload', {'filename': filename})
+        # Only the id goes into the cookie; API clients can send it back as upload_id instead
+        session['upload_id'] = upload_id
+        return jsonify({'status': 'success', 'message': 'File uploaded', 'upload_id': upload_id})
     # Step 2: Transcribe
-    filename = session.get('uploaded_filename')
-    if not filename:
+    upload_id = (request.get_json(silent=True) or {}).get('upload_id') or request.form.get('upload_id') \
+        or session.get('upload_id')
+    if not upload_id:
         return jsonify({'error': 'No file uploaded in session'}), 400
+    filename = result_store.require(upload_id, 'upload')['filename']
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     if not os.path.exists(file_path):
         return jsonify({'error': 'File not found on server'}), 404
@@ -82,206 +227,168 @@ def transcribe():
     if 'error' in result and result['error']:
         return jsonify({'status': 'error', 'message': result['error']}), 400
     text = result['text']
-    return jsonify({'status': 'success', 'text': text})
+    return jsonify({'status': 'success', 'text': text, 'text_id': result_store.put('text', text)})
 
 @app.route('/api/whisper-transcribe', methods=['POST'])
 def whisper_transcribe():
     if 'file' not in request.files:
         return jsonify({'status': 'error', 'message': 'No file uploaded.'}), 400
     file = request.files['file']
-    temp_path = 'temp_audio.wav'
+    # One temp file per request, so concurrent recordings don't overwrite each other
+    fd, temp_path = tempfile.mkstemp(suffix='.wav', dir=app.config['UPLOAD_FOLDER'])
+    os.close(fd)
     file.save(temp_path)
     try:
-        result = model.transcribe(temp_path)
-        return jsonify({'status': 'success', 'text': result['text']})
+        text = inference_scheduler.run(get_backend().transcribe, temp_path, 'base', stage=get_backend().name)
+        return jsonify({'status': 'success', 'text': text})
+    except SchedulerBusy:
+        raise
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
-
-def normalize_text(text):
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
-    text = re.sub(r'\s+', ' ', text).strip()  # Normalize whitespace
-    return text
+    finally:
+        os.remove(temp_path)
 
 @app.route('/api/calculate-wer', methods=['POST'])
 def calculate_wer():
+    # Texts and NLP results can be sent inline or as ids from /api/transcribe, /api/process-reference
+    # and /api/preprocess
     data = request.json
-    transcribed_text = data.get('transcribed_text', '')
-    reference_text = data.get('reference_text', '')
-    transcribed_nlp = data.get('transcribed_nlp')
-    reference_nlp = data.get('reference_nlp')
-
-    print('Transcribed:', transcribed_text)
-    print('Reference:', reference_text)
+    transcribed_text = data.get('transcribed_text') or stored_value(data, 'transcribed_text_id', 'text') or ''
+    reference_text = data.get('reference_text') or stored_value(data, 'reference_text_id', 'text') or ''
+    transcribed_nlp = data.get('transcribed_nlp') or stored_value(data, 'transcribed_nlp_id', 'nlp')
+    reference_nlp = data.get('reference_nlp') or stored_value(data, 'reference_nlp_id', 'nlp')
 
     if not transcribed_text or not reference_text:
         return jsonify({'status': 'error', 'message': 'Both texts are required'}), 400
 
+    note_inputs(transcribed_words=len(transcribed_text.split()), reference_words=len(reference_text.split()))
+
     # Normalize both texts before WER calculation
-    ref_norm = normalize_text(reference_text)
-    hyp_norm = normalize_text(transcribed_text)
+    with timed('normalize'):
+        ref_norm = normalize_text(reference_text)
+        hyp_norm = normalize_text(transcribed_text)
 
     wer_calc = WERCalculator()
-    analysis = wer_calc.analyze_texts(ref_norm, hyp_norm)
-
-    # Add word difference list and statistics for the frontend
-    ref_words = wer_calc.transformation(ref_norm)
-    hyp_words = wer_calc.transformation(hyp_norm)
-
-    # Word difference list (simple diff for now)
-    import difflib
-    diff = list(difflib.ndiff(ref_words, hyp_words))
-    word_differences = []
-    for d in diff:
-        if d.startswith('- '):
-            word_differences.append({'type': 'deleted', 'text': d[2:]})
-        elif d.startswith('+ '):
-            word_differences.append({'type': 'inserted', 'text': d[2:]})
-        elif d.startswith('? '):
-            continue
-        else:
-            word_differences.append({'type': 'normal', 'text': d[2:]})
-
-    # Statistics
-    statistics = {
-        'Word Count': {
-            'transcribed': len(hyp_words),
-            'reference': len(ref_words)
-        },
-        'Unique Words': {
-            'transcribed': len(set(hyp_words)),
-            'reference': len(set(ref_words))
-        }
+    results = wer_calc.build_results(ref_norm, hyp_norm)
+    results['nlp_results'] = {
+        'transcribed': transcribed_nlp or {},
+        'reference': reference_nlp or {}
     }
+    return jsonify({'status': 'success', 'results': results})
 
-    # Prepare plots for frontend (convert Plotly figures to JSON)
-    from plotly.utils import PlotlyJSONEncoder
-    import json as pyjson
-    plots = analysis['plots']
-    plots_json = {}
-    for key, fig in plots.items():
-        plots_json[key] = pyjson.loads(pyjson.dumps(fig, cls=PlotlyJSONEncoder))
-    
-    results = {
-        'wer_score': analysis['wer_score'],
-        'differences': analysis['differences'],
-        'word_differences': word_differences,
-        'statistics': statistics,
-        'plots': plots_json,
-        'nlp_results': {
-            'transcribed': transcribed_nlp if transcribed_nlp is not None else pyjson.loads(session.get('transcribedNLP', '{}')),
-            'reference': reference_nlp if reference_nlp is not None else pyjson.loads(session.get('referenceNLP', '{}'))
-        }
-    }
+@app.route('/api/compare-hypotheses', methods=['POST'])
+def compare_hypotheses():
+    # {"reference_text": ..., "hypotheses": {"whisper-base": ..., "vendor": ...}} (or a list of {"name", "text"})
+    data = request.get_json(silent=True) or {}
+    reference_text = data.get('reference_text', '')
+    hypotheses = data.get('hypotheses') or {}
+    if not isinstance(reference_text, str):
+        return jsonify({'status': 'error', 'message': 'reference_text must be a string'}), 400
+    if isinstance(hypotheses, list):
+        if not all(isinstance(item, dict) and 'name' in item and 'text' in item for item in hypotheses):
+            return jsonify({'status': 'error', 'message': 'Each hypothesis needs a name and a text'}), 400
+        names = [item['name'] for item in hypotheses]
+        if not all(isinstance(name, str) for name in names):
+            return jsonify({'status': 'error', 'message': 'Hypothesis names must be strings'}), 400
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            return jsonify({'status': 'error', 'message': f"Duplicate hypothesis names: {', '.join(duplicates)}"}), 400
+        hypotheses = {item['name']: item['text'] for item in hypotheses}
+    elif not isinstance(hypotheses, dict):
+        return jsonify({'status': 'error', 'message': 'hypotheses must be an object or a list'}), 400
+    if not reference_text or not hypotheses:
+        return jsonify({'status': 'error', 'message': 'A reference and at least one hypothesis are required'}), 400
+    if len(hypotheses) > app.config['COMPARE_MAX_HYPOTHESES']:
+        return jsonify({'status': 'error',
+                        'message': f"At most {app.config['COMPARE_MAX_HYPOTHESES']} hypotheses per request"}), 400
+    if not all(isinstance(text, str) for text in hypotheses.values()):
+        return jsonify({'status': 'error', 'message': 'Hypothesis texts must be strings'}), 400
+    note_inputs(reference_words=len(reference_text.split()), hypotheses=len(hypotheses),
+                hypothesis_words=sum(len(text.split()) for text in hypotheses.values()))
+    with timed('normalize'):
+        ref_norm = normalize_text(reference_text)
+        hyp_norm = {name: normalize_text(text) for name, text in hypotheses.items()}
+    if not ref_norm:
+        # WER is undefined without reference words; werpy would score every hypothesis 0
+        return jsonify({'status': 'error', 'message': 'Reference text is empty after normalization'}), 400
+    results = WERCalculator().build_comparison_results(ref_norm, hyp_norm)
     return jsonify({'status': 'success', 'results': results})
 
 @app.route('/api/save-analysis', methods=['POST'])
 def save_analysis():
     data = request.json
-    print('SAVE ANALYSIS PAYLOAD:', data)
-    filename = data.get('filename', 'Analysis')
-    transcribed_text = data.get('transcribed_text', '')
-    reference_text = data.get('reference_text', '')
-    wer_results = data.get('wer_results', {})
-    nlp_results = data.get('nlp_results', {})
-    file_metadata = data.get('file_metadata', {})
-    # Ensure created date in file_metadata
-    if not file_metadata.get('created'):
-        file_metadata['created'] = datetime.now().isoformat()
-    # Use provided file_metadata if available, fallback only if missing fields
-    if file_metadata:
-        # Fill missing fields if any
-        if not file_metadata.get('filename') or not file_metadata.get('type') or not file_metadata.get('size'):
-            if 'recording' in filename.lower() or filename.lower().endswith('.webm'):
-                file_metadata['filename'] = file_metadata.get('filename', 'Voice Recording')
-                file_metadata['extension'] = file_metadata.get('extension', 'webm')
-                file_metadata['type'] = file_metadata.get('type', 'Audio')
-                file_metadata['size'] = file_metadata.get('size', len(transcribed_text.encode('utf-8')))
-            else:
-                ext = filename.split('.')[-1].lower() if '.' in filename else ''
-                file_metadata['filename'] = file_metadata.get('filename', filename)
-                file_metadata['extension'] = file_metadata.get('extension', ext)
-                if ext in ['mp3', 'wav', 'webm']:
-                    file_metadata['type'] = file_metadata.get('type', 'Audio')
-                elif ext in ['mp4', 'mkv']:
-                    file_metadata['type'] = file_metadata.get('type', 'Video')
-                elif ext in ['jpg', 'jpeg', 'png']:
-                    file_metadata['type'] = file_metadata.get('type', 'Image')
-                else:
-                    file_metadata['type'] = file_metadata.get('type', 'Unknown')
-                if not file_metadata.get('size'):
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    if os.path.exists(file_path):
-                        file_metadata['size'] = os.path.getsize(file_path)
-                    else:
-                        file_metadata['size'] = len(transcribed_text.encode('utf-8'))
-    else:
-        file_metadata = {}
-        if 'recording' in filename.lower() or filename.lower().endswith('.webm'):
-            file_metadata['filename'] = 'Voice Recording'
-            file_metadata['extension'] = 'webm'
-            file_metadata['type'] = 'Audio'
-            file_metadata['size'] = len(transcribed_text.encode('utf-8'))
-        else:
-            ext = filename.split('.')[-1].lower() if '.' in filename else ''
-            file_metadata['filename'] = filename
-            file_metadata['extension'] = ext
-            if ext in ['mp3', 'wav', 'webm']:
-                file_metadata['type'] = 'Audio'
-            elif ext in ['mp4', 'mkv']:
-                file_metadata['type'] = 'Video'
-            elif ext in ['jpg', 'jpeg', 'png']:
-                file_metadata['type'] = 'Image'
-            else:
-                file_metadata['type'] = 'Unknown'
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.exists(file_path):
-                file_metadata['size'] = os.path.getsize(file_path)
-            else:
-                file_metadata['size'] = len(transcribed_text.encode('utf-8'))
-    # After finalizing file_metadata, set the top-level filename to match file_metadata['filename'] if present
-    filename = file_metadata.get('filename', filename)
-    # Ensure differences, word_differences, statistics are present
-    differences = wer_results.get('differences', [])
-    word_differences = wer_results.get('word_differences', [])
-    statistics = wer_results.get('statistics', {})
-    plots = wer_results.get('plots', {
-        'confusion_matrix': {'data': [], 'layout': {}},
-        'word_count_comparison': {'data': [], 'layout': {}},
-        'statistics_plot': {'data': [], 'layout': {}},
-        'radar_chart': {'data': [], 'layout': {}}
-    })
-    wer_score = wer_results.get('wer_score', 0.0)
-    analysis_results = {
-        'wer_score': wer_score,
-        'differences': differences,
-        'word_differences': word_differences,
-        'statistics': statistics,
-        'plots': plots
-    }
-    transcription = Transcription(
-        filename=filename,
-        transcribed_text=transcribed_text,
-        reference_text=reference_text,
-        wer_score=wer_score,
-        nlp_results=json.dumps(nlp_results),
-        analysis_results=json.dumps(analysis_results),
-        file_metadata=json.dumps(file_metadata)
-    )
-    db.session.add(transcription)
-    db.session.commit()
+    transcription = save_analysis_record(data)
+    if app.config['PLOT_PRERENDER'] and app.config['PDF_CHART_BACKEND'] == 'plotly':
+        plot_image_cache.prerender_async(transcription.id, (data.get('wer_results') or {}).get('plots'))
     return jsonify({'status': 'success', 'message': 'Analysis saved'})
 
+def history_page_response(query, serialize, preload=None):
+    # Shared JSON response for the paginated history endpoints; preload(rows) batch-loads
+    # what serialize reads per row, and its result is held until the page is serialized
+    try:
+        params = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    page = paginate(query, params)
+    preloaded = preload(page['items']) if preload else None  # noqa: F841
+    response = {
+        'status': 'success',
+        'analyses': [serialize(t) for t in page['items']],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more']
+    }
+    if 'total' in page:
+        response['total'] = page['total']
+    return jsonify(response)
+
 @app.route('/api/history', methods=['GET'])
 def api_history():
-    transcriptions = Transcription.query.order_by(Transcription.created_at.desc()).all()
-    return jsonify({'status': 'success', 'analyses': [t.to_dict() for t in transcriptions]})
+    include_blobs = request.args.get('include_blobs', '1').lower() not in ('0', 'false', 'no')
+    # Texts and (with include_blobs) the artifacts of the whole page come in one query each
+    preload = (lambda rows: preload_texts(rows) + preload_blobs(rows)) if include_blobs else preload_texts
+    return history_page_response(Transcription.query, lambda t: t.to_dict(include_blobs=include_blobs),
+                                 preload=preload)
+
+@app.route('/api/export', methods=['GET'])
+def export_history():
+    # Streaming NDJSON/CSV export of the history, optionally gzip-compressed
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'status': 'error', 'message': 'format must be ndjson or csv'}), 400
+    # Plots, diffs and NLP output are included by default so a re-import loses nothing
+    include_blobs = request.args.get('include_blobs', '1').lower() not in ('0', 'false', 'no')
+    compress = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    try:
+        fields = history_io.parse_fields(request.args.get('fields'), include_blobs)
+        filters = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    filename = f"wer_history.{fmt}" + ('.gz' if compress else '')
+    mimetype = 'application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    body = history_io.iter_export(fmt, fields, include_blobs, compress, filters)
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/api/import', methods=['POST'])
+def import_history():
+    # Streaming import of an /api/export file sent as the raw request body
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'status': 'error', 'message': 'format must be ndjson or csv'}), 400
+    # Exports are far larger than MAX_CONTENT_LENGTH; per-request limits need Flask >= 3.1
+    request.max_content_length = app.config.get('IMPORT_MAX_CONTENT_LENGTH')
+    compressed = request.headers.get('Content-Encoding') == 'gzip' or \
+        request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    try:
+        result = history_io.import_stream(request.stream, fmt, compressed)
+    except (OSError, EOFError) as e:
+        return jsonify({'status': 'error', 'message': f'Could not read import stream: {e}'}), 400
+    return jsonify({'status': 'success', **result})
 
 @app.route('/api/delete-analysis/<int:id>', methods=['DELETE'])
 def delete_analysis(id):
     transcription = Transcription.query.get_or_404(id)
-    db.session.delete(transcription)
-    db.session.commit()
+    delete_analysis_record(transcription)
     return jsonify({'status': 'success', 'message': 'Analysis deleted'})
 
 @app.route('/api/process-reference', methods=['POST'])
@@ -298,7 +405,7 @@ def process_reference():
         return jsonify({'error': 'File could not be saved'}), 500
     result = handler.process_file(file_path)
     text = result['text']
-    return jsonify({'status': 'success', 'text': text})
+    return jsonify({'status': 'success', 'text': text, 'text_id': result_store.put('text', text)})
 
 @app.route('/api/preprocess', methods=['POST'])
 def preprocess():
@@ -308,7 +415,7 @@ def preprocess():
         return jsonify({'error': 'No text provided'}), 400
     processor = NLPProcessor()
     results = processor.process_text(text)
-    return jsonify({'status': 'success', 'results': results})
+    return jsonify({'status': 'success', 'results': results, 'nlp_id': result_store.put('nlp', results)})
 
 @app.route('/api/get-analysis/<int:id>', methods=['GET'])
 def get_analysis(id):
@@ -341,466 +448,126 @@ def get_analysis(id):
 
 @app.route('/api/get-history', methods=['GET'])
 def get_history():
-    transcriptions = Transcription.query.order_by(Transcription.created_at.desc()).all()
-    analyses = []
-    from datetime import datetime
-    for t in transcriptions:
-        d = t.to_dict()
-        # Parse metadata for sidebar
-        try:
-            metadata = json.loads(d['file_metadata']) if d['file_metadata'] else {}
-        except Exception:
-            metadata = {}
-        # Parse plots for sidebar (just WER score and filename)
-        try:
-            analysis_results = json.loads(d['analysis_results']) if d['analysis_results'] else {}
-        except Exception:
-            analysis_results = {}
-        # Use friendlier label for filename
-        filename = metadata.get('filename') or d.get('filename') or 'Manual Analysis'
-        # Always set a creation date
-        created = metadata.get('created') or d.get('created_at') or datetime.now().isoformat()
-        try:
-            created_str = (datetime.fromisoformat(created).isoformat() if created else None)
-        except Exception:
-            created_str = None
-        analyses.append({
-            'id': d.get('id'),
-            'wer_score': float(analysis_results.get('wer_score', d.get('wer_score', 0.0)) or 0.0),
-            'metadata': {
-                'filename': filename,
-                'created': created_str,
-                'extension': metadata.get('extension', 'N/A'),
-                'size': metadata.get('size', 'N/A')
-            },
-        })
-    return jsonify({'status': 'success', 'analyses': analyses})
+    # Sidebar listing: read only the indexed summary columns, never the JSON blobs
+    return history_page_response(summary_query(), lambda t: t.to_summary_dict())
 
 @app.route('/api/delete-all-analyses', methods=['DELETE'])
 def delete_all_analyses():
-    Transcription.query.delete()
-    db.session.commit()
+    delete_all_records()
     return jsonify({'status': 'success', 'message': 'All analyses deleted'})
 
+@app.route('/api/error-stats', methods=['GET'])
+def error_stats_endpoint():
+    # Top-K substitution pairs, deleted words or inserted words across all saved analyses
+    kind = request.args.get('kind', 'substitution')
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 1000)
+        errors = error_stats.top_errors(kind, limit)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'kind': kind, 'errors': errors})
+
+@app.route('/api/analytics/wer', methods=['GET'])
+def wer_analytics_endpoint():
+    # Mean/median/percentile WER per day, file type, filename prefix or overall
+    group_by = request.args.get('group_by', 'day')
+    try:
+        groups = wer_analytics(group_by)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'group_by': group_by, 'groups': groups})
+
+@app.errorhandler(SchedulerBusy)
+def inference_busy(e):
+    response = jsonify({'status': 'error', 'message': str(e), 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+@app.errorhandler(ResultNotFound)
+def result_not_found(e):
+    return jsonify({'status': 'error', 'message': str(e)}), 404
+
+@app.route('/api/results/status', methods=['GET'])
+def results_status():
+    # Live entries and bytes per kind in the intermediate-result store
+    return jsonify({'status': 'success', 'ttl_seconds': result_store.ttl, 'results': result_store.stats()})
+
+@app.route('/api/inference/status', methods=['GET'])
+def inference_status():
+    # Slots, queue depth, rejections and average inference time of the ASR scheduler
+    return jsonify({'status': 'success', 'scheduler': inference_scheduler.stats()})
+
+@app.route('/api/plot-renderer/status', methods=['GET'])
+def plot_renderer_status():
+    # Worker count, queue depth and timeouts of the PDF figure renderer
+    return jsonify({'status': 'success', 'renderer': plot_renderer.stats()})
+
 @app.route('/api/download-pdf/<int:id>', methods=['GET'])
 def download_pdf(id):
-    import io
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.utils import ImageReader
-    from reportlab.lib import colors
-    import plotly.io as pio
+    # ?mode=summary leaves out the texts and detailed differences; ?max_pages caps long transcripts
     transcription = Transcription.query.get_or_404(id)
-    analysis = transcription.to_dict()
-    # Fix: Only json.loads if needed
-    analysis_results_raw = analysis['analysis_results']
-    if isinstance(analysis_results_raw, str):
-        wer_results = json.loads(analysis_results_raw) if analysis_results_raw else {}
-    else:
-        wer_results = analysis_results_raw if analysis_results_raw else {}
-    nlp_results_raw = analysis['nlp_results']
-    if isinstance(nlp_results_raw, str):
-        nlp_results = json.loads(nlp_results_raw) if nlp_results_raw else {}
-    else:
-        nlp_results = nlp_results_raw if nlp_results_raw else {}
-    plots = wer_results.get('plots', {})
-    # Create PDF
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    y = height - 40
-    # Helper for section headings
-    def section_heading(text, y, c, width, size=15):
-        c.setFont('Helvetica-Bold', size)
-        c.drawString(30, y, text)
-        y -= 6
-        c.setStrokeColor(colors.grey)
-        c.setLineWidth(1)
-        c.line(30, y, width-30, y)
-        y -= 18
-        return y
+    mode = request.args.get('mode', 'full')
+    if mode not in report_pdf.MODES:
+        return jsonify({'status': 'error', 'message': f"mode must be one of: {', '.join(report_pdf.MODES)}"}), 400
     try:
-        y = section_heading("WER Analysis Report", y, c, width, 18)
-        c.setFont('Helvetica', 12)
-        c.drawString(30, y, f"WER Score: {wer_results.get('wer_score', analysis.get('wer_score', 0.0)):.2%}")
-        y -= 18
-        c.drawString(30, y, f"Created: {analysis.get('created_at', '')}")
-        y -= 24
-    except Exception as e:
-        print('PDF HEADER ERROR:', e)
-        c.setFont('Helvetica', 12)
-        c.drawString(30, y, "[Header not available]")
-        y -= 20
-    # File Metadata Section (like History page)
+        max_pages = min(int(request.args.get('max_pages', app.config['PDF_MAX_PAGES'])), app.config['PDF_MAX_PAGES'])
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'max_pages must be an integer'}), 400
+    note_inputs(analysis_id=id, transcribed_words=len((transcription.transcribed_text or '').split()),
+                reference_words=len((transcription.reference_text or '').split()))
+    body = report_pdf.render_report(transcription, mode, max(max_pages, 1), app.config['PDF_CHART_BACKEND'])
+    return Response(body, mimetype='application/pdf',
+                    headers={'Content-Disposition': f'attachment; filename=wer_analysis_{id}.pdf'})
+
+@app.route('/api/reports/batch', methods=['POST'])
+def create_batch_report():
+    # {"ids": [...]} or {"filters": {history filter args}}, "format": "zip"|"merged", optional "mode"/"max_pages"
+    data = request.get_json(silent=True) or {}
+    fmt = data.get('format', 'zip')
+    mode = data.get('mode', 'full')
+    limit = app.config['BATCH_REPORT_MAX_ANALYSES']
     try:
-        meta = analysis.get('file_metadata') or analysis.get('metadata') or {}
-        y = section_heading("File Information", y, c, width, 14)
-        c.setFont('Helvetica', 11)
-        file_info_lines = []
-        file_info_lines.append(f"Filename: {meta.get('filename', 'Voice Recording')}")
-        file_info_lines.append(f"Type: {meta.get('type', 'Unknown')}")
-        size = meta.get('size')
-        if size:
-            if size < 1024:
-                size_str = f"{size} bytes"
-            elif size < 1024*1024:
-                size_str = f"{size/1024:.1f} KB"
-            else:
-                size_str = f"{size/1024/1024:.2f} MB"
+        if mode not in report_pdf.MODES:
+            raise ValueError(f"mode must be one of: {', '.join(report_pdf.MODES)}")
+        max_pages = max(min(int(data.get('max_pages', app.config['PDF_MAX_PAGES'])), app.config['PDF_MAX_PAGES']), 1)
+        if data.get('ids') is not None:
+            ids = data['ids']
+            # bool is an int subclass; a string would otherwise be split into digits
+            if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                raise ValueError('ids must be a list of integers')
+            ids = list(dict.fromkeys(ids))
         else:
-            size_str = 'N/A'
-        file_info_lines.append(f"Size: {size_str}")
-        created = meta.get('created')
-        if created:
-            from datetime import datetime
-            try:
-                created_str = datetime.fromisoformat(created).strftime('%m/%d/%Y, %I:%M:%S %p')
-            except Exception:
-                created_str = str(created)
-        else:
-            created_str = 'N/A'
-        file_info_lines.append(f"{created_str}")
-        for line in file_info_lines:
-            c.drawString(40, y, line)
-            y -= 14
-        y -= 6
-    except Exception as e:
-        print('PDF FILE INFO ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(40, y, "[File information not available]")
-        y -= 14
-    # Transcribed Text
-    try:
-        y = section_heading("Transcribed Text", y, c, width, 14)
-        c.setFont('Helvetica', 11)
-        for line in split_text_to_lines(analysis.get('transcribed_text', ''), 90):
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 60:
-                c.showPage(); y = height - 40
-        y -= 16
-    except Exception as e:
-        print('PDF TRANSCRIBED TEXT ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(40, y, "[Transcribed text not available]")
-        y -= 14
-    # Reference Text
-    try:
-        y = section_heading("Reference Text", y, c, width, 14)
-        c.setFont('Helvetica', 11)
-        for line in split_text_to_lines(analysis.get('reference_text', ''), 90):
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 60:
-                c.showPage(); y = height - 40
-        y -= 16
-    except Exception as e:
-        print('PDF REFERENCE TEXT ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(40, y, "[Reference text not available]")
-        y -= 14
-    # Word Differences (use word_differences logic for counts)
-    try:
-        y = section_heading("Word Differences", y, c, width, 14)
-        c.setFont('Helvetica', 11)
-        word_diffs = wer_results.get('word_differences', analysis.get('word_differences', []))
-        deletions = substitutions = insertions = 0
-        i = 0
-        while i < len(word_diffs):
-            if word_diffs[i].get('type') == 'deleted' and i+1 < len(word_diffs) and word_diffs[i+1].get('type') == 'inserted':
-                substitutions += 1
-                i += 2
-            elif word_diffs[i].get('type') == 'inserted':
-                insertions += 1
-                i += 1
-            elif word_diffs[i].get('type') == 'deleted':
-                deletions += 1
-                i += 1
-            elif word_diffs[i].get('type') == 'substituted':
-                substitutions += 1
-                i += 1
-            else:
-                i += 1
-        c.setFont('Helvetica-Bold', 11)
-        c.drawString(40, y, f"Deletions: ")
-        c.setFont('Helvetica', 11)
-        c.drawString(110, y, str(deletions))
-        c.setFont('Helvetica-Bold', 11)
-        c.drawString(180, y, f"Substitutions: ")
-        c.setFont('Helvetica', 11)
-        c.drawString(270, y, str(substitutions))
-        c.setFont('Helvetica-Bold', 11)
-        c.drawString(350, y, f"Insertions: ")
-        c.setFont('Helvetica', 11)
-        c.drawString(420, y, str(insertions))
-        y -= 18
-    except Exception as e:
-        print('PDF WORD DIFFERENCES ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(40, y, "[Word differences not available]")
-        y -= 14
-    # Detailed Word Differences (as paragraph, with improved highlights)
-    try:
-        y = section_heading("Detailed Word Differences", y, c, width, 14)
-        c.setFont('Helvetica', 11)
-        word_diffs = wer_results.get('word_differences', analysis.get('word_differences', []))
-        x = 40
-        start_x = 40
-        max_x = width - 40
-        space_width = c.stringWidth(' ', 'Helvetica', 11)
-        highlight_height = 12  # Reduced height
-        highlight_offset = 2   # Offset to align with text baseline
-        i = 0
-        while i < len(word_diffs):
-            diff = word_diffs[i]
-            # Substitution: deleted followed by inserted (correction)
-            if (diff.get('type') == 'deleted' and i+1 < len(word_diffs) and word_diffs[i+1].get('type') == 'inserted'):
-                # Original (deleted, yellow background for substitution)
-                word = diff['text']
-                word_width = c.stringWidth(word, 'Helvetica', 11)
-                c.setFillColorRGB(0.996, 0.953, 0.78)  # yellow
-                c.setStrokeColorRGB(0.996, 0.953, 0.78)
-                c.rect(x-2, y-highlight_offset, word_width+4, highlight_height, fill=1, stroke=0)
-                c.setFillColorRGB(0.7, 0.27, 0.04)
-                c.drawString(x, y, word)
-                x += word_width + space_width
-                # Correction (inserted, blue underline)
-                corr = word_diffs[i+1]
-                corr_word = corr['text']
-                corr_width = c.stringWidth(corr_word, 'Helvetica', 11)
-                c.setFillColorRGB(0.12, 0.25, 0.67)  # blue
-                c.drawString(x, y, corr_word)
-                # Draw underline
-                underline_y = y-1
-                underline_x = x
-                underline_w = corr_width
-                c.setStrokeColorRGB(0.12, 0.51, 0.96)
-                c.setLineWidth(2)
-                c.line(underline_x, underline_y, underline_x+underline_w, underline_y)
-                x += corr_width + space_width
-                i += 2
-            elif diff.get('type') == 'substituted':
-                word = diff['text']
-                word_width = c.stringWidth(word, 'Helvetica', 11)
-                c.setFillColorRGB(0.996, 0.953, 0.78)  # yellow
-                c.setStrokeColorRGB(0.996, 0.953, 0.78)
-                c.rect(x-2, y-highlight_offset, word_width+4, highlight_height, fill=1, stroke=0)
-                c.setFillColorRGB(0.7, 0.27, 0.04)
-                c.drawString(x, y, word)
-                x += word_width + space_width
-                i += 1
-            elif diff.get('type') == 'inserted':
-                word = diff['text']
-                word_width = c.stringWidth(word, 'Helvetica-Oblique', 11)
-                c.setFont('Helvetica-Oblique', 11)
-                c.setFillColorRGB(0,0,0)
-                c.drawString(x, y, word)
-                # Draw strikethrough
-                strike_y = y+2
-                strike_x = x
-                strike_w = word_width
-                c.setStrokeColorRGB(0,0,0)
-                c.setLineWidth(1)
-                c.line(strike_x, strike_y, strike_x+strike_w, strike_y)
-                x += word_width + space_width
-                c.setFont('Helvetica', 11)
-                i += 1
-            elif diff.get('type') == 'deleted':
-                word = diff['text']
-                word_width = c.stringWidth(word, 'Helvetica', 11)
-                c.setFillColorRGB(0.725, 0.11, 0.11)  # red
-                c.setStrokeColorRGB(0.725, 0.11, 0.11)
-                c.rect(x-2, y-highlight_offset, word_width+4, highlight_height, fill=1, stroke=0)
-                c.setFillColorRGB(1,1,1)
-                c.drawString(x, y, word)
-                x += word_width + space_width
-                i += 1
-            else:
-                word = diff['text']
-                word_width = c.stringWidth(word, 'Helvetica', 11)
-                c.setFillColorRGB(0,0,0)
-                c.drawString(x, y, word)
-                x += word_width + space_width
-                i += 1
-            # Wrap to next line if needed
-            if x > max_x:
-                x = start_x
-                y -= 16
-                if y < 60:
-                    c.showPage(); y = height - 40
-        y -= 18
-    except Exception as e:
-        print('PDF DETAILED WORD DIFFERENCES ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(40, y, "[Detailed word differences not available]")
-        y -= 14
-    # Edit Operations Table (horizontal, comma-separated, matching Detailed Word Differences logic, with wrapping)
-    try:
-        y = section_heading("Edit Operations Table", y, c, width, 14)
-        word_diffs = wer_results.get('word_differences', analysis.get('word_differences', []))
-        substituted, inserted, deleted = [], [], []
-        i = 0
-        while i < len(word_diffs):
-            if word_diffs[i].get('type') == 'deleted' and i+1 < len(word_diffs) and word_diffs[i+1].get('type') == 'inserted':
-                substituted.append(word_diffs[i]['text'])
-                i += 2
-            elif word_diffs[i].get('type') == 'inserted':
-                inserted.append(word_diffs[i]['text'])
-                i += 1
-            elif word_diffs[i].get('type') == 'deleted':
-                deleted.append(word_diffs[i]['text'])
-                i += 1
-            elif word_diffs[i].get('type') == 'substituted':
-                substituted.append(word_diffs[i]['text'])
-                i += 1
-            else:
-                i += 1
-        c.setFont('Helvetica-Bold', 11)
-        col_width = (width - 80) // 3
-        col_xs = [40, 40 + col_width, 40 + 2*col_width]
-        col_titles = ["Substituted:", "Inserted:", "Deleted:"]
-        col_colors = [ (0.8, 0.6, 0), (0,0,0), (0.8, 0, 0) ]
-        col_words = [substituted, inserted, deleted]
-        # Draw headings
-        for idx, (title, color) in enumerate(zip(col_titles, col_colors)):
-            c.setFillColorRGB(*color)
-            c.drawString(col_xs[idx], y, title)
-        y -= 14
-        c.setFont('Helvetica', 10)
-        max_lines = 0
-        # Draw words in columns, wrapping as needed
-        for idx, (words, color) in enumerate(zip(col_words, col_colors)):
-            c.setFillColorRGB(*color)
-            x = col_xs[idx]
-            line = ''
-            line_y = y
-            for w in words:
-                w_str = w + ', '
-                w_width = c.stringWidth(line + w_str, 'Helvetica', 10)
-                if w_width > col_width - 10 and line:
-                    c.drawString(x, line_y, line.rstrip(', '))
-                    line_y -= 12
-                    line = ''
-                line += w_str
-            if line:
-                c.drawString(x, line_y, line.rstrip(', '))
-                line_y -= 12
-            if idx == 0:
-                max_lines = max(max_lines, (y - line_y) // 12 + 1)
-            else:
-                max_lines = max(max_lines, (y - line_y) // 12 + 1)
-        y -= max_lines * 12 + 6
-    except Exception as e:
-        print('PDF EDIT OPERATIONS TABLE ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(40, y, "[Edit operations table not available]")
-        y -= 14
-    # Statistics Table (black heading)
-    try:
-        stats = wer_results.get('statistics', analysis.get('statistics', {}))
-        if stats:
-            y = section_heading("Statistics", y, c, width, 14)
-            c.setFillColorRGB(0,0,0)
-            c.setFont('Helvetica-Bold', 11)
-            c.drawString(40, y, "Metric"); c.drawString(180, y, "Transcribed"); c.drawString(320, y, "Reference")
-            y -= 14
-            c.setFont('Helvetica', 11)
-            for metric, values in stats.items():
-                c.drawString(40, y, str(metric))
-                c.drawString(180, y, str(values.get('transcribed', '')))
-                c.drawString(320, y, str(values.get('reference', '')))
-                y -= 14
-                if y < 60:
-                    c.showPage(); y = height - 40
-            y -= 10
-    except Exception as e:
-        print('PDF STATISTICS ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(40, y, "[Statistics not available]")
-        y -= 14
-    # NLP Results (black heading)
-    try:
-        if nlp_results:
-            y = section_heading("NLP Analysis Results", y, c, width, 14)
-            c.setFillColorRGB(0,0,0)
-            for label, nlp in nlp_results.items():
-                c.setFont('Helvetica-Bold', 12)
-                c.drawString(40, y, f"{label.title()} Analysis:")
-                y -= 14
-                c.setFont('Helvetica', 10)
-                for key, value in nlp.items():
-                    c.setFont('Helvetica-Bold', 10)
-                    c.drawString(50, y, f"{key.replace('_', ' ').title()}:")
-                    y -= 12
-                    c.setFont('Helvetica', 10)
-                    if isinstance(value, list):
-                        # Print horizontally with bullets, wrap as needed
-                        line = ''
-                        for v in value:
-                            item = f"• {v} "
-                            if len(line) + len(item) > 100:
-                                c.drawString(65, y, line.strip())
-                                y -= 11
-                                if y < 60:
-                                    c.showPage(); y = height - 40
-                                line = ''
-                            line += item
-                        if line:
-                            c.drawString(65, y, line.strip())
-                            y -= 11
-                            if y < 60:
-                                c.showPage(); y = height - 40
-                    else:
-                        for line in split_text_to_lines(str(value), 90):
-                            c.drawString(65, y, line)
-                            y -= 11
-                            if y < 60:
-                                c.showPage(); y = height - 40
-                    y -= 4
-                y -= 8
-    except Exception as e:
-        print('PDF NLP RESULTS ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(40, y, "[NLP results not available]")
-        y -= 14
-    # Plots (high-res, avoid cutting off last graph)
-    try:
-        y = section_heading("Visualizations", y, c, width, 14)
-        for plot_name in ['confusion_matrix', 'word_count_comparison', 'statistics_plot', 'radar_chart', 'linear_regression', 'bar_chart']:
-            if plot_name in plots:
-                try:
-                    # Generate higher resolution image (scale=3)
-                    img_bytes = pio.to_image(plots[plot_name], format='png', scale=3)
-                    img = ImageReader(io.BytesIO(img_bytes))
-                    # Check if enough space is left, else start new page
-                    if y < 220:
-                        c.showPage(); y = height - 40
-                    # Center image
-                    c.drawImage(img, width/2-125, y-180, width=250, height=150)
-                    y -= 180
-                    c.setFont('Helvetica-Oblique', 10)
-                    c.drawCentredString(width/2, y-10, plot_name.replace('_', ' ').title())
-                    y -= 30
-                    if y < 100:
-                        c.showPage(); y = height - 40
-                except Exception as e:
-                    print(f'PDF PLOT ERROR ({plot_name}):', e)
-                    c.setFont('Helvetica', 11)
-                    c.drawString(30, y, f"[{plot_name.replace('_', ' ').title()} not available]")
-                    y -= 18
-    except Exception as e:
-        print('PDF VISUALIZATIONS ERROR:', e)
-        c.setFont('Helvetica', 11)
-        c.drawString(30, y, "[Visualizations not available]")
-        y -= 14
-    c.save()
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f'wer_analysis_{id}.pdf', mimetype='application/pdf')
-
-def split_text_to_lines(text, max_len):
-    # Helper to split long text into lines for PDF
-    import textwrap
-    return textwrap.wrap(text, max_len)
+            filters = parse_history_args(data.get('filters') or {})
+            query = apply_filters(Transcription.query.with_entities(Transcription.id), filters)
+            ids = [row.id for row in query.order_by(Transcription.created_at.desc(), Transcription.id.desc())
+                   .limit(limit + 1)]
+        if not ids:
+            raise ValueError('No analyses selected')
+        if len(ids) > limit:
+            raise ValueError(f'At most {limit} analyses per batch report')
+        job = report_jobs.submit(ids, fmt, mode, max_pages, app.config['PDF_CHART_BACKEND'],
+                                 db.engine.url.render_as_string(hide_password=False))
+    except (ValueError, TypeError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', **job.to_dict()}), 202
+
+@app.route('/api/reports/batch/<job_id>', methods=['GET'])
+def batch_report_status(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown or expired job'}), 404
+    return jsonify({'status': 'success', **job.to_dict()})
+
+@app.route('/api/reports/batch/<job_id>/download', methods=['GET'])
+def batch_report_download(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown or expired job'}), 404
+    if job.status != 'done':
+        return jsonify({'status': 'error', 'message': f'Job is {job.status}', **job.to_dict()}), 409
+    mimetype = 'application/zip' if job.format == 'zip' else 'application/pdf'
+    return Response(report_pdf.iter_file(open(job.output_path, 'rb')), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={job.download_name}'})
 
 if __name__ == '__main__':
     with app.app_context():
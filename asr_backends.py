@@ -0,0 +1,226 @@
+"""Speech recognition backends.
+
+FileHandler and the transcription routes go through the active backend
+instead of calling Whisper directly. The backend is chosen with
+ASR_BACKEND:
+- 'whisper' runs openai-whisper, in fp32 or, with ASR_MODE=int8, with its
+  linear layers dynamically quantized to int8.
+- 'faster-whisper' runs the CTranslate2 port, where installed.
+- 'fake' returns fixed text after a configurable delay, so the
+  upload/transcribe routes can be load tested (benchmarks/load_test.py)
+  without running a model.
+
+ASR_BEAM_SIZE and ASR_TEMPERATURE_FALLBACK cap decoding work for the real
+backends. benchmarks/asr_accuracy.py reports the accuracy/speed tradeoff.
+"""
+import os
+import time
+import threading
+from typing import Dict, Optional
+
+MODES = ('fp32', 'int8')
+# openai-whisper's default: retry at higher temperatures when a segment looks degenerate
+TEMPERATURE_FALLBACK = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+# Loaded Whisper models by (size, mode), shared across requests
+_whisper_models = {}
+_whisper_lock = threading.Lock()
+
+
+def _quantize_int8(model):
+    """Dynamic int8 quantization of the Linear layers (weights int8, activations quantized per batch)"""
+    import torch
+    # whisper.model.Linear subclasses nn.Linear only to cast weights for fp16; the
+    # quantizer matches exact types, so turn them back into plain nn.Linear first
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_whisper_model(name: str = "base", mode: str = 'fp32'):
+    """Load a Whisper model once per process and reuse it"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown ASR mode '{mode}', expected one of: {', '.join(MODES)}")
+    key = (name, mode)
+    if key not in _whisper_models:
+        with _whisper_lock:
+            if key not in _whisper_models:
+                import whisper
+                model = whisper.load_model(name, device='cpu' if mode == 'int8' else None)
+                _whisper_models[key] = _quantize_int8(model) if mode == 'int8' else model
+    return _whisper_models[key]
+
+
+def whisper_model_loaded(name: str = "base", mode: str = 'fp32') -> bool:
+    return (name, mode) in _whisper_models
+
+
+def _temperature(fallback: bool):
+    return TEMPERATURE_FALLBACK if fallback else 0.0
+
+
+class ASRBackend:
+    """Turns an audio file into text"""
+    name = 'asr'
+
+    def load(self, model_name: str = 'base'):
+        """Load whatever the backend needs before the first request"""
+
+    def is_loaded(self, model_name: str = 'base') -> bool:
+        return True
+
+    def transcribe(self, file_path: str, model_name: str = 'base') -> str:
+        raise NotImplementedError
+
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper; beam_size None keeps greedy decoding, fallback=False decodes at temperature 0 only"""
+    name = 'whisper'
+
+    def __init__(self, mode: str = 'fp32', beam_size: Optional[int] = None, fallback: bool = True):
+        if mode not in MODES:
+            raise ValueError(f"Unknown ASR mode '{mode}', expected one of: {', '.join(MODES)}")
+        self.mode = mode
+        self.beam_size = beam_size
+        self.fallback = fallback
+
+    def decode_options(self) -> Dict:
+        # fp16 only applies on GPU; on CPU whisper would warn and fall back anyway
+        options = {'temperature': _temperature(self.fallback), 'fp16': False}
+        if self.beam_size:
+            options['beam_size'] = self.beam_size
+        return options
+
+    def load(self, model_name: str = 'base'):
+        load_whisper_model(model_name, self.mode)
+
+    def is_loaded(self, model_name: str = 'base') -> bool:
+        return whisper_model_loaded(model_name, self.mode)
+
+    def transcribe(self, file_path: str, model_name: str = 'base') -> str:
+        return load_whisper_model(model_name, self.mode).transcribe(file_path, **self.decode_options())['text']
+
+
+class FasterWhisperBackend(ASRBackend):
+    """faster-whisper (CTranslate2) on CPU; int8 compute by default"""
+    name = 'faster-whisper'
+
+    def __init__(self, compute_type: str = 'int8', beam_size: Optional[int] = None, fallback: bool = True,
+                 cpu_threads: int = 0):
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+        self.fallback = fallback
+        self.cpu_threads = cpu_threads
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model_name: str):
+        if model_name not in self._models:
+            with self._lock:
+                if model_name not in self._models:
+                    try:
+                        from faster_whisper import WhisperModel
+                    except ImportError as e:
+                        raise RuntimeError('ASR_BACKEND=faster-whisper needs the faster-whisper package') from e
+                    self._models[model_name] = WhisperModel(model_name, device='cpu', compute_type=self.compute_type,
+                                                            cpu_threads=self.cpu_threads)
+        return self._models[model_name]
+
+    def load(self, model_name: str = 'base'):
+        self._model(model_name)
+
+    def is_loaded(self, model_name: str = 'base') -> bool:
+        return model_name in self._models
+
+    def transcribe(self, file_path: str, model_name: str = 'base') -> str:
+        # Greedy like openai-whisper unless a beam is configured (faster-whisper defaults to 5)
+        segments, _ = self._model(model_name).transcribe(file_path, beam_size=self.beam_size or 1,
+                                                         temperature=_temperature(self.fallback))
+        return ''.join(segment.text for segment in segments)
+
+
+class FakeBackend(ASRBackend):
+    """Deterministic stand-in for load tests: same text for every file after a fixed delay.
+
+    latency is charged per call plus rtf seconds per second of audio (from
+    the container header, like the transcription planner). cpu_bound burns
+    that much CPU time instead of sleeping, to mimic a model competing for cores.
+    """
+    name = 'fake'
+    DEFAULT_TEXT = 'the quick brown fox jumps over the lazy dog'
+
+    def __init__(self, text: str = DEFAULT_TEXT, latency: float = 0.0, rtf: float = 0.0, cpu_bound: bool = False):
+        self.text = text
+        self.latency = latency
+        self.rtf = rtf
+        self.cpu_bound = cpu_bound
+        self.calls = 0
+
+    def _delay(self, file_path: str) -> float:
+        delay = self.latency
+        if self.rtf:
+            from media_probe import default_prober
+            try:
+                delay += self.rtf * (default_prober.probe(file_path).get('duration') or 0.0)
+            except OSError:
+                pass
+        return delay
+
+    def transcribe(self, file_path: str, model_name: str = 'base') -> str:
+        delay = self._delay(file_path)
+        if self.cpu_bound:
+            # CPU time of this thread, so concurrent calls slow each other down like real inference
+            end = time.thread_time() + delay
+            while time.thread_time() < end:
+                pass
+        elif delay:
+            time.sleep(delay)
+        self.calls += 1
+        return self.text
+
+
+BACKENDS = {'whisper': WhisperBackend, 'faster-whisper': FasterWhisperBackend, 'fake': FakeBackend}
+
+_backend: Optional[ASRBackend] = None
+
+
+def create_backend(name: str, **options) -> ASRBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend '{name}', expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
+
+
+def set_backend(backend: ASRBackend):
+    global _backend
+    _backend = backend
+
+
+def get_backend() -> ASRBackend:
+    """The process-wide backend; Whisper unless configured otherwise"""
+    global _backend
+    if _backend is None:
+        _backend = WhisperBackend()
+    return _backend
+
+
+def backend_options(config: Dict) -> Dict:
+    """Backend keyword arguments from the ASR_* app config"""
+    name = config.get('ASR_BACKEND', 'whisper')
+    decoding = {'beam_size': config.get('ASR_BEAM_SIZE') or None,
+                'fallback': bool(config.get('ASR_TEMPERATURE_FALLBACK', True))}
+    if name == 'whisper':
+        return dict(decoding, mode=config.get('ASR_MODE', 'fp32'))
+    if name == 'faster-whisper':
+        # One CTranslate2 thread pool per inference slot, like the torch pinning
+        slots = config.get('INFERENCE_SLOTS') or 1
+        threads = config.get('INFERENCE_THREADS_PER_SLOT') or max(1, (os.cpu_count() or 1) // slots)
+        return dict(decoding, compute_type=config.get('ASR_COMPUTE_TYPE', 'int8'), cpu_threads=threads)
+    if name != 'fake':
+        return {}
+    return {
+        'text': config.get('ASR_FAKE_TEXT') or FakeBackend.DEFAULT_TEXT,
+        'latency': float(config.get('ASR_FAKE_LATENCY', 0.0)),
+        'rtf': float(config.get('ASR_FAKE_RTF', 0.0)),
+        'cpu_bound': bool(config.get('ASR_FAKE_CPU_BOUND', False)),
+    }
@@ -0,0 +1,407 @@
+"""Headless batch ingestion of media + ground-truth reference pairs.
+
+Walks a directory (or reads a CSV/JSONL manifest) of media/reference pairs,
+runs FileHandler.process_file -> normalization -> WERCalculator on a process
+pool, writes the results to the Transcription table in batches and appends one
+line per pair to a CSV or JSONL summary. The summary doubles as the resume
+journal: pairs already recorded as 'ok' are skipped on the next run.
+
+With --corpus, references found in a token_store corpus are not re-read by
+each worker: they are scored straight from the shared memory-mapped token
+arrays (WER and S/D/I only, no plots), and the normalized reference text
+is stored with the analysis.
+
+Example (the bundled sample pair):
+    python batch_ingest.py uploads --summary batch_summary.jsonl
+"""
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+
+MEDIA_EXTENSIONS = {'.mp3', '.wav', '.mp4', '.mkv', '.webm'}
+REFERENCE_EXTENSIONS = {'.txt', '.pdf', '.docx'}
+STAGES = ['extract_media', 'extract_reference', 'normalize', 'score', 'db_write']
+SUMMARY_FIELDS = ['key', 'status', 'media', 'reference', 'wer_score', 'reference_words',
+                  'hypothesis_words', 'duration', 'error', 'finished_at']
+
+# Per-process FileHandler/WERCalculator, created on first use inside each worker
+_worker_state = {}
+
+
+def pair_key(media: str, reference: str) -> str:
+    return f"{os.path.abspath(media)}|{os.path.abspath(reference)}"
+
+
+def discover_pairs(directory: str, default_reference: Optional[str] = None) -> List[Tuple[str, str]]:
+    """Pair media files with the reference document sharing their file stem.
+
+    Media without a same-stem reference fall back to default_reference, or to
+    the only reference document in the directory when there is exactly one
+    (as with uploads/harvard.wav + uploads/Ground_Truth_-_02.txt).
+    """
+    media, references = [], {}
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            stem, ext = os.path.splitext(name)
+            path = os.path.join(root, name)
+            if ext.lower() in MEDIA_EXTENSIONS and '_audio' not in stem and '_chunk_' not in stem:
+                media.append(path)
+            elif ext.lower() in REFERENCE_EXTENSIONS:
+                references[os.path.join(root, stem)] = path
+    fallback = default_reference
+    if fallback is None and len(references) == 1:
+        fallback = next(iter(references.values()))
+    pairs = []
+    for path in media:
+        reference = references.get(os.path.splitext(path)[0], fallback)
+        if reference:
+            pairs.append((path, reference))
+        else:
+            print(f"No reference found for {path}, skipping")
+    return pairs
+
+
+def read_manifest(manifest: str) -> List[Tuple[str, str]]:
+    """Read (media, reference) pairs from a CSV or JSONL manifest; paths are relative to it"""
+    base = os.path.dirname(os.path.abspath(manifest))
+    if manifest.endswith('.jsonl'):
+        with open(manifest, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(manifest, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    return [(os.path.join(base, row['media']), os.path.join(base, row['reference'])) for row in rows]
+
+
+def read_completed(summary_path: str) -> set:
+    """Keys already ingested successfully by a previous (possibly interrupted) run"""
+    if not os.path.exists(summary_path):
+        return set()
+    with open(summary_path, 'r', encoding='utf-8', newline='') as f:
+        if summary_path.endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = []
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # A run killed mid-write can leave a truncated last line
+                    continue
+    return {row['key'] for row in rows if row.get('status') == 'ok'}
+
+
+def process_pair(media: str, reference: str, corpus_path: Optional[str] = None) -> Dict:
+    """Worker: extract both texts, normalize and score one pair"""
+    from file_handler import FileHandler
+    from wer_calculator import WERCalculator, normalize_text
+    if not _worker_state:
+        _worker_state['handler'] = FileHandler(os.path.dirname(os.path.abspath(media)))
+        _worker_state['wer'] = WERCalculator()
+        if corpus_path:
+            from token_store import TokenCorpus
+            _worker_state['corpus'] = TokenCorpus(corpus_path)
+    handler, wer_calc = _worker_state['handler'], _worker_state['wer']
+    corpus = _worker_state.get('corpus')
+    timings = {}
+    result = {'key': pair_key(media, reference), 'media': media, 'reference': reference, 'timings': timings}
+
+    start = time.perf_counter()
+    media_result = handler.process_file(media)
+    timings['extract_media'] = time.perf_counter() - start
+    if media_result.get('error'):
+        result.update(status='error', error=media_result['error'])
+        return result
+
+    if corpus is not None and corpus_key(reference) in corpus:
+        return score_with_corpus(result, media_result, corpus)
+
+    start = time.perf_counter()
+    reference_result = handler.process_file(reference)
+    timings['extract_reference'] = time.perf_counter() - start
+    if reference_result.get('error'):
+        result.update(status='error', error=reference_result['error'])
+        return result
+
+    start = time.perf_counter()
+    ref_norm = normalize_text(reference_result['text'])
+    hyp_norm = normalize_text(media_result['text'])
+    timings['normalize'] = time.perf_counter() - start
+    if not ref_norm or not hyp_norm:
+        result.update(status='error', error='Empty transcript or reference after normalization')
+        return result
+
+    start = time.perf_counter()
+    wer_results = wer_calc.build_results(ref_norm, hyp_norm)
+    timings['score'] = time.perf_counter() - start
+
+    metadata = media_result.get('metadata', {})
+    result.update(
+        status='ok',
+        transcribed_text=media_result['text'],
+        reference_text=reference_result['text'],
+        wer_results=wer_results,
+        file_metadata=metadata,
+    )
+    return result
+
+
+def corpus_key(path: str) -> str:
+    from token_store import corpus_key as key
+    return key(path)
+
+
+def score_with_corpus(result: Dict, media_result: Dict, corpus) -> Dict:
+    """Score the transcript against the memory-mapped reference tokens"""
+    from wer_calculator import normalize_text, score_tokens
+    timings = result['timings']
+    start = time.perf_counter()
+    hyp_norm = normalize_text(media_result['text'])
+    key = corpus_key(result['reference'])
+    timings['normalize'] = time.perf_counter() - start
+    if not hyp_norm:
+        result.update(status='error', error='Empty transcript after normalization')
+        return result
+
+    start = time.perf_counter()
+    score = score_tokens(corpus.tokens(key), corpus.encode(hyp_norm))
+    timings['score'] = time.perf_counter() - start
+    result.update(
+        status='ok',
+        transcribed_text=media_result['text'],
+        # Filled in from the corpus by the parent, which writes the database
+        reference_text=None,
+        corpus_key=key,
+        wer_results={
+            'wer_score': score['wer'],
+            'edit_operations': {name: score[name] for name in ('substitutions', 'deletions', 'insertions', 'hits')},
+            'statistics': {'Word Count': {'transcribed': score['hypothesis_words'],
+                                          'reference': score['reference_words']}},
+        },
+        file_metadata=media_result.get('metadata', {}),
+    )
+    return result
+
+
+def build_payload(result: Dict) -> Dict:
+    """Shape a worker result like a /api/save-analysis request body"""
+    metadata = dict(result['file_metadata'])
+    ext = metadata.get('extension', '').lstrip('.').lower()
+    metadata['extension'] = ext
+    metadata['type'] = 'Video' if ext in ('mp4', 'mkv') else 'Audio'
+    metadata['created'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(metadata.get('created', time.time())))
+    metadata.pop('modified', None)
+    metadata['batch_key'] = result['key']
+    return {
+        'filename': metadata.get('filename', os.path.basename(result['media'])),
+        'transcribed_text': result['transcribed_text'],
+        'reference_text': result['reference_text'],
+        'wer_results': result['wer_results'],
+        'nlp_results': {},
+        'file_metadata': metadata,
+    }
+
+
+def summary_row(result: Dict) -> Dict:
+    stats = result.get('wer_results', {}).get('statistics', {}).get('Word Count', {})
+    return {
+        'key': result['key'],
+        'status': result['status'],
+        'media': result['media'],
+        'reference': result['reference'],
+        'wer_score': result.get('wer_results', {}).get('wer_score'),
+        'reference_words': stats.get('reference'),
+        'hypothesis_words': stats.get('transcribed'),
+        'duration': result.get('file_metadata', {}).get('duration'),
+        'error': result.get('error'),
+        'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+class SummaryWriter:
+    """Append-only CSV/JSONL summary, flushed after every batch"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_csv = path.endswith('.csv')
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', encoding='utf-8', newline='')
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=SUMMARY_FIELDS)
+            if new_file:
+                self.writer.writeheader()
+
+    def write(self, rows: List[Dict]):
+        for row in rows:
+            if self.is_csv:
+                self.writer.writerow(row)
+            else:
+                self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class StageStats:
+    """Accumulated busy time and item counts per pipeline stage"""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.items = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float, items: int = 1):
+        self.seconds[stage] += seconds
+        self.items[stage] += items
+
+    def report(self) -> str:
+        wall = time.perf_counter() - self.started
+        lines = [f"{'stage':<18}{'items':>8}{'busy s':>10}{'items/s':>10}"]
+        for stage in STAGES:
+            if not self.items[stage]:
+                continue
+            rate = self.items[stage] / self.seconds[stage] if self.seconds[stage] else float('inf')
+            lines.append(f"{stage:<18}{self.items[stage]:>8}{self.seconds[stage]:>10.2f}{rate:>10.2f}")
+        done = self.items['score']
+        lines.append(f"wall {wall:.2f}s, end-to-end {done / wall if wall else 0:.2f} pairs/s")
+        return '\n'.join(lines)
+
+
+class DatabaseWriter:
+    """Bulk-inserts Transcription rows inside the Flask app context, once per batch_key"""
+
+    def __init__(self):
+        # Importing app creates/migrates the schema
+        from app import app
+        from persistence import save_analyses
+        self.app = app
+        self.save_analyses = save_analyses
+        self.stored_keys = self._stored_keys()
+
+    def _stored_keys(self) -> set:
+        """batch_key of every row a previous run inserted.
+
+        A run interrupted between committing a batch and journaling it leaves
+        rows the summary does not list as 'ok'; the resume must not insert
+        them again.
+        """
+        from models import Transcription
+        with self.app.app_context():
+            rows = Transcription.query.with_entities(Transcription.file_metadata) \
+                .filter(Transcription.file_metadata.like('%batch_key%')).all()
+        keys = set()
+        for (file_metadata,) in rows:
+            try:
+                key = json.loads(file_metadata).get('batch_key')
+            except (ValueError, AttributeError):
+                continue
+            if key:
+                keys.add(key)
+        return keys
+
+    def write(self, results: List[Dict]) -> int:
+        """Insert the results not stored yet; returns how many were inserted"""
+        new = [r for r in results if r['key'] not in self.stored_keys]
+        if new:
+            with self.app.app_context():
+                self.save_analyses(build_payload(r) for r in new)
+            self.stored_keys.update(r['key'] for r in new)
+        return len(new)
+
+
+def run(pairs: List[Tuple[str, str]], summary_path: str, workers: int, batch_size: int,
+        write_db: bool = True, corpus_path: Optional[str] = None) -> StageStats:
+    completed = read_completed(summary_path)
+    pending = [(m, r) for m, r in pairs if pair_key(m, r) not in completed]
+    print(f"{len(pairs)} pairs, {len(pairs) - len(pending)} already done, {len(pending)} to process")
+    stats = StageStats()
+    summary = SummaryWriter(summary_path)
+    db_writer = DatabaseWriter() if write_db and pending else None
+    corpus = None
+    if corpus_path and db_writer:
+        from token_store import TokenCorpus
+        corpus = TokenCorpus(corpus_path)
+    buffered = []
+
+    def flush():
+        ok = [r for r in buffered if r['status'] == 'ok']
+        for r in ok:
+            if r.get('reference_text') is None and corpus is not None:
+                r['reference_text'] = corpus.text(r['corpus_key'])
+        if ok and db_writer:
+            start = time.perf_counter()
+            inserted = db_writer.write(ok)
+            stats.add('db_write', time.perf_counter() - start, inserted)
+        # Journal only after the rows are committed, so an interrupted batch is retried on resume;
+        # DatabaseWriter skips the pairs whose rows were committed but not journaled
+        summary.write([summary_row(r) for r in buffered])
+        buffered.clear()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            queue = iter(pending)
+            in_flight = {}
+            while True:
+                # Keep a bounded number of pairs in flight so memory stays flat
+                while len(in_flight) < workers * 2:
+                    pair = next(queue, None)
+                    if pair is None:
+                        break
+                    in_flight[executor.submit(process_pair, *pair, corpus_path)] = pair
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    media, reference = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # A pair that crashes its worker is journaled as failed; the run goes on
+                        result = {'key': pair_key(media, reference), 'media': media, 'reference': reference,
+                                  'timings': {}, 'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+                    for stage, seconds in result['timings'].items():
+                        stats.add(stage, seconds)
+                    if result['status'] != 'ok':
+                        print(f"Failed {result['media']}: {result.get('error')}")
+                    buffered.append(result)
+                if len(buffered) >= batch_size:
+                    flush()
+                    print(stats.report())
+        if buffered:
+            flush()
+    finally:
+        summary.close()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch WER ingestion of media/reference pairs')
+    parser.add_argument('source', help='Directory of media + reference files, or a .csv/.jsonl manifest')
+    parser.add_argument('--reference', help='Reference document used for media without a same-stem reference')
+    parser.add_argument('--summary', default='batch_summary.jsonl', help='Summary/resume file (.jsonl or .csv)')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--batch-size', type=int, default=20, help='Rows per database transaction')
+    parser.add_argument('--no-db', action='store_true', help='Only write the summary file')
+    parser.add_argument('--corpus', help='token_store corpus of the references (python token_store.py build ...)')
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.source):
+        pairs = discover_pairs(args.source, args.reference)
+    else:
+        pairs = read_manifest(args.source)
+    stats = run(pairs, args.summary, args.workers, args.batch_size, write_db=not args.no_db,
+                corpus_path=args.corpus)
+    print(stats.report())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Accuracy vs. speed of the CPU inference modes.
+
+Transcribes a clip (by default the bundled uploads/harvard.wav) with each
+ASR configuration. It reports model load time, transcription time,
+real-time factor (seconds of compute per second of audio) and WER against
+the reference text (uploads/Ground_Truth_-_02.txt). Both texts are
+normalized as in /api/calculate-wer. Configurations whose backend is not
+installed are listed as skipped.
+
+    python -m benchmarks.asr_accuracy --model base --repeat 3 --markdown asr_modes.md
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_AUDIO = os.path.join(ROOT, 'uploads', 'harvard.wav')
+DEFAULT_REFERENCE = os.path.join(ROOT, 'uploads', 'Ground_Truth_-_02.txt')
+
+# label -> (backend, options)
+CONFIGURATIONS = {
+    'whisper-fp32': ('whisper', {'mode': 'fp32'}),
+    'whisper-fp32-no-fallback': ('whisper', {'mode': 'fp32', 'fallback': False}),
+    'whisper-fp32-beam5': ('whisper', {'mode': 'fp32', 'beam_size': 5}),
+    'whisper-int8': ('whisper', {'mode': 'int8'}),
+    'whisper-int8-no-fallback': ('whisper', {'mode': 'int8', 'fallback': False}),
+    'faster-whisper-int8': ('faster-whisper', {'compute_type': 'int8'}),
+    'faster-whisper-int8-beam5': ('faster-whisper', {'compute_type': 'int8', 'beam_size': 5}),
+}
+
+
+def evaluate(label: str, backend_name: str, options: dict, audio: str, reference: str, model: str,
+             repeat: int, duration: float) -> dict:
+    from asr_backends import create_backend
+    from wer_calculator import WERCalculator, normalize_text
+    backend = create_backend(backend_name, **options)
+    start = time.perf_counter()
+    try:
+        backend.load(model)
+    except (ImportError, RuntimeError) as e:
+        return {'config': label, 'skipped': str(e)}
+    load_seconds = time.perf_counter() - start
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = backend.transcribe(audio, model)
+        timings.append(time.perf_counter() - start)
+    seconds = sorted(timings)[len(timings) // 2]
+    return {
+        'config': label,
+        'load_seconds': load_seconds,
+        'seconds': seconds,
+        'rtf': seconds / duration,
+        'wer': WERCalculator().calculate_wer(normalize_text(reference), normalize_text(text)),
+        'text': text.strip(),
+    }
+
+
+def markdown(rows, audio: str, model: str, duration: float) -> str:
+    lines = [f'ASR modes on `{os.path.basename(audio)}` ({duration:.1f}s), model `{model}`, '
+             f'{os.cpu_count()} CPU cores', '',
+             '| Configuration | WER | Transcribe (s) | RTF | Load (s) |', '|---|---|---|---|---|']
+    for row in rows:
+        if 'skipped' in row:
+            lines.append(f"| {row['config']} | skipped: {row['skipped']} | | | |")
+        else:
+            lines.append(f"| {row['config']} | {row['wer']:.2%} | {row['seconds']:.2f} | "
+                         f"{row['rtf']:.3f} | {row['load_seconds']:.1f} |")
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--audio', default=DEFAULT_AUDIO)
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE)
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--repeat', type=int, default=3, help='Transcriptions per configuration (median is reported)')
+    parser.add_argument('--only', type=lambda s: s.split(','), help='Comma-separated configuration labels')
+    parser.add_argument('--json', metavar='FILE')
+    parser.add_argument('--markdown', metavar='FILE')
+    args = parser.parse_args(argv)
+
+    from media_probe import default_prober
+    duration = default_prober.probe(args.audio).get('duration') or float('nan')
+    with open(args.reference, encoding='utf-8') as f:
+        reference = f.read()
+    rows = []
+    for label, (backend_name, options) in CONFIGURATIONS.items():
+        if args.only and label not in args.only:
+            continue
+        row = evaluate(label, backend_name, options, args.audio, reference, args.model, args.repeat, duration)
+        rows.append(row)
+        if 'skipped' in row:
+            print(f"{label:<30} skipped: {row['skipped']}")
+        else:
+            print(f"{label:<30} WER {row['wer']:.2%}  {row['seconds']:.2f}s  RTF {row['rtf']:.3f}  "
+                  f"load {row['load_seconds']:.1f}s")
+
+    report = markdown(rows, args.audio, args.model, duration)
+    print()
+    print(report)
+    if args.markdown:
+        with open(args.markdown, 'w', encoding='utf-8') as f:
+            f.write(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'audio': args.audio, 'model': args.model, 'duration': duration, 'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
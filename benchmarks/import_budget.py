@@ -0,0 +1,65 @@
+"""Import-time budget for app.py.
+
+Imports app in a fresh interpreter with `python -X importtime` (warm-up
+disabled so only the import itself is measured), prints the slowest
+top-level packages and fails when the total exceeds the budget or when a
+heavy dependency that should only load lazily shows up.
+
+    python -m benchmarks.import_budget --budget 3.0
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+
+# Loaded on demand by the routes/warm-up, never by `import app`
+LAZY_MODULES = ('torch', 'whisper', 'spacy', 'nltk', 'matplotlib', 'pydub', 'speech_recognition',
+                'pytesseract', 'docx', 'weasyprint', 'transformers', 'faster_whisper')
+DEFAULT_BUDGET_SECONDS = 3.0
+LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)')
+
+
+def measure(module: str = 'app', cwd: str = None):
+    """Return ({top-level package: seconds of import work}, total seconds) for importing module"""
+    env = dict(os.environ, WARMUP_ON_START='0')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=cwd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{proc.stderr[-2000:]}')
+    packages = defaultdict(float)
+    for match in LINE.finditer(proc.stderr):
+        # Self time per module, so nested imports are never counted twice
+        packages[match.group(2).split('.')[0]] += int(match.group(1)) / 1e6
+    total = sum(packages.values())
+    return dict(packages), total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure and enforce the import time of app.py')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS, help='Seconds allowed for the import')
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    packages, total = measure(args.module, cwd=root)
+    print(f"{'package':<30}{'seconds':>10}")
+    for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{name:<30}{seconds:>10.3f}')
+    print(f"{'total':<30}{total:>10.3f}  (budget {args.budget:.1f}s)")
+
+    eager = sorted(name for name in packages if name in LAZY_MODULES)
+    failed = False
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager)}")
+        failed = True
+    if total > args.budget:
+        print(f'FAIL: import took {total:.2f}s, over the {args.budget:.1f}s budget')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Throughput of concurrent ASR inference with and without the scheduler.
+
+Client threads submit inference calls as fast as they can, first straight
+on their own threads (the old behaviour) and then through
+InferenceScheduler with each --slots value. It reports completed
+calls per second, p50/p95 latency and rejections. The workload is a torch
+matmul loop when torch is installed (the same thread pool Whisper uses),
+otherwise the fake ASR backend in CPU-bound mode.
+
+    python -m benchmarks.inference_throughput --clients 8 --seconds 15 --slots 1,2,4
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+from benchmarks.sqlite_concurrency import percentile
+
+
+def make_workload(size: int, work_seconds: float):
+    """(description, callable) for one simulated inference"""
+    try:
+        import torch
+    except ImportError:
+        from asr_backends import FakeBackend
+        backend = FakeBackend(latency=work_seconds, cpu_bound=True)
+        return f'fake backend, {work_seconds:.2f}s CPU-bound', lambda: backend.transcribe('')
+    a = torch.randn(size, size)
+
+    def infer():
+        with torch.no_grad():
+            b = a
+            for _ in range(8):
+                b = torch.tanh(b @ a)
+        return float(b[0, 0])
+    return f'torch {size}x{size} matmul x8', infer
+
+
+def run_clients(call, clients: int, seconds: float):
+    from inference_scheduler import SchedulerBusy
+    latencies, counts, lock = [], {'ok': 0, 'rejected': 0}, threading.Lock()
+    stop = threading.Event()
+
+    def client():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                call()
+                key = 'ok'
+            except SchedulerBusy as e:
+                key = 'rejected'
+                time.sleep(min(e.retry_after, 1))
+            elapsed = time.perf_counter() - start
+            with lock:
+                counts[key] += 1
+                if key == 'ok':
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'per_s': counts['ok'] / elapsed,
+        'p50_ms': (percentile(latencies, 50) or 0) * 1000,
+        'p95_ms': (percentile(latencies, 95) or 0) * 1000,
+        'rejected': counts['rejected'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--slots', type=lambda s: [int(v) for v in s.split(',')], default=[1, 2, 4])
+    parser.add_argument('--max-queue', type=int, default=16)
+    parser.add_argument('--deadline', type=float, default=30)
+    parser.add_argument('--size', type=int, default=512, help='Matrix size of the torch workload')
+    parser.add_argument('--work-seconds', type=float, default=0.2, help='Duration of the fake workload')
+    args = parser.parse_args(argv)
+
+    from inference_scheduler import InferenceScheduler
+    description, infer = make_workload(args.size, args.work_seconds)
+    print(f'workload: {description}; {args.clients} clients, {os.cpu_count()} cores')
+    print(f"{'mode':<22}{'calls/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'rejected':>10}")
+    runs = [('unscheduled', infer)]
+    for slots in args.slots:
+        scheduler = InferenceScheduler(slots=slots, max_queue=args.max_queue, deadline=args.deadline)
+        runs.append((f'scheduler slots={slots}', lambda scheduler=scheduler: scheduler.run(infer)))
+    for name, call in runs:
+        row = run_clients(call, args.clients, args.seconds)
+        print(f"{name:<22}{row['per_s']:>10.2f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['rejected']:>10}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""Mixed-traffic load generator for the Flask app.
+
+Virtual users replay a weighted mix of upload, transcribe, whisper
+(/api/whisper-transcribe), calculate-wer, save, history and pdf requests
+and the run reports throughput and p50/p95/p99 latency per route.
+
+Without --url the app is started in this process on a temporary database
+and upload folder with the fake ASR backend (ASR_BACKEND=fake, latency from
+--asr-latency), so the numbers measure the web stack rather than Whisper.
+The clients then share the interpreter with the server; for cleaner
+numbers start the server separately, e.g.
+
+    ASR_BACKEND=fake ASR_FAKE_LATENCY=0.5 WARMUP_ON_START=0 python app.py
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --users 16 --seconds 60
+
+    python -m benchmarks.load_test --users 8 --seconds 20 --mix calculate_wer=4,history=2,pdf=1
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import wave
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from http.cookiejar import CookieJar
+
+from benchmarks.sqlite_concurrency import percentile
+from benchmarks.suite import make_corpus
+
+DEFAULT_MIX = {'upload': 2, 'transcribe': 2, 'whisper': 1, 'calculate_wer': 4, 'save': 2, 'history': 3, 'pdf': 1}
+
+
+def make_wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    """Silent mono 16-bit WAV; the fake backend never looks at the samples"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b'\x00\x00' * int(seconds * rate))
+    return buffer.getvalue()
+
+
+def multipart(field: str, filename: str, content: bytes, content_type: str = 'audio/wav'):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class VirtualUser:
+    """One client with its own cookie session; transcribe sends back the upload_id of its last upload"""
+
+    def __init__(self, base_url: str, index: int, audio: bytes, timeout: float):
+        self.base_url = base_url.rstrip('/')
+        self.index = index
+        self.audio = audio
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        self.reference, self.hypothesis = make_corpus(200, seed=index)
+        self.upload_id = None
+        self.results = None
+        self.saved_ids = []
+
+    def request(self, method: str, path: str, body: bytes = None, content_type: str = None):
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if content_type:
+            req.add_header('Content-Type', content_type)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def post_json(self, path: str, payload: dict):
+        return self.request('POST', path, json.dumps(payload).encode(), 'application/json')
+
+    # Each action returns the HTTP status of its request
+    def upload(self):
+        body, content_type = multipart('file', f'load_{self.index}.wav', self.audio)
+        status, response = self.request('POST', '/api/transcribe', body, content_type)
+        self.upload_id = json.loads(response).get('upload_id') if status == 200 else None
+        return status
+
+    def transcribe(self):
+        return self.post_json('/api/transcribe', {'upload_id': self.upload_id})[0]
+
+    def whisper(self):
+        body, content_type = multipart('file', 'recording.wav', self.audio)
+        return self.request('POST', '/api/whisper-transcribe', body, content_type)[0]
+
+    def calculate_wer(self):
+        status, body = self.post_json('/api/calculate-wer', {
+            'transcribed_text': self.hypothesis, 'reference_text': self.reference,
+            'transcribed_nlp': {}, 'reference_nlp': {}})
+        if status == 200:
+            self.results = json.loads(body)['results']
+        return status
+
+    def save(self):
+        results = dict(self.results)
+        results.pop('nlp_results', None)
+        status, _ = self.post_json('/api/save-analysis', {
+            'filename': f'load_{self.index}.wav',
+            'transcribed_text': self.hypothesis,
+            'reference_text': self.reference,
+            'wer_results': results,
+            'nlp_results': {},
+            'file_metadata': {'filename': f'load_{self.index}.wav', 'type': 'Audio', 'extension': 'wav',
+                              'size': len(self.audio)},
+        })
+        return status
+
+    def history(self):
+        status, body = self.request('GET', '/api/history?limit=20')
+        if status == 200:
+            self.saved_ids = [row['id'] for row in json.loads(body).get('analyses', [])] or self.saved_ids
+        return status
+
+    def pdf(self):
+        return self.request('GET', f'/api/download-pdf/{random.choice(self.saved_ids)}')[0]
+
+    def prerequisites(self, action: str):
+        """Actions that have to run first so action has something to work on"""
+        if action == 'transcribe' and not self.upload_id:
+            return ['upload']
+        if action == 'save' and self.results is None:
+            return ['calculate_wer']
+        if action == 'pdf' and not self.saved_ids:
+            return (['calculate_wer'] if self.results is None else []) + ['save', 'history']
+        return []
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.errors = {}
+
+    def record(self, route: str, seconds: float, ok: bool):
+        with self.lock:
+            self.latency.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route, values in sorted(self.latency.items()):
+            routes[route] = {
+                'requests': len(values),
+                'errors': self.errors.get(route, 0),
+                'rps': len(values) / elapsed,
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+            }
+        total = sum(len(values) for values in self.latency.values())
+        return {'seconds': elapsed, 'requests': total, 'rps': total / elapsed,
+                'errors': sum(self.errors.values()), 'routes': routes}
+
+
+def run_load(base_url: str, users: int, seconds: float, mix: dict, timeout: float, seed: int = 0) -> dict:
+    audio = make_wav()
+    recorder = Recorder()
+    stop = threading.Event()
+    actions, weights = zip(*mix.items())
+
+    def worker(index):
+        user = VirtualUser(base_url, index, audio, timeout)
+        rng = random.Random(seed + index)
+        while not stop.is_set():
+            action = rng.choices(actions, weights)[0]
+            for step in user.prerequisites(action) + [action]:
+                start = time.perf_counter()
+                try:
+                    ok = getattr(user, step)() < 400
+                except Exception:
+                    ok = False
+                recorder.record(step, time.perf_counter() - start, ok)
+                if not ok:
+                    break
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout + 1)
+    return recorder.report(time.perf_counter() - started)
+
+
+def start_local_server(asr_latency: float):
+    """Import app against a scratch database with the fake ASR backend and serve it on a free port"""
+    workdir = tempfile.mkdtemp(prefix='wer_load_')
+    os.environ.update({
+        'ASR_BACKEND': 'fake',
+        'ASR_FAKE_LATENCY': str(asr_latency),
+        'WARMUP_ON_START': '0',
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+    })
+    from werkzeug.serving import make_server
+    import app as wer_app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, wer_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown route '{name}', expected: {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Target a running server instead of starting one in-process')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='route=weight,... e.g. calculate_wer=4,pdf=1')
+    parser.add_argument('--asr-latency', type=float, default=0.5, help='Fake ASR seconds per call (in-process server)')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--json', metavar='FILE', help='Also write the report as JSON')
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = start_local_server(args.asr_latency)
+    try:
+        report = run_load(base_url, args.users, args.seconds, args.mix, args.timeout)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(f"{'route':<16}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, row in report['routes'].items():
+        print(f"{route:<16}{row['requests']:>10}{row['errors']:>8}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    print(f"{'total':<16}{report['requests']:>10}{report['errors']:>8}{report['rps']:>9.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Concurrent read/write benchmark for the SQLite persistence layer.
+
+Runs writer threads saving analyses (one transaction per save, like
+/api/save-analysis) against reader threads paging history, once with
+SQLite defaults and once with init_persistence's tuning, then a bulk
+save_analyses run. Each mode runs in a fresh subprocess and database.
+
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 8 --seconds 10
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+
+
+def make_payload(i: int) -> dict:
+    words = [random.choice(['alpha', 'beta', 'gamma', 'delta', 'echo']) for _ in range(50)]
+    return {
+        'filename': f'bench_{i}.wav',
+        'transcribed_text': ' '.join(words),
+        'reference_text': ' '.join(reversed(words)),
+        'wer_results': {
+            'wer_score': random.random(),
+            'differences': [{'type': 'replace', 'ref': ['alpha'], 'hyp': ['beta']}],
+            'word_differences': [{'type': 'normal', 'text': w} for w in words],
+            'statistics': {'Word Count': {'transcribed': 50, 'reference': 50}},
+            'plots': {'bar_chart': {'data': [{'y': list(range(200))}], 'layout': {}}},
+        },
+        'nlp_results': {},
+        'file_metadata': {'filename': f'bench_{i}.wav', 'type': 'Audio', 'extension': 'wav', 'size': 1000},
+    }
+
+
+def make_app(db_path: str, tuned: bool):
+    from flask import Flask
+    from persistence import init_persistence
+    from extensions import db
+    from migrations import run_migrations
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['UPLOAD_FOLDER'] = os.path.dirname(db_path)
+    init_persistence(app, tuned=tuned)
+    with app.app_context():
+        db.create_all()
+        run_migrations(db)
+    return app
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+
+def run_mode(mode: str, writers: int, readers: int, seconds: float, bulk_rows: int) -> dict:
+    from extensions import db
+    from models import Transcription
+    from persistence import save_analysis, save_analyses
+    from history_query import parse_history_args, paginate
+    db_path = os.path.join(tempfile.mkdtemp(prefix='wer_bench_'), 'bench.db')
+    app = make_app(db_path, tuned=(mode == 'tuned'))
+    stop = threading.Event()
+    lock = threading.Lock()
+    counters = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+    write_latency, read_latency = [], []
+
+    def writer(seed):
+        random.seed(seed)
+        i = seed * 10 ** 6
+        with app.app_context():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    save_analysis(make_payload(i))
+                    key = 'writes'
+                except Exception:
+                    key = 'write_errors'
+                elapsed = time.perf_counter() - start
+                with lock:
+                    counters[key] += 1
+                    write_latency.append(elapsed)
+                i += 1
+
+    def reader():
+        with app.app_context():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    paginate(Transcription.query, parse_history_args({'limit': '50'}))
+                    key = 'reads'
+                except Exception:
+                    key = 'read_errors'
+                finally:
+                    db.session.remove()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    counters[key] += 1
+                    read_latency.append(elapsed)
+
+    threads = [threading.Thread(target=writer, args=(n + 1,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    with app.app_context():
+        payloads = [make_payload(i) for i in range(bulk_rows)]
+        start = time.perf_counter()
+        for payload in payloads[:bulk_rows // 2]:
+            save_analysis(payload)
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        save_analyses(payloads[bulk_rows // 2:])
+        bulk = time.perf_counter() - start
+
+    return {
+        'mode': mode,
+        'writes_per_s': counters['writes'] / seconds,
+        'reads_per_s': counters['reads'] / seconds,
+        'write_errors': counters['write_errors'],
+        'read_errors': counters['read_errors'],
+        'write_p95_ms': (percentile(write_latency, 95) or 0) * 1000,
+        'read_p95_ms': (percentile(read_latency, 95) or 0) * 1000,
+        'row_per_txn_rows_per_s': (bulk_rows // 2) / single if single else None,
+        'bulk_rows_per_s': (bulk_rows - bulk_rows // 2) / bulk if bulk else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--bulk-rows', type=int, default=1000)
+    parser.add_argument('--mode', choices=['baseline', 'tuned'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        result = run_mode(args.mode, args.writers, args.readers, args.seconds, args.bulk_rows)
+        print(json.dumps(result))
+        return 0
+
+    results = []
+    for mode in ('baseline', 'tuned'):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.sqlite_concurrency', '--mode', mode,
+             '--writers', str(args.writers), '--readers', str(args.readers),
+             '--seconds', str(args.seconds), '--bulk-rows', str(args.bulk_rows)],
+            check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    keys = [k for k in results[0] if k != 'mode']
+    print(f"{'metric':<26}" + ''.join(f"{r['mode']:>14}" for r in results))
+    for key in keys:
+        print(f"{key:<26}" + ''.join(f"{r[key]:>14.1f}" if r[key] is not None else f"{'-':>14}" for r in results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
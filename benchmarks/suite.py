@@ -0,0 +1,276 @@
+"""Benchmark suite for the analysis pipeline.
+
+Generates synthetic reference/hypothesis pairs of 100, 1k, 10k and 100k
+words with a controlled word error rate and times WERCalculator
+(calculate_wer, get_word_differences, every generate_* plot,
+analyze_texts, build_results), plot JSON serialization,
+NLPProcessor.process_text and the download_pdf report rendering.
+
+    python -m benchmarks.suite run --output baseline.json
+    python -m benchmarks.suite run --output current.json --compare baseline.json
+    python -m benchmarks.suite compare baseline.json current.json --threshold 0.15
+
+`compare` exits with status 1 when a case got slower than the threshold.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+
+SIZES = (100, 1000, 10000, 100000)
+DEFAULT_ERROR_RATE = 0.15
+# generate_confusion_matrix builds a dense words x words matrix (80 MB at 3k
+# words), so it and the cases that call it only run up to this size
+CONFUSION_MATRIX_MAX_WORDS = 3000
+PLOT_NAMES = ('confusion_matrix', 'word_count_comparison', 'statistics_plot', 'radar_chart',
+              'linear_regression', 'bar_chart')
+VOCABULARY_SIZE = 5000
+
+
+def make_corpus(words: int, error_rate: float = DEFAULT_ERROR_RATE, seed: int = 0):
+    """Reference/hypothesis texts whose edits (substitutions, deletions, insertions in equal parts) hit error_rate"""
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 10)))
+                  for _ in range(VOCABULARY_SIZE)]
+    # Zipf-like frequencies, as in real transcripts
+    weights = [1.0 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    reference = rng.choices(vocabulary, weights, k=words)
+    hypothesis = []
+    for word in reference:
+        roll = rng.random()
+        if roll < error_rate / 3:
+            hypothesis.append(rng.choice(vocabulary))
+        elif roll < 2 * error_rate / 3:
+            continue
+        elif roll < error_rate:
+            hypothesis.extend([word, rng.choice(vocabulary)])
+        else:
+            hypothesis.append(word)
+    return ' '.join(reference), ' '.join(hypothesis)
+
+
+def analysis_payload(calculator, reference: str, hypothesis: str) -> dict:
+    """A saved-analysis payload shaped like /api/calculate-wer results, without the plots"""
+    differences = calculator.get_word_differences(reference, hypothesis)
+    word_differences = []
+    for diff in differences:
+        if diff['type'] == 'equal':
+            word_differences.extend({'type': 'normal', 'text': w} for w in diff['ref'])
+        else:
+            word_differences.extend({'type': 'deleted', 'text': w} for w in diff['ref'])
+            word_differences.extend({'type': 'inserted', 'text': w} for w in diff['hyp'])
+    ref_words, hyp_words = reference.split(), hypothesis.split()
+    return {
+        'filename': 'benchmark.txt',
+        'transcribed_text': hypothesis,
+        'reference_text': reference,
+        'wer_results': {
+            'wer_score': calculator.calculate_wer(reference, hypothesis),
+            'differences': differences,
+            'word_differences': word_differences,
+            'statistics': {
+                'Word Count': {'transcribed': len(hyp_words), 'reference': len(ref_words)},
+                'Unique Words': {'transcribed': len(set(hyp_words)), 'reference': len(set(ref_words))},
+            },
+            'plots': {},
+        },
+        'nlp_results': {},
+        'file_metadata': {'filename': 'benchmark.txt', 'type': 'Text', 'extension': 'txt',
+                          'size': len(hypothesis)},
+    }
+
+
+class PdfFixture:
+    """Temporary database holding one analysis per corpus size for the download_pdf case"""
+
+    def __init__(self):
+        from benchmarks.sqlite_concurrency import make_app
+        self.directory = tempfile.mkdtemp(prefix='wer_bench_pdf_')
+        self.app = make_app(os.path.join(self.directory, 'bench.db'), tuned=True)
+
+    def add(self, calculator, reference: str, hypothesis: str) -> int:
+        from persistence import save_analysis
+        with self.app.app_context():
+            return save_analysis(analysis_payload(calculator, reference, hypothesis)).id
+
+    def render(self, analysis_id: int) -> int:
+        """Render the report exactly as /api/download-pdf streams it; returns its size"""
+        from extensions import db
+        from models import Transcription
+        import report_pdf
+        with self.app.app_context():
+            transcription = db.session.get(Transcription, analysis_id)
+            size = sum(len(chunk) for chunk in report_pdf.render_report(transcription))
+            db.session.remove()
+        return size
+
+
+def _texts(reference: str, hypothesis: str):
+    return reference, hypothesis
+
+
+def build_cases(calculator, pdf: PdfFixture):
+    """case name -> (setup(ref, hyp) -> state, run(state), max words or None)"""
+    from plotly.utils import PlotlyJSONEncoder
+    cases = {
+        'calculate_wer': (_texts, lambda s: calculator.calculate_wer(*s), None),
+        'get_word_differences': (_texts, lambda s: calculator.get_word_differences(*s), None),
+    }
+    for name in PLOT_NAMES:
+        method = getattr(calculator, 'generate_linear_regression_plot' if name == 'linear_regression'
+                         else f'generate_{name}')
+        limit = CONFUSION_MATRIX_MAX_WORDS if name == 'confusion_matrix' else None
+        cases[f'generate_{name}'] = (_texts, lambda s, method=method: method(*s), limit)
+    cases['analyze_texts'] = (_texts, lambda s: calculator.analyze_texts(*s), CONFUSION_MATRIX_MAX_WORDS)
+    cases['build_results'] = (_texts, lambda s: calculator.build_results(*s), CONFUSION_MATRIX_MAX_WORDS)
+
+    def serialization_setup(ref, hyp):
+        return [getattr(calculator, 'generate_linear_regression_plot' if name == 'linear_regression'
+                        else f'generate_{name}')(ref, hyp)
+                for name in PLOT_NAMES if name != 'confusion_matrix' or len(ref.split()) <= CONFUSION_MATRIX_MAX_WORDS]
+
+    cases['plot_serialization'] = (serialization_setup,
+                                   lambda figs: [json.dumps(fig, cls=PlotlyJSONEncoder) for fig in figs], None)
+    cases['download_pdf'] = (lambda ref, hyp: pdf.add(calculator, ref, hyp), pdf.render, None)
+    return cases
+
+
+def nlp_case():
+    """(setup, run) for NLPProcessor.process_text, or the reason it cannot run here"""
+    try:
+        from nlp_processor import NLPProcessor, ensure_nltk_data, load_spacy
+        ensure_nltk_data()
+        load_spacy()
+        processor = NLPProcessor()
+    except Exception as e:
+        return f'NLP models unavailable: {e}'
+    return (lambda ref, hyp: hyp, processor.process_text, None)
+
+
+def time_case(run, state, repeat: int, max_seconds: float):
+    """Run once, then repeat while the total stays under max_seconds; median and min in seconds"""
+    timings = []
+    while len(timings) < repeat:
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+        if sum(timings) > max_seconds:
+            break
+    return {'seconds': statistics.median(timings), 'min': min(timings), 'runs': len(timings)}
+
+
+def run_suite(sizes, error_rate: float, repeat: int, max_seconds: float, only=None, log=print) -> dict:
+    from wer_calculator import WERCalculator
+    calculator = WERCalculator()
+    cases = build_cases(calculator, PdfFixture())
+    nlp = nlp_case()
+    if isinstance(nlp, tuple):
+        cases['nlp_process_text'] = nlp
+    results = {}
+    if not isinstance(nlp, tuple) and (not only or 'nlp_process_text' in only):
+        log(f'nlp_process_text skipped: {nlp}')
+        for size in sizes:
+            results[f'nlp_process_text@{size}'] = {'skipped': nlp}
+    # Cases whose previous size already took longer than max_seconds for one run
+    too_slow = {}
+    for size in sizes:
+        reference, hypothesis = make_corpus(size, error_rate, seed=size)
+        for name, (setup, run, limit) in cases.items():
+            if only and name not in only:
+                continue
+            key = f'{name}@{size}'
+            if limit is not None and size > limit:
+                results[key] = {'skipped': f'over {limit} words'}
+            elif name in too_slow:
+                results[key] = {'skipped': f'{too_slow[name]:.1f}s at a smaller size'}
+            else:
+                result = time_case(run, setup(reference, hypothesis), repeat, max_seconds)
+                results[key] = result
+                if result['min'] > max_seconds:
+                    too_slow[name] = result['min']
+            log(format_result(key, results[key]))
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'error_rate': error_rate,
+            'repeat': repeat,
+            'sizes': list(sizes),
+        },
+        'results': results,
+    }
+
+
+def format_result(key: str, result: dict) -> str:
+    if 'skipped' in result:
+        return f'{key:<40}{"skipped":>12}  {result["skipped"]}'
+    return f'{key:<40}{result["seconds"] * 1000:>10.2f}ms  (min {result["min"] * 1000:.2f}ms, {result["runs"]} runs)'
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta: float) -> list:
+    """Print a comparison table and return the keys that regressed by more than threshold"""
+    regressions = []
+    print(f"{'case':<40}{'baseline':>12}{'current':>12}{'change':>10}")
+    for key, now in current['results'].items():
+        before = baseline['results'].get(key)
+        if not before or 'seconds' not in before or 'seconds' not in now:
+            continue
+        change = (now['seconds'] - before['seconds']) / before['seconds'] if before['seconds'] else 0.0
+        regressed = change > threshold and now['seconds'] - before['seconds'] > min_delta
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{key:<40}{before['seconds'] * 1000:>10.2f}ms{now['seconds'] * 1000:>10.2f}ms{change:>+10.1%}{flag}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Run the suite and save the results as JSON')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--sizes', type=lambda s: [int(v) for v in s.split(',')], default=list(SIZES))
+    run_parser.add_argument('--error-rate', type=float, default=DEFAULT_ERROR_RATE)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--max-seconds', type=float, default=30,
+                            help='Stop repeating a case after this long; skip its larger sizes when one run exceeds it')
+    run_parser.add_argument('--only', type=lambda s: s.split(','), help='Comma-separated case names')
+    run_parser.add_argument('--compare', metavar='BASELINE', help='Compare against a saved baseline afterwards')
+    compare_parser = commands.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    for sub in (run_parser, compare_parser):
+        sub.add_argument('--threshold', type=float, default=0.15, help='Relative slowdown that counts as a regression')
+        sub.add_argument('--min-delta', type=float, default=0.001, help='Ignore slowdowns smaller than this many seconds')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        current = run_suite(args.sizes, args.error_rate, args.repeat, args.max_seconds, args.only)
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f'Saved {args.output}')
+        if not args.compare:
+            return 0
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+    regressions = compare(baseline, current, args.threshold, args.min_delta)
+    if regressions:
+        print(f"FAIL: {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Per-worker memory of reference corpora: in-process text vs. the token store.
+
+Builds a synthetic reference corpus, then starts --workers processes that
+each hold every reference, either loaded as Python strings (what each
+batch worker did before) or opened from a token_store corpus with
+mmap_mode='r' and read in full. It reports each worker's proportional set
+size (Pss, shared pages split between the processes that map them) from
+/proc/self/smaps_rollup, so it only runs on Linux.
+
+    python -m benchmarks.token_store_memory --documents 2000 --words 5000 --workers 1,2,4
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+from benchmarks.suite import make_corpus
+
+
+def pss_mb() -> float:
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def hold_texts(directory: str, barrier, results):
+    documents = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            documents.append(f.read().split())
+    barrier.wait()
+    results.put(pss_mb())
+    barrier.wait()
+
+
+def hold_corpus(path: str, barrier, results):
+    from token_store import TokenCorpus
+    corpus = TokenCorpus(path)
+    # Read every reference so the whole corpus is resident
+    for position in range(len(corpus)):
+        corpus.tokens(position).sum()
+    barrier.wait()
+    results.put(pss_mb())
+    barrier.wait()
+
+
+def measure(target, source: str, workers: int) -> float:
+    """Mean Pss in MB of workers processes each holding the corpus"""
+    context = multiprocessing.get_context('spawn')
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [context.Process(target=target, args=(source, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # Everyone reports while all workers are alive, so shared pages are split between them
+    sizes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return sum(sizes) / len(sizes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=5000, help='Words per reference')
+    parser.add_argument('--workers', type=lambda s: [int(v) for v in s.split(',')], default=[1, 2, 4])
+    args = parser.parse_args(argv)
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print('Needs /proc/self/smaps_rollup (Linux)')
+        return 1
+
+    from token_store import build_corpus
+    with tempfile.TemporaryDirectory() as scratch:
+        texts = os.path.join(scratch, 'texts')
+        os.makedirs(texts)
+        documents = []
+        for index in range(args.documents):
+            reference, _ = make_corpus(args.words, seed=index)
+            with open(os.path.join(texts, f'{index:06d}.txt'), 'w', encoding='utf-8') as f:
+                f.write(reference)
+            documents.append((str(index), reference))
+        start = time.perf_counter()
+        info = build_corpus(documents, os.path.join(scratch, 'corpus'))
+        print(f"{info['documents']} documents, {info['tokens']} tokens, built in {time.perf_counter() - start:.1f}s")
+        print(f"{'workers':>8}{'text MB/worker':>16}{'corpus MB/worker':>18}")
+        for workers in args.workers:
+            text = measure(hold_texts, texts, workers)
+            corpus = measure(hold_corpus, os.path.join(scratch, 'corpus'), workers)
+            print(f'{workers:>8}{text:>16.1f}{corpus:>18.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
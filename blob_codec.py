@@ -0,0 +1,50 @@
+import json
+import zlib
+from typing import Any, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+
+def preferred_codec() -> str:
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+def compress(data: bytes, codec: str = None) -> Tuple[str, bytes]:
+    """Compress bytes with zstd when installed, otherwise zlib; returns (codec, payload)"""
+    codec = codec or preferred_codec()
+    if codec == 'zstd':
+        return codec, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == 'zlib':
+        return codec, zlib.compress(data, ZLIB_LEVEL)
+    if codec == 'none':
+        return codec, data
+    raise ValueError(f'Unknown blob codec: {codec}')
+
+
+def decompress(codec: str, payload: bytes) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd-compressed blobs')
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == 'zlib':
+        return zlib.decompress(payload)
+    if codec == 'none':
+        return payload
+    raise ValueError(f'Unknown blob codec: {codec}')
+
+
+def dumps(value: Any, codec: str = None) -> Tuple[str, bytes, int]:
+    """JSON-encode and compress a value; returns (codec, payload, raw_size)"""
+    raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    codec, payload = compress(raw, codec)
+    return codec, payload, len(raw)
+
+
+def loads(codec: str, payload: bytes) -> Any:
+    return json.loads(decompress(codec, payload).decode('utf-8'))
@@ -0,0 +1,121 @@
+"""Corpus-wide ASR error statistics (substitution pairs, deleted and inserted words).
+
+Counts live in the word_error_stat table and are kept up to date
+incrementally: save_analysis adds the counts of the new analysis and the
+delete endpoints subtract them again, so top-K queries never touch the
+per-analysis `differences` blobs. Analyses saved before the table existed
+are counted by migration 5, so deleting them subtracts counts that were
+really added.
+
+Rebuild the table from scratch by hand with:
+    python error_stats.py backfill
+"""
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List
+from sqlalchemy import text
+from extensions import db
+from models import Transcription, WordErrorStat
+
+KINDS = ('substitution', 'deletion', 'insertion')
+MAX_WORD_LENGTH = 255
+BACKFILL_BATCH_SIZE = 500
+
+
+def count_errors(differences: Iterable[Dict]) -> Counter:
+    """Count (kind, ref_word, hyp_word) triples in WERCalculator.get_word_differences output"""
+    counts = Counter()
+    for diff in differences or []:
+        ref = [w[:MAX_WORD_LENGTH] for w in diff.get('ref', [])]
+        hyp = [w[:MAX_WORD_LENGTH] for w in diff.get('hyp', [])]
+        kind = diff.get('type')
+        if kind == 'replace':
+            # Pair words positionally; the unmatched tail is deleted or inserted
+            for ref_word, hyp_word in zip(ref, hyp):
+                counts[('substitution', ref_word, hyp_word)] += 1
+            for ref_word in ref[len(hyp):]:
+                counts[('deletion', ref_word, '')] += 1
+            for hyp_word in hyp[len(ref):]:
+                counts[('insertion', '', hyp_word)] += 1
+        elif kind == 'delete':
+            for ref_word in ref:
+                counts[('deletion', ref_word, '')] += 1
+        elif kind == 'insert':
+            for hyp_word in hyp:
+                counts[('insertion', '', hyp_word)] += 1
+    return counts
+
+
+def apply_counts_sql(conn, counts: Counter, sign: int = 1):
+    """Add (sign=1) or subtract (sign=-1) counts with a Connection or Session"""
+    if not counts:
+        return
+    rows = [{'kind': kind, 'ref_word': ref_word, 'hyp_word': hyp_word, 'count': sign * n}
+            for (kind, ref_word, hyp_word), n in counts.items()]
+    conn.execute(text(
+        'INSERT INTO word_error_stat (kind, ref_word, hyp_word, count) '
+        'VALUES (:kind, :ref_word, :hyp_word, :count) '
+        'ON CONFLICT (kind, ref_word, hyp_word) DO UPDATE SET count = count + excluded.count'
+    ), rows)
+    if sign < 0:
+        conn.execute(text('DELETE FROM word_error_stat WHERE count <= 0'))
+
+
+def apply_counts(counts: Counter, sign: int = 1):
+    """Add (sign=1) or subtract (sign=-1) counts in the current session's transaction"""
+    apply_counts_sql(db.session, counts, sign)
+
+
+def record_analysis(differences: Iterable[Dict]):
+    apply_counts(count_errors(differences), 1)
+
+
+def forget_analysis(transcription: Transcription):
+    """Subtract a saved analysis' counts; call before deleting the row"""
+    differences = transcription.load_analysis_results(kinds=('differences',)).get('differences', [])
+    apply_counts(count_errors(differences), -1)
+
+
+def clear():
+    WordErrorStat.query.delete()
+
+
+def top_errors(kind: str, limit: int = 20) -> List[Dict]:
+    """Most frequent errors of one kind, served from the (kind, count) index"""
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of: {', '.join(KINDS)}")
+    rows = WordErrorStat.query.filter_by(kind=kind) \
+        .order_by(WordErrorStat.count.desc()).limit(limit).all()
+    return [row.to_dict() for row in rows]
+
+
+def backfill():
+    """Rebuild the table from every saved analysis' differences"""
+    clear()
+    last_id = 0
+    total = 0
+    while True:
+        rows = Transcription.query.filter(Transcription.id > last_id) \
+            .order_by(Transcription.id).limit(BACKFILL_BATCH_SIZE).all()
+        if not rows:
+            break
+        counts = Counter()
+        for row in rows:
+            counts.update(count_errors(row.load_analysis_results(kinds=('differences',)).get('differences', [])))
+        apply_counts(counts, 1)
+        db.session.commit()
+        last_id = rows[-1].id
+        # Drop the loaded rows and their blobs before the next batch
+        db.session.expunge_all()
+        total += len(rows)
+        print(f"Backfilled error statistics for {total} analyses")
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['backfill']:
+        print('usage: python error_stats.py backfill')
+        sys.exit(2)
+    from app import app
+    with app.app_context():
+        backfill()
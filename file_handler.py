@@ -1,24 +1,30 @@
 import os
-import speech_recognition as sr
-from PIL import Image
-import pytesseract
-import PyPDF2
-from docx import Document
 import json
 from typing import Dict, Optional
-import wave
-import contextlib
-import numpy as np
-import whisper
+from media_probe import default_prober, plan_transcription
+from metrics import timed
+# OCR/PDF/DOCX/ASR libraries are imported where they are used so importing
+# this module (and app.py) stays cheap.
+from asr_backends import ASRBackend, get_backend
+from inference_scheduler import SchedulerBusy, inference_scheduler
 
 class FileHandler:
-    def __init__(self, upload_folder: str):
+    def __init__(self, upload_folder: str, asr: Optional[ASRBackend] = None):
         self.upload_folder = upload_folder
-        self.recognizer = sr.Recognizer()
+        self.asr = asr or get_backend()
+        self._recognizer = None
         self.supported_audio = {'.mp3', '.wav'}
         self.supported_video = {'.mp4', '.mkv'}
         self.supported_text = {'.txt', '.pdf', '.docx'}
         self.supported_image = {'.png', '.jpg', '.jpeg'}
+        self.prober = default_prober
+
+    @property
+    def recognizer(self):
+        if self._recognizer is None:
+            import speech_recognition as sr
+            self._recognizer = sr.Recognizer()
+        return self._recognizer
 
     def get_file_metadata(self, file_path: str) -> Dict:
         """Extract metadata from file"""
@@ -33,33 +39,70 @@ class FileHandler:
             'modified': file_stats.st_mtime
         }
         
-        # Add duration for audio/video files
-        if ext in self.supported_audio | self.supported_video:
-            try:
-                with contextlib.closing(wave.open(file_path, 'r')) as f:
-                    frames = f.getnframes()
-                    rate = f.getframerate()
-                    duration = frames / float(rate)
-                    metadata['duration'] = duration
-            except:
-                metadata['duration'] = None
+        # Add duration and stream details for audio/video files from container headers
+        if ext.lower() in self.supported_audio | self.supported_video | {'.webm'}:
+            probe = self.probe_media(file_path)
+            metadata['duration'] = probe.get('duration')
+            for key in ('container', 'codec', 'sample_rate', 'channels', 'bit_rate', 'content_hash'):
+                metadata[key] = probe.get(key)
         
         return metadata
 
-    def extract_text_from_audio(self, file_path: str) -> str:
-        """Extract text from audio file using OpenAI Whisper"""
+    def probe_media(self, file_path: str) -> Dict:
+        """Read cached header metadata for an audio/video file without decoding it"""
+        try:
+            return self.prober.probe(file_path)
+        except OSError as e:
+            print(f"Error probing media file: {e}")
+            return {}
+
+    def plan_transcription(self, file_path: str) -> Dict:
+        """Pick the Whisper model and chunking for a media file before transcribing"""
+        _, ext = os.path.splitext(file_path)
+        return plan_transcription(self.probe_media(file_path), is_video=ext.lower() in self.supported_video)
+
+    def extract_text_from_audio(self, file_path: str, model_name: str = "base", chunk_seconds: Optional[int] = None, duration: Optional[float] = None) -> str:
+        """Extract text from audio file with the configured ASR backend (Whisper by default)"""
         try:
-            model = whisper.load_model("base")  # You can use 'tiny', 'small', etc. for speed/accuracy tradeoff
-            result = model.transcribe(file_path)
-            return result['text']
+            # model_name: 'tiny', 'small', etc. for speed/accuracy tradeoff
+            if chunk_seconds and duration and duration > chunk_seconds:
+                return self._transcribe_in_chunks(model_name, file_path, chunk_seconds, duration)
+            return inference_scheduler.run(self.asr.transcribe, file_path, model_name, stage=self.asr.name)
+        except SchedulerBusy:
+            raise  # the route answers 503 with Retry-After
         except Exception as e:
             return f"Whisper transcription error: {str(e)}"
 
+    def _transcribe_in_chunks(self, model_name: str, file_path: str, chunk_seconds: int, duration: float) -> str:
+        """Transcribe long audio one ffmpeg-decoded chunk at a time to bound memory"""
+        import subprocess
+        texts = []
+        start = 0
+        while start < duration:
+            chunk_path = f"{file_path}_chunk_{int(start)}.wav"
+            cmd = [
+                'ffmpeg', '-y', '-ss', str(start), '-t', str(chunk_seconds), '-i', file_path,
+                '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', chunk_path
+            ]
+            try:
+                with timed('decode'):
+                    subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                texts.append(inference_scheduler.run(self.asr.transcribe, chunk_path, model_name,
+                                                     stage=self.asr.name).strip())
+            finally:
+                if os.path.exists(chunk_path):
+                    os.remove(chunk_path)
+            start += chunk_seconds
+        return ' '.join(t for t in texts if t)
+
     def extract_text_from_image(self, file_path: str) -> str:
         """Extract text from image using OCR"""
         try:
+            from PIL import Image
+            import pytesseract
             image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
+            with timed('ocr'):
+                text = pytesseract.image_to_string(image)
             return text
         except Exception as e:
             return f"Error extracting text from image: {str(e)}"
@@ -67,7 +110,8 @@ class FileHandler:
     def extract_text_from_pdf(self, file_path: str) -> str:
         """Extract text from PDF file"""
         try:
-            with open(file_path, 'rb') as file:
+            import PyPDF2
+            with timed('document_text'), open(file_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
                 text = ""
                 for page in reader.pages:
@@ -79,8 +123,10 @@ class FileHandler:
     def extract_text_from_docx(self, file_path: str) -> str:
         """Extract text from DOCX file"""
         try:
-            doc = Document(file_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            from docx import Document
+            with timed('document_text'):
+                doc = Document(file_path)
+                text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
             return text
         except Exception as e:
             return f"Error extracting text from DOCX: {str(e)}"
@@ -94,7 +140,8 @@ class FileHandler:
                 '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1',
                 '-t', str(max_duration_sec), out_wav_path
             ]
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            with timed('decode'):
+                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             return True
         except Exception as e:
             print(f"Error extracting audio from video: {e}")
@@ -105,19 +152,25 @@ class FileHandler:
         _, ext = os.path.splitext(file_path)
         ext = ext.lower()
         text = ""
+        plan = None
         max_size = 100 * 1024 * 1024  # 100MB
         if os.path.getsize(file_path) > max_size:
             return {'text': '', 'error': 'File too large. Maximum allowed size is 100MB.'}
         if ext in self.supported_audio:
-            text = self.extract_text_from_audio(file_path)
+            plan = self.plan_transcription(file_path)
+            text = self.extract_text_from_audio(
+                file_path, plan['model'], plan['chunk_seconds'], plan['estimated_duration'])
         elif ext in self.supported_video:
-            # Extract audio from video, trim to 1 minute
+            # Extract audio from video, trimmed to the planned maximum (1 minute)
+            plan = self.plan_transcription(file_path)
             out_wav = file_path + '_audio.wav'
-            ok = self.extract_audio_from_video(file_path, out_wav, max_duration_sec=60)
+            ok = self.extract_audio_from_video(file_path, out_wav, max_duration_sec=plan['max_duration'])
             if not ok:
                 return {'text': '', 'error': 'Failed to extract audio from video.'}
-            text = self.extract_text_from_audio(out_wav)
-            os.remove(out_wav)
+            try:
+                text = self.extract_text_from_audio(out_wav, plan['model'])
+            finally:
+                os.remove(out_wav)
         elif ext in self.supported_image:
             try:
                 text = self.extract_text_from_image(file_path)
@@ -133,13 +186,17 @@ class FileHandler:
         else:
             return {'text': '', 'error': 'Unsupported file type.'}
         metadata = self.get_file_metadata(file_path)
+        if plan:
+            # Record which model and chunking produced the transcript
+            metadata['transcription_plan'] = {'model': plan['model'], 'chunk_seconds': plan['chunk_seconds']}
         return {'text': text, 'metadata': metadata}
 
     def save_file(self, file, filename: str) -> Optional[str]:
         """Save uploaded file and return the path"""
         try:
             file_path = os.path.join(self.upload_folder, filename)
-            file.save(file_path)
+            with timed('upload_save'):
+                file.save(file_path)
             return file_path
         except Exception as e:
             print(f"Error saving file: {str(e)}")
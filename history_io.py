@@ -0,0 +1,199 @@
+"""Streaming export and import of analysis history (NDJSON or CSV, optionally gzip).
+
+Export walks Transcription rows in id order, one batch at a time, and drops
+each batch from the session before the next, so memory stays constant no
+matter how large the history is. Exports include the plots, diffs and NLP
+output unless asked not to, so an export/import round trip keeps everything.
+Import reads the request body line by line and bulk-loads batches through
+persistence.save_analyses. Records whose filename, timestamp and texts match
+an existing analysis are skipped, so importing the same file twice is safe.
+"""
+import io
+import csv
+import json
+import zlib
+import gzip
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy.orm import load_only
+from extensions import db
+from models import BLOB_KINDS, Transcription, preload_blobs, preload_texts
+from history_query import apply_filters
+from persistence import save_analyses
+from text_store import content_hash
+
+EXPORT_BATCH_SIZE = 200
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 20
+
+BASE_FIELDS = ['id', 'filename', 'created_at', 'transcribed_text', 'reference_text', 'wer_score', 'file_metadata']
+SUMMARY_FIELDS = ['file_type', 'file_extension', 'file_size', 'reference_word_count', 'transcribed_word_count']
+BLOB_FIELDS = ['analysis_results', 'nlp_results']
+EXPORT_FIELDS = BASE_FIELDS + SUMMARY_FIELDS + BLOB_FIELDS
+# Nested values are JSON-encoded inside CSV cells
+JSON_FIELDS = {'file_metadata', 'analysis_results', 'nlp_results'}
+
+
+def parse_fields(value: Optional[str], include_blobs: bool) -> List[str]:
+    """Validate a comma-separated field list; defaults to everything (blobs only if requested)"""
+    if not value:
+        return BASE_FIELDS + SUMMARY_FIELDS + (BLOB_FIELDS if include_blobs else ['analysis_results'])
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+    return fields
+
+
+def iter_rows(filters: Dict = None, batch_size: int = EXPORT_BATCH_SIZE,
+              blob_kinds=()) -> Iterator[Transcription]:
+    """Yield Transcription rows in id order using keyset batches, with their texts and blob_kinds preloaded"""
+    last_id = 0
+    while True:
+        query = apply_filters(Transcription.query, filters or {})
+        rows = query.filter(Transcription.id > last_id).order_by(Transcription.id).limit(batch_size).all()
+        if not rows:
+            return
+        preloaded = preload_texts(rows) + preload_blobs(rows, blob_kinds)  # noqa: F841 (held for the batch)
+        for row in rows:
+            yield row
+        last_id = rows[-1].id
+        db.session.expunge_all()
+
+
+def export_record(row: Transcription, fields: List[str], include_blobs: bool) -> Dict:
+    record = {}
+    for field in fields:
+        if field == 'created_at':
+            record[field] = row.created_at.isoformat() if row.created_at else None
+        elif field == 'file_metadata':
+            record[field] = json.loads(row.file_metadata) if row.file_metadata else None
+        elif field == 'analysis_results':
+            record[field] = row.load_analysis_results() if include_blobs else \
+                (json.loads(row.analysis_results) if row.analysis_results else None)
+        elif field == 'nlp_results':
+            record[field] = row.load_nlp_results() if include_blobs else None
+        else:
+            record[field] = getattr(row, field)
+    return record
+
+
+def iter_ndjson(records: Iterable[Dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+def iter_csv(records: Iterable[Dict], fields: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for record in records:
+        writer.writerow({k: json.dumps(v) if k in JSON_FIELDS and v is not None else v for k, v in record.items()})
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_gzip(chunks: Iterable[str]) -> Iterator[bytes]:
+    """Gzip a stream of text chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(fmt: str, fields: List[str], include_blobs: bool, compress: bool,
+                filters: Dict = None) -> Iterator:
+    blob_kinds = BLOB_KINDS if include_blobs and set(fields) & set(BLOB_FIELDS) else ()
+    records = (export_record(row, fields, include_blobs) for row in iter_rows(filters, blob_kinds=blob_kinds))
+    chunks = iter_csv(records, fields) if fmt == 'csv' else iter_ndjson(records)
+    return iter_gzip(chunks) if compress else (chunk.encode('utf-8') for chunk in chunks)
+
+
+def import_payload(record: Dict) -> Dict:
+    """Turn an exported record back into a save-analysis payload"""
+    for field in JSON_FIELDS:
+        if isinstance(record.get(field), str):
+            record[field] = json.loads(record[field]) if record[field] else None
+    if record.get('created_at'):
+        datetime.fromisoformat(record['created_at'])  # reject bad timestamps per line, not per batch
+    wer_results = record.get('analysis_results') or {}
+    if record.get('wer_score') not in (None, '') and 'wer_score' not in wer_results:
+        wer_results['wer_score'] = float(record['wer_score'])
+    return {
+        'filename': record.get('filename') or 'Analysis',
+        'created_at': record.get('created_at') or None,
+        'transcribed_text': record.get('transcribed_text') or '',
+        'reference_text': record.get('reference_text') or '',
+        'wer_results': wer_results,
+        'nlp_results': record.get('nlp_results') or {},
+        'file_metadata': record.get('file_metadata') or {},
+    }
+
+
+def _identity(filename: str, created_at: datetime, transcribed_text: Optional[str], reference_text: Optional[str]):
+    # Texts are compared by hash, which is what Transcription rows keep
+    return (filename, created_at, content_hash(transcribed_text) if transcribed_text else None,
+            content_hash(reference_text) if reference_text else None)
+
+
+def drop_existing(payloads: List[Dict]) -> List[Dict]:
+    """Payloads that are not already saved (nor repeated earlier in the list)"""
+    dated = [p for p in payloads if p['created_at']]
+    seen = set()
+    if dated:
+        timestamps = {datetime.fromisoformat(p['created_at']) for p in dated}
+        rows = Transcription.query.options(load_only(
+            Transcription.filename, Transcription.created_at, Transcription.transcribed_hash,
+            Transcription.reference_hash)).filter(Transcription.created_at.in_(timestamps)).all()
+        seen = {(row.filename, row.created_at, row.transcribed_hash, row.reference_hash) for row in rows}
+    fresh = []
+    for payload in payloads:
+        # Without a timestamp the row is saved as new, so it cannot duplicate anything
+        if payload['created_at']:
+            key = _identity(payload['filename'], datetime.fromisoformat(payload['created_at']),
+                            payload['transcribed_text'], payload['reference_text'])
+            if key in seen:
+                continue
+            seen.add(key)
+        fresh.append(payload)
+    return fresh
+
+
+def import_stream(stream, fmt: str, compressed: bool) -> Dict:
+    """Bulk-load an NDJSON/CSV export from a binary stream, IMPORT_BATCH_SIZE rows per transaction"""
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream)
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        csv.field_size_limit(2 ** 31 - 1)
+        lines = enumerate(csv.DictReader(text_stream), start=2)
+    else:
+        lines = ((n, line) for n, line in enumerate(text_stream, start=1) if line.strip())
+    imported, skipped, errors, batch = 0, 0, [], []
+
+    def save(payloads: List[Dict]) -> int:
+        nonlocal skipped
+        fresh = drop_existing(payloads)
+        skipped += len(payloads) - len(fresh)
+        return len(save_analyses(fresh)) if fresh else 0
+
+    for line_number, item in lines:
+        try:
+            record = item if fmt == 'csv' else json.loads(item)
+            batch.append(import_payload(record))
+        except (ValueError, TypeError, AttributeError) as e:
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'line': line_number, 'error': str(e)})
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += save(batch)
+            batch = []
+            db.session.expunge_all()
+    if batch:
+        imported += save(batch)
+    return {'imported': imported, 'skipped': skipped, 'errors': errors}
@@ -0,0 +1,114 @@
+import base64
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import tuple_
+from models import Transcription
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Opaque cursor for the (created_at, id) position of the last row on a page"""
+    raw = f"{created_at.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def _parse_float(args, name: str) -> Optional[float]:
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+
+
+def _parse_date(args, name: str, end_of_day: bool = False) -> Optional[datetime]:
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date or datetime')
+    # A bare date as the upper bound includes that whole day
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def parse_history_args(args) -> Dict:
+    """Read page size, cursor and filters from request args; raises ValueError on bad input"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    cursor = args.get('cursor') or None
+    return {
+        'limit': min(limit, MAX_PAGE_SIZE),
+        'cursor': decode_cursor(cursor) if cursor else None,
+        'include_total': args.get('include_total', '').lower() in ('1', 'true', 'yes'),
+        'wer_min': _parse_float(args, 'wer_min'),
+        'wer_max': _parse_float(args, 'wer_max'),
+        'date_from': _parse_date(args, 'date_from'),
+        'date_to': _parse_date(args, 'date_to', end_of_day=True),
+        'filename_prefix': args.get('filename_prefix') or None,
+        'file_type': args.get('file_type') or None,
+    }
+
+
+def apply_filters(query, params: Dict):
+    """Restrict a Transcription query with the filters from parse_history_args"""
+    if params.get('wer_min') is not None:
+        query = query.filter(Transcription.wer_score >= params['wer_min'])
+    if params.get('wer_max') is not None:
+        query = query.filter(Transcription.wer_score <= params['wer_max'])
+    if params.get('date_from') is not None:
+        query = query.filter(Transcription.created_at >= params['date_from'])
+    if params.get('date_to') is not None:
+        query = query.filter(Transcription.created_at < params['date_to'])
+    if params.get('filename_prefix'):
+        # A range instead of LIKE so SQLite can use the filename index
+        prefix = params['filename_prefix']
+        query = query.filter(Transcription.filename >= prefix,
+                             Transcription.filename < prefix + '\U0010ffff')
+    if params.get('file_type'):
+        query = query.filter(Transcription.file_type == params['file_type'])
+    return query
+
+
+def paginate(query, params: Dict) -> Dict:
+    """Fetch one page newest-first with keyset pagination on (created_at, id).
+
+    Returns the rows, the cursor for the next page (None on the last page) and
+    the filtered total only when include_total was requested.
+    """
+    filtered = apply_filters(query, params)
+    page_query = filtered
+    if params.get('cursor'):
+        created_at, id = params['cursor']
+        page_query = page_query.filter(tuple_(Transcription.created_at, Transcription.id) < (created_at, id))
+    rows = page_query.order_by(Transcription.created_at.desc(), Transcription.id.desc()) \
+        .limit(params['limit'] + 1).all()
+    has_more = len(rows) > params['limit']
+    rows = rows[:params['limit']]
+    page = {
+        'items': rows,
+        'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        'has_more': has_more,
+    }
+    if params.get('include_total'):
+        page['total'] = filtered.order_by(None).count()
+    return page
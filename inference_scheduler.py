@@ -0,0 +1,195 @@
+"""Bounded scheduler for speech recognition inference.
+
+Each torch call uses every core by default, so a few concurrent
+transcriptions on request threads oversubscribe the CPU and all of them
+slow down. The scheduler runs inference on a fixed number of slot threads
+instead. Each slot pins torch to cores // slots intra-op threads. Requests
+wait in one FIFO queue with a deadline for starting. When the queue is
+full, or the expected wait already exceeds the deadline, the request is
+rejected straight away with a Retry-After hint, and the app turns that
+into a 503. With stage set, run() records the time spent queued
+(inference_queue) apart from the inference itself.
+"""
+import os
+import sys
+import math
+import time
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+from metrics import record
+
+QUEUE_STAGE = 'inference_queue'
+
+
+class SchedulerBusy(Exception):
+    """Inference could not be scheduled in time; retry after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SchedulerSaturated(SchedulerBusy):
+    pass
+
+
+class DeadlineExceeded(SchedulerBusy):
+    pass
+
+
+class _Job:
+    __slots__ = ('fn', 'args', 'deadline', 'future', 'queued', 'started', 'finished')
+
+    def __init__(self, fn, args, deadline):
+        self.fn = fn
+        self.args = args
+        self.deadline = deadline
+        self.future = Future()
+        # perf_counter timestamps, set by the slot thread
+        self.queued = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+
+class InferenceScheduler:
+    def __init__(self, slots: int = 1, threads_per_slot: Optional[int] = None, max_queue: int = 16,
+                 deadline: float = 120.0):
+        self.slots = slots
+        self.threads_per_slot = threads_per_slot
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self._queue = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._busy = 0
+        # Exponential moving average of inference seconds, for wait estimates
+        self._service_seconds = None
+        self._counts = {'completed': 0, 'failed': 0, 'rejected': 0, 'expired': 0}
+
+    def _threads(self) -> int:
+        return self.threads_per_slot or max(1, (os.cpu_count() or 1) // self.slots)
+
+    def _start(self):
+        with self._lock:
+            if self._queue is not None:
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            for index in range(self.slots):
+                worker = threading.Thread(target=self._work, name=f'inference-slot-{index}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _pin_torch(self):
+        # Only once Whisper has imported torch; other backends never pay for it
+        torch = sys.modules.get('torch')
+        if torch is None:
+            return False
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # can only be set once per process, before any parallel work
+        # Called from the slot thread: with OpenMP builds the setting is per thread
+        torch.set_num_threads(self._threads())
+        return True
+
+    def _work(self):
+        pinned = False
+        while True:
+            job = self._queue.get()
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            if time.monotonic() > job.deadline:
+                with self._lock:
+                    self._counts['expired'] += 1
+                job.future.set_exception(DeadlineExceeded('Inference deadline passed while queued',
+                                                          self.retry_after()))
+                continue
+            pinned = pinned or self._pin_torch()
+            with self._lock:
+                self._busy += 1
+            start = time.monotonic()
+            job.started = time.perf_counter()
+            try:
+                result = job.fn(*job.args)
+            except BaseException as e:
+                job.finished = time.perf_counter()
+                with self._lock:
+                    self._busy -= 1
+                    self._counts['failed'] += 1
+                job.future.set_exception(e)
+                continue
+            job.finished = time.perf_counter()
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._busy -= 1
+                self._counts['completed'] += 1
+                self._service_seconds = elapsed if self._service_seconds is None \
+                    else 0.8 * self._service_seconds + 0.2 * elapsed
+            job.future.set_result(result)
+
+    def expected_wait(self) -> float:
+        """Seconds a new request would queue before a slot frees up"""
+        if not self._service_seconds or self._queue is None:
+            return 0.0
+        ahead = self._queue.qsize() + self._busy
+        return max(0, ahead - self.slots + 1) * self._service_seconds / self.slots
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.expected_wait()))
+
+    def _reject(self, message: str):
+        with self._lock:
+            self._counts['rejected'] += 1
+        raise SchedulerSaturated(message, self.retry_after())
+
+    def run(self, fn: Callable, *args, deadline: Optional[float] = None, stage: Optional[str] = None):
+        """Run fn(*args) on an inference slot and return its result.
+
+        deadline is the number of seconds the call may wait for a slot.
+        Raises SchedulerSaturated when the request cannot be admitted and
+        DeadlineExceeded when it waited too long. stage names the metric
+        for the inference time; the queue wait goes to inference_queue.
+        """
+        self._start()
+        wait_limit = self.deadline if deadline is None else deadline
+        if self.expected_wait() > wait_limit:
+            self._reject('Inference queue would exceed the deadline')
+        job = _Job(fn, args, time.monotonic() + wait_limit)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._reject('Inference queue is full')
+        try:
+            try:
+                # Only the queueing is bounded; once started the call runs to completion
+                return job.future.result(timeout=wait_limit)
+            except FutureTimeout:
+                if job.future.cancel():
+                    with self._lock:
+                        self._counts['expired'] += 1
+                    raise DeadlineExceeded('Inference deadline passed while queued', self.retry_after())
+                return job.future.result()
+        finally:
+            if stage:
+                self._record(job, stage)
+
+    @staticmethod
+    def _record(job: _Job, stage: str):
+        # Recorded on the calling thread, so the timings land in its request's Server-Timing
+        if job.started is None:
+            record(QUEUE_STAGE, time.perf_counter() - job.queued, failed=True)
+            return
+        record(QUEUE_STAGE, job.started - job.queued)
+        if job.finished is not None:
+            record(stage, job.finished - job.started, failed=job.future.exception() is not None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counts, slots=self.slots, threads_per_slot=self._threads(), busy=self._busy,
+                        queued=self._queue.qsize() if self._queue is not None else 0, max_queue=self.max_queue,
+                        avg_inference_seconds=round(self._service_seconds or 0.0, 3))
+
+
+inference_scheduler = InferenceScheduler()
@@ -0,0 +1,523 @@
+import os
+import json
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, BinaryIO
+
+# Bytes hashed from each end of the file to build the cache key
+HASH_SAMPLE_BYTES = 64 * 1024
+
+WAV_CODECS = {
+    0x0001: 'pcm',
+    0x0003: 'pcm_float',
+    0x0006: 'pcm_alaw',
+    0x0007: 'pcm_mulaw',
+    0x0011: 'adpcm_ima',
+    0x0055: 'mp3',
+}
+
+MP3_BITRATES = {
+    # (mpeg1, layer) -> kbps table indexed by the 4-bit bitrate field
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG 1
+    2: [22050, 24000, 16000],  # MPEG 2
+    0: [11025, 12000, 8000],   # MPEG 2.5
+}
+
+# Matroska / WebM element ids (with the length marker bits kept)
+EBML_HEADER = 0x1A45DFA3
+EBML_DOCTYPE = 0x4282
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_AUDIO = 0xE1
+MKV_SAMPLING_FREQUENCY = 0xB5
+MKV_CHANNELS = 0x9F
+MKV_CLUSTER = 0x1F43B675
+
+
+def file_hash(file_path: str) -> str:
+    """Fingerprint a file from its size and the bytes at both ends.
+
+    Hashing the whole file would cost as much as decoding it, so the cache key
+    only covers the first and last HASH_SAMPLE_BYTES plus the file size.
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(HASH_SAMPLE_BYTES))
+        if size > 2 * HASH_SAMPLE_BYTES:
+            f.seek(-HASH_SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(HASH_SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+def _empty_result(container: str) -> Dict:
+    return {
+        'container': container,
+        'codec': None,
+        'duration': None,
+        'sample_rate': None,
+        'channels': None,
+        'bit_rate': None,
+    }
+
+
+def probe_wav(f: BinaryIO, size: int) -> Dict:
+    """Read duration and format from the RIFF chunk headers of a WAV file"""
+    result = _empty_result('wav')
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return result
+    byte_rate = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, chunk_size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+        if chunk_id == b'fmt ':
+            fmt = f.read(min(chunk_size, 40))
+            if len(fmt) >= 16:
+                tag, channels, rate, byte_rate, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+                if tag == 0xFFFE and len(fmt) >= 26:
+                    # WAVE_FORMAT_EXTENSIBLE stores the real tag in the sub-format GUID
+                    tag = struct.unpack('<H', fmt[24:26])[0]
+                codec = WAV_CODECS.get(tag, f'wav_0x{tag:04x}')
+                if codec == 'pcm':
+                    codec = f'pcm_s{bits}le' if bits > 8 else 'pcm_u8'
+                result.update(codec=codec, sample_rate=rate, channels=channels, bit_rate=byte_rate * 8)
+            f.seek(chunk_size - len(fmt) + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == b'data':
+            # Streamed recordings sometimes leave the size unset; use what is on disk
+            data_size = chunk_size
+            remaining = size - f.tell()
+            if data_size == 0 or data_size > remaining:
+                data_size = remaining
+            if byte_rate:
+                result['duration'] = data_size / float(byte_rate)
+            break
+        else:
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    return result
+
+
+def _parse_mp3_frame_header(header: bytes) -> Optional[Dict]:
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    layer = 4 - layer_bits
+    mpeg1 = version == 3
+    bitrate = MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    channels = 1 if (header[3] >> 6) == 3 else 2
+    if layer == 1:
+        samples_per_frame = 384
+    elif layer == 3 and not mpeg1:
+        samples_per_frame = 576
+    else:
+        samples_per_frame = 1152
+    return {
+        'mpeg1': mpeg1,
+        'layer': layer,
+        'bit_rate': bitrate,
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'samples_per_frame': samples_per_frame,
+    }
+
+
+def probe_mp3(f: BinaryIO, size: int) -> Dict:
+    """Read the first MPEG audio frame (and any Xing/VBRI header) of an MP3 file"""
+    result = _empty_result('mp3')
+    audio_start = 0
+    head = f.read(10)
+    if head[:3] == b'ID3' and len(head) == 10:
+        # ID3v2 tag size is a 28-bit syncsafe integer
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        audio_start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+    f.seek(audio_start)
+    window = f.read(16 * 1024)
+    frame = None
+    offset = 0
+    while offset < len(window) - 4:
+        offset = window.find(b'\xff', offset)
+        if offset < 0:
+            break
+        frame = _parse_mp3_frame_header(window[offset:offset + 4])
+        if frame:
+            break
+        offset += 1
+    if not frame:
+        return result
+    frame_start = audio_start + offset
+    result.update(
+        codec=f"mp{frame['layer']}",
+        sample_rate=frame['sample_rate'],
+        channels=frame['channels'],
+        bit_rate=frame['bit_rate'],
+    )
+    frame_data = window[offset:offset + 200]
+    # Xing/Info header sits after the side information
+    if frame['mpeg1']:
+        side_info = 17 if frame['channels'] == 1 else 32
+    else:
+        side_info = 9 if frame['channels'] == 1 else 17
+    frames = None
+    xing = frame_data[4 + side_info:4 + side_info + 12]
+    if xing[:4] in (b'Xing', b'Info') and len(xing) == 12 and struct.unpack('>I', xing[4:8])[0] & 0x1:
+        frames = struct.unpack('>I', xing[8:12])[0]
+    elif frame_data[36:40] == b'VBRI' and len(frame_data) >= 50:
+        frames = struct.unpack('>I', frame_data[46:50])[0]
+    if frames:
+        result['duration'] = frames * frame['samples_per_frame'] / float(frame['sample_rate'])
+    elif frame['bit_rate']:
+        result['duration'] = (size - frame_start) * 8 / float(frame['bit_rate'])
+    return result
+
+
+def _iter_atoms(f: BinaryIO, start: int, end: int):
+    """Yield (type, payload_offset, payload_size) for the MP4 atoms in a byte range"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        atom_size, atom_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if atom_size == 1:
+            atom_size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif atom_size == 0:
+            atom_size = end - offset
+        if atom_size < header_size:
+            return
+        yield atom_type, offset + header_size, atom_size - header_size
+        offset += atom_size
+
+
+def _find_atom(f: BinaryIO, start: int, end: int, atom_type: bytes):
+    for found_type, offset, size in _iter_atoms(f, start, end):
+        if found_type == atom_type:
+            return offset, size
+    return None
+
+
+def _read_mp4_time(f: BinaryIO, offset: int):
+    """Return (timescale, duration) from an mvhd/mdhd payload"""
+    f.seek(offset)
+    version = f.read(1)[0]
+    if version == 1:
+        f.seek(offset + 4 + 16)
+        timescale, duration = struct.unpack('>IQ', f.read(12))
+    else:
+        f.seek(offset + 4 + 8)
+        timescale, duration = struct.unpack('>II', f.read(8))
+    return timescale, duration
+
+
+def probe_mp4(f: BinaryIO, size: int) -> Dict:
+    """Walk the MP4/MOV atom tree, reading only moov headers"""
+    result = _empty_result('mp4')
+    moov = _find_atom(f, 0, size, b'moov')
+    if not moov:
+        return result
+    moov_start, moov_size = moov
+    moov_end = moov_start + moov_size
+    mvhd = _find_atom(f, moov_start, moov_end, b'mvhd')
+    if mvhd:
+        timescale, duration = _read_mp4_time(f, mvhd[0])
+        if timescale:
+            result['duration'] = duration / float(timescale)
+    video_codec = None
+    for atom_type, trak_start, trak_size in _iter_atoms(f, moov_start, moov_end):
+        if atom_type != b'trak':
+            continue
+        mdia = _find_atom(f, trak_start, trak_start + trak_size, b'mdia')
+        if not mdia:
+            continue
+        mdia_end = mdia[0] + mdia[1]
+        hdlr = _find_atom(f, mdia[0], mdia_end, b'hdlr')
+        if not hdlr:
+            continue
+        f.seek(hdlr[0] + 8)
+        handler = f.read(4)
+        minf = _find_atom(f, mdia[0], mdia_end, b'minf')
+        stbl = minf and _find_atom(f, minf[0], minf[0] + minf[1], b'stbl')
+        stsd = stbl and _find_atom(f, stbl[0], stbl[0] + stbl[1], b'stsd')
+        if not stsd:
+            continue
+        # stsd: version/flags(4) entry_count(4), then the first sample entry
+        f.seek(stsd[0] + 8)
+        entry = f.read(36)
+        if len(entry) < 8:
+            continue
+        codec = entry[4:8].decode('latin-1').strip()
+        if handler == b'soun' and result['codec'] is None:
+            result['codec'] = codec
+            if len(entry) >= 36:
+                result['channels'] = struct.unpack('>H', entry[24:26])[0]
+                result['sample_rate'] = struct.unpack('>I', entry[32:36])[0] >> 16
+            mdhd = _find_atom(f, mdia[0], mdia_end, b'mdhd')
+            if mdhd and result['duration'] is None:
+                timescale, duration = _read_mp4_time(f, mdhd[0])
+                if timescale:
+                    result['duration'] = duration / float(timescale)
+        elif handler == b'vide' and video_codec is None:
+            video_codec = codec
+    result['video_codec'] = video_codec
+    if result['duration']:
+        result['bit_rate'] = int(size * 8 / result['duration'])
+    return result
+
+
+def _read_vint(f: BinaryIO, keep_marker: bool):
+    first = f.read(1)
+    if not first:
+        return None, 0
+    value = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not value & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        return None, 0
+    if not keep_marker:
+        value &= mask - 1
+    rest = f.read(length - 1)
+    unknown = not keep_marker and value == mask - 1
+    for byte in rest:
+        value = (value << 8) | byte
+        unknown = unknown and byte == 0xFF
+    if unknown:
+        return -1, length
+    return value, length
+
+
+def _iter_ebml(f: BinaryIO, start: int, end: Optional[int]):
+    """Yield (element_id, payload_offset, payload_size) for EBML children.
+
+    payload_size is -1 for elements of unknown size (live WebM recordings).
+    """
+    f.seek(start)
+    while end is None or f.tell() < end:
+        element_id, _ = _read_vint(f, keep_marker=True)
+        if element_id is None:
+            return
+        element_size, _ = _read_vint(f, keep_marker=False)
+        if element_size is None:
+            return
+        offset = f.tell()
+        yield element_id, offset, element_size
+        if element_size < 0:
+            return
+        f.seek(offset + element_size)
+
+
+def _read_ebml_uint(f: BinaryIO, offset: int, size: int) -> int:
+    f.seek(offset)
+    return int.from_bytes(f.read(size), 'big')
+
+
+def _read_ebml_float(f: BinaryIO, offset: int, size: int) -> Optional[float]:
+    f.seek(offset)
+    data = f.read(size)
+    if size == 4:
+        return struct.unpack('>f', data)[0]
+    if size == 8:
+        return struct.unpack('>d', data)[0]
+    return None
+
+
+def probe_matroska(f: BinaryIO, size: int) -> Dict:
+    """Read Info and Tracks from a Matroska/WebM segment, stopping at the first cluster"""
+    result = _empty_result('matroska')
+    elements = _iter_ebml(f, 0, size)
+    first = next(elements, None)
+    if not first or first[0] != EBML_HEADER:
+        return result
+    for element_id, offset, element_size in _iter_ebml(f, first[1], first[1] + first[2]):
+        if element_id == EBML_DOCTYPE:
+            f.seek(offset)
+            result['container'] = f.read(element_size).rstrip(b'\x00').decode('ascii', 'replace')
+    segment = next(_iter_ebml(f, first[1] + first[2], size), None)
+    if not segment or segment[0] != MKV_SEGMENT:
+        return result
+    segment_end = size if segment[2] < 0 else min(size, segment[1] + segment[2])
+    timecode_scale = 1000000
+    raw_duration = None
+    video_codec = None
+    for element_id, offset, element_size in _iter_ebml(f, segment[1], segment_end):
+        if element_id == MKV_CLUSTER or element_size < 0:
+            break
+        if element_id == MKV_INFO:
+            for child_id, child_offset, child_size in _iter_ebml(f, offset, offset + element_size):
+                if child_id == MKV_TIMECODE_SCALE:
+                    timecode_scale = _read_ebml_uint(f, child_offset, child_size)
+                elif child_id == MKV_DURATION:
+                    raw_duration = _read_ebml_float(f, child_offset, child_size)
+        elif element_id == MKV_TRACKS:
+            for track_id, track_offset, track_size in list(_iter_ebml(f, offset, offset + element_size)):
+                if track_id != MKV_TRACK_ENTRY:
+                    continue
+                track = {}
+                for child_id, child_offset, child_size in list(_iter_ebml(f, track_offset, track_offset + track_size)):
+                    if child_id == MKV_TRACK_TYPE:
+                        track['type'] = _read_ebml_uint(f, child_offset, child_size)
+                    elif child_id == MKV_CODEC_ID:
+                        f.seek(child_offset)
+                        track['codec'] = f.read(child_size).rstrip(b'\x00').decode('ascii', 'replace')
+                    elif child_id == MKV_AUDIO:
+                        for audio_id, audio_offset, audio_size in _iter_ebml(f, child_offset, child_offset + child_size):
+                            if audio_id == MKV_SAMPLING_FREQUENCY:
+                                track['sample_rate'] = _read_ebml_float(f, audio_offset, audio_size)
+                            elif audio_id == MKV_CHANNELS:
+                                track['channels'] = _read_ebml_uint(f, audio_offset, audio_size)
+                if track.get('type') == 2 and result['codec'] is None:
+                    result['codec'] = track.get('codec')
+                    if track.get('sample_rate'):
+                        result['sample_rate'] = int(track['sample_rate'])
+                    result['channels'] = track.get('channels', 1)
+                elif track.get('type') == 1 and video_codec is None:
+                    video_codec = track.get('codec')
+    result['video_codec'] = video_codec
+    if raw_duration:
+        result['duration'] = raw_duration * timecode_scale / 1e9
+        result['bit_rate'] = int(size * 8 / result['duration'])
+    return result
+
+
+PROBERS = {
+    '.wav': probe_wav,
+    '.mp3': probe_mp3,
+    '.mp4': probe_mp4,
+    '.m4a': probe_mp4,
+    '.mov': probe_mp4,
+    '.mkv': probe_matroska,
+    '.webm': probe_matroska,
+}
+
+
+class MediaProber:
+    """Header-only metadata reader for the audio/video formats we accept.
+
+    Results are cached in memory (and optionally as JSON files under
+    cache_dir) keyed by file_hash(), so repeated uploads of the same media and
+    the several metadata lookups made for one request only parse headers once.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: int = 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def supports(self, file_path: str) -> bool:
+        return os.path.splitext(file_path)[1].lower() in PROBERS
+
+    def _cache_get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return dict(self._cache[key])
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + '.json')
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._cache_put(key, result, persist=False)
+            return dict(result)
+        return None
+
+    def _cache_put(self, key: str, result: Dict, persist: bool = True):
+        with self._lock:
+            self._cache[key] = dict(result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        if persist and self.cache_dir:
+            path = os.path.join(self.cache_dir, key + '.json')
+            try:
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(result, f)
+            except OSError as e:
+                print(f"Error writing media probe cache: {e}")
+
+    def probe(self, file_path: str) -> Dict:
+        """Return container, codec, duration, sample_rate, channels and bit_rate"""
+        ext = os.path.splitext(file_path)[1].lower()
+        size = os.path.getsize(file_path)
+        key = file_hash(file_path)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        prober = PROBERS.get(ext)
+        result = _empty_result(ext.lstrip('.'))
+        if prober:
+            try:
+                with open(file_path, 'rb') as f:
+                    result = prober(f, size)
+            except (OSError, struct.error, IndexError, ValueError) as e:
+                print(f"Error probing media headers for {file_path}: {e}")
+        result['size'] = size
+        result['content_hash'] = key
+        self._cache_put(key, result)
+        return dict(result)
+
+
+def plan_transcription(probe: Dict, is_video: bool = False) -> Dict:
+    """Choose a Whisper model and chunking strategy from probed metadata.
+
+    Short clips use the 'base' model in one pass. Long recordings are split
+    into fixed-size chunks so only one chunk is decoded in memory at a time,
+    and very long ones fall back to the faster 'tiny' model. Video keeps the
+    existing one-minute extraction cap.
+    """
+    duration = probe.get('duration')
+    if duration is None and probe.get('bit_rate'):
+        duration = probe.get('size', 0) * 8 / float(probe['bit_rate'])
+    plan = {
+        'model': 'base',
+        'chunk_seconds': None,
+        'max_duration': 60 if is_video else None,
+        'estimated_duration': duration,
+    }
+    effective = duration
+    if plan['max_duration'] and effective is not None:
+        effective = min(effective, plan['max_duration'])
+    if effective is None:
+        return plan
+    if effective > 10 * 60:
+        plan['chunk_seconds'] = 300
+    if effective > 60 * 60:
+        plan['model'] = 'tiny'
+    return plan
+
+
+# Shared so that per-request FileHandler instances reuse one cache
+default_prober = MediaProber()
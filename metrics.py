@@ -0,0 +1,167 @@
+"""In-process request and stage metrics.
+
+timed('stage') records how long a block took into a per-stage histogram
+and, inside a request, into the list that becomes the response's
+Server-Timing header. init_metrics() adds request histograms/counters and
+serves everything in Prometheus text format at /metrics. Values are per
+process; with several workers, scrape each one (or aggregate upstream).
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+# Seconds; covers sub-millisecond normalization up to multi-minute Whisper runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield f'{self.name}{_labels(self.label_names, label_values)} {value}'
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in items:
+            names = self.label_names + ('le',)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(names, label_values + (f"{bound:g}",))} {cumulative}'
+            yield f'{self.name}_bucket{_labels(names, label_values + ("+Inf",))} {series[-1]}'
+            yield f'{self.name}_sum{_labels(self.label_names, label_values)} {series[-2]}'
+            yield f'{self.name}_count{_labels(self.label_names, label_values)} {series[-1]}'
+
+
+STAGE_SECONDS = Histogram('wer_stage_duration_seconds', 'Time spent in each processing stage', ['stage'])
+STAGE_ERRORS = Counter('wer_stage_errors_total', 'Processing stages that raised', ['stage'])
+REQUEST_SECONDS = Histogram('wer_request_duration_seconds', 'HTTP request latency', ['endpoint', 'method'])
+REQUESTS = Counter('wer_requests_total', 'HTTP requests by endpoint and status', ['endpoint', 'method', 'status'])
+METRICS = [STAGE_SECONDS, STAGE_ERRORS, REQUEST_SECONDS, REQUESTS]
+
+
+def _request_timings():
+    """Stage timings of the current request, or None outside a request"""
+    from flask import g, has_request_context
+    if not has_request_context():
+        return None
+    if 'stage_timings' not in g:
+        g.stage_timings = []
+    return g.stage_timings
+
+
+def record(stage: str, seconds: float, failed: bool = False):
+    """Record a duration measured elsewhere (e.g. on a worker thread) under stage"""
+    if failed:
+        STAGE_ERRORS.inc(stage)
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _request_timings()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of the enclosed block under stage"""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, failed)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing(timings, total: float) -> str:
+    """Server-Timing header value; repeated stages (e.g. Whisper chunks) are summed"""
+    merged: Dict[str, float] = {}
+    for stage, elapsed in timings:
+        merged[stage] = merged.get(stage, 0.0) + elapsed
+    entries = [f'{stage};dur={elapsed * 1000:.1f}' for stage, elapsed in merged.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def init_metrics(app):
+    """Time every request, add Server-Timing to /api/ responses and serve /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, endpoint, request.method)
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        if request.path.startswith('/api/'):
+            response.headers['Server-Timing'] = server_timing(g.get('stage_timings', []), elapsed)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,251 @@
+"""Lightweight SQLite schema migrations for wer_analysis.db.
+
+The applied version is kept in SQLite's PRAGMA user_version. Each migration
+is idempotent (it checks for existing columns/indexes) because a fresh
+database created by db.create_all() already has the current schema and only
+needs its version stamped.
+
+Run manually with:  python migrations.py
+"""
+import json
+import logging
+from sqlalchemy import inspect, text
+
+BACKFILL_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def _add_columns(conn, table, columns):
+    existing = _columns(conn, table)
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+
+
+def _create_indexes(conn, indexes):
+    for name, table, columns in indexes:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+
+
+def _loads(raw):
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        return {}
+
+
+def _summary_columns(row) -> dict:
+    # Frozen copy of Transcription.update_summary as of this migration; later model
+    # changes must not change what an old migration writes
+    analysis_results = _loads(row.analysis_results)
+    file_metadata = _loads(row.file_metadata)
+    word_counts = (analysis_results.get('statistics') or {}).get('Word Count') or {}
+    size = file_metadata.get('size')
+    return {
+        'id': row.id,
+        'file_type': file_metadata.get('type') or 'Unknown',
+        'file_extension': (file_metadata.get('extension') or '').lstrip('.').lower()[:16] or None,
+        'file_size': int(size) if isinstance(size, (int, float)) else None,
+        'reference_word_count': word_counts.get('reference', len((row.reference_text or '').split())),
+        'transcribed_word_count': word_counts.get('transcribed', len((row.transcribed_text or '').split())),
+    }
+
+
+def add_summary_columns(conn):
+    """1: summary columns + indexes on transcription, backfilled from the JSON blobs"""
+    _add_columns(conn, 'transcription', [
+        ('file_type', 'VARCHAR(32)'),
+        ('file_extension', 'VARCHAR(16)'),
+        ('file_size', 'BIGINT'),
+        ('reference_word_count', 'INTEGER'),
+        ('transcribed_word_count', 'INTEGER'),
+    ])
+    _create_indexes(conn, [
+        ('ix_transcription_created_at', 'transcription', 'created_at'),
+        ('ix_transcription_wer_score', 'transcription', 'wer_score'),
+        ('ix_transcription_file_type', 'transcription', 'file_type'),
+    ])
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, transcribed_text, reference_text, analysis_results, file_metadata '
+            'FROM transcription WHERE id > :last_id AND file_type IS NULL ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        updates = [_summary_columns(row) for row in rows]
+        conn.execute(text(
+            'UPDATE transcription SET file_type = :file_type, file_extension = :file_extension, '
+            'file_size = :file_size, reference_word_count = :reference_word_count, '
+            'transcribed_word_count = :transcribed_word_count WHERE id = :id'
+        ), updates)
+        last_id = rows[-1].id
+
+
+def add_history_pagination_indexes(conn):
+    """2: composite (created_at, id) index for keyset pagination, filename index for prefix filters"""
+    _create_indexes(conn, [
+        ('ix_transcription_created_id', 'transcription', 'created_at, id'),
+        ('ix_transcription_filename', 'transcription', 'filename'),
+    ])
+
+
+def move_artifacts_to_blobs(conn):
+    """3: move plots, diffs and NLP output out of transcription into compressed transcription_blob rows"""
+    import blob_codec
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, analysis_results, nlp_results FROM transcription '
+            'WHERE id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        blobs, updates = [], []
+        for row in rows:
+            analysis = _loads(row.analysis_results)
+            if row.nlp_results is None and 'plots' not in analysis and 'differences' not in analysis:
+                continue  # already split
+            artifacts = {
+                'plots': analysis.pop('plots', {}),
+                'differences': {
+                    'differences': analysis.pop('differences', []),
+                    'word_differences': analysis.pop('word_differences', [])
+                },
+                'nlp_results': _loads(row.nlp_results)
+            }
+            for kind, value in artifacts.items():
+                codec, payload, raw_size = blob_codec.dumps(value)
+                blobs.append({'transcription_id': row.id, 'kind': kind, 'codec': codec,
+                              'raw_size': raw_size, 'data': payload})
+            updates.append({'id': row.id, 'analysis_results': json.dumps(analysis)})
+        if blobs:
+            conn.execute(text(
+                'INSERT OR REPLACE INTO transcription_blob (transcription_id, kind, codec, raw_size, data) '
+                'VALUES (:transcription_id, :kind, :codec, :raw_size, :data)'
+            ), blobs)
+            conn.execute(text(
+                'UPDATE transcription SET analysis_results = :analysis_results, nlp_results = NULL WHERE id = :id'
+            ), updates)
+    # The freed pages are only returned to the filesystem by VACUUM
+    return {'vacuum': True}
+
+
+def deduplicate_texts(conn):
+    """4: move inline reference/transcribed texts into the content-addressed text_entry table"""
+    from text_store import content_hash
+    _add_columns(conn, 'transcription', [
+        ('transcribed_hash', 'VARCHAR(64) REFERENCES text_entry (hash)'),
+        ('reference_hash', 'VARCHAR(64) REFERENCES text_entry (hash)'),
+    ])
+    _create_indexes(conn, [
+        ('ix_transcription_transcribed_hash', 'transcription', 'transcribed_hash'),
+        ('ix_transcription_reference_hash', 'transcription', 'reference_hash'),
+    ])
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, transcribed_text, reference_text FROM transcription '
+            'WHERE id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        entries, updates = {}, []
+        for row in rows:
+            update = {'id': row.id, 'transcribed_hash': None, 'reference_hash': None}
+            for field in ('transcribed', 'reference'):
+                content = getattr(row, f'{field}_text')
+                if content:
+                    content_key = content_hash(content)
+                    entry = entries.setdefault(content_key, {'hash': content_key, 'content': content, 'n': 0})
+                    entry['n'] += 1
+                    update[f'{field}_hash'] = content_key
+            if update['transcribed_hash'] or update['reference_hash']:
+                updates.append(update)
+        if not updates:
+            continue
+        conn.execute(text(
+            'INSERT INTO text_entry (hash, content, refcount) VALUES (:hash, :content, :n) '
+            'ON CONFLICT (hash) DO UPDATE SET refcount = refcount + excluded.refcount'
+        ), list(entries.values()))
+        conn.execute(text(
+            'UPDATE transcription SET '
+            'transcribed_hash = COALESCE(:transcribed_hash, transcribed_hash), '
+            'transcribed_text = CASE WHEN :transcribed_hash IS NULL THEN transcribed_text END, '
+            'reference_hash = COALESCE(:reference_hash, reference_hash), '
+            'reference_text = CASE WHEN :reference_hash IS NULL THEN reference_text END '
+            'WHERE id = :id'
+        ), updates)
+    return {'vacuum': True}
+
+
+def backfill_error_stats(conn):
+    """5: rebuild word_error_stat from every saved analysis' differences"""
+    import blob_codec
+    # Deliberately the live counting: error_stats.forget_analysis subtracts exactly what
+    # count_errors yields for a row, so the backfilled totals must come from the same function
+    from error_stats import apply_counts_sql, count_errors
+    from collections import Counter
+    conn.execute(text('DELETE FROM word_error_stat'))
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT t.id, t.analysis_results, b.codec, b.data FROM transcription t '
+            "LEFT JOIN transcription_blob b ON b.transcription_id = t.id AND b.kind = 'differences' "
+            'WHERE t.id > :last_id ORDER BY t.id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        counts = Counter()
+        for row in rows:
+            differences = _loads(row.analysis_results).get('differences')
+            if differences is None and row.data is not None:
+                differences = blob_codec.loads(row.codec, row.data).get('differences')
+            counts.update(count_errors(differences))
+        apply_counts_sql(conn, counts)
+
+
+MIGRATIONS = [
+    add_summary_columns,
+    add_history_pagination_indexes,
+    move_artifacts_to_blobs,
+    deduplicate_texts,
+    backfill_error_stats,
+]
+
+
+def run_migrations(db):
+    """Apply every migration newer than the database's user_version"""
+    vacuum = False
+    with db.engine.begin() as conn:
+        if 'transcription' not in inspect(conn).get_table_names():
+            return
+        version = conn.execute(text('PRAGMA user_version')).scalar() or 0
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            logger.info('Applying migration %d: %s', number, migration.__name__)
+            outcome = migration(conn) or {}
+            vacuum = vacuum or outcome.get('vacuum', False)
+            conn.execute(text(f'PRAGMA user_version = {number}'))
+    if vacuum:
+        # VACUUM cannot run inside a transaction
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('VACUUM'))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    from app import app
+    from extensions import db
+    with app.app_context():
+        db.create_all()
+        run_migrations(db)
@@ -1,19 +1,143 @@
 from extensions import db
 from datetime import datetime
 import json
+import blob_codec
+
+# Heavy artifacts kept in TranscriptionBlob instead of the main row
+BLOB_KINDS = ('plots', 'differences', 'nlp_results')
 
 class Transcription(db.Model):
+    __table_args__ = (
+        # Keyset pagination order for history listings
+        db.Index('ix_transcription_created_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    transcribed_text = db.Column(db.Text)
-    reference_text = db.Column(db.Text)
-    wer_score = db.Column(db.Float)
+    filename = db.Column(db.String(255), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Inline texts of rows saved before the text store; new rows point at TextEntry by hash
+    _transcribed_text = db.Column('transcribed_text', db.Text)
+    _reference_text = db.Column('reference_text', db.Text)
+    transcribed_hash = db.Column(db.String(64), db.ForeignKey('text_entry.hash'), index=True)
+    reference_hash = db.Column(db.String(64), db.ForeignKey('text_entry.hash'), index=True)
+    wer_score = db.Column(db.Float, index=True)
     nlp_results = db.Column(db.Text)  # JSON string of NLP results
     analysis_results = db.Column(db.Text)  # JSON string of WER analysis results
     file_metadata = db.Column(db.Text)  # JSON string of file metadata
+    # Denormalized summary columns so history listings never parse the JSON blobs
+    file_type = db.Column(db.String(32), index=True)
+    file_extension = db.Column(db.String(16))
+    file_size = db.Column(db.BigInteger)
+    reference_word_count = db.Column(db.Integer)
+    transcribed_word_count = db.Column(db.Integer)
+    blobs = db.relationship('TranscriptionBlob', backref='transcription', lazy='select',
+                            cascade='all, delete-orphan')
 
-    def to_dict(self):
+    # Columns read by history listings
+    SUMMARY_COLUMNS = ('id', 'filename', 'created_at', 'wer_score', 'file_type',
+                       'file_extension', 'file_size', 'reference_word_count', 'transcribed_word_count')
+
+    def _stored_text(self, text_hash, inline):
+        if text_hash is None:
+            return inline
+        # Rows sharing a reference share one TextEntry in the session identity map
+        entry = db.session.get(TextEntry, text_hash)
+        return entry.content if entry else inline
+
+    @property
+    def transcribed_text(self):
+        return self._stored_text(self.transcribed_hash, self._transcribed_text)
+
+    @transcribed_text.setter
+    def transcribed_text(self, value):
+        self._transcribed_text = value
+        self.transcribed_hash = None
+
+    @property
+    def reference_text(self):
+        return self._stored_text(self.reference_hash, self._reference_text)
+
+    @reference_text.setter
+    def reference_text(self, value):
+        self._reference_text = value
+        self.reference_hash = None
+
+    def update_summary(self, analysis_results: dict, file_metadata: dict):
+        """Copy the listing fields out of the analysis/metadata dicts into summary columns"""
+        analysis_results = analysis_results or {}
+        file_metadata = file_metadata or {}
+        word_counts = (analysis_results.get('statistics') or {}).get('Word Count') or {}
+        self.file_type = file_metadata.get('type') or 'Unknown'
+        self.file_extension = (file_metadata.get('extension') or '').lstrip('.').lower()[:16] or None
+        size = file_metadata.get('size')
+        self.file_size = int(size) if isinstance(size, (int, float)) else None
+        self.reference_word_count = word_counts.get('reference', len((self.reference_text or '').split()))
+        self.transcribed_word_count = word_counts.get('transcribed', len((self.transcribed_text or '').split()))
+
+    def to_summary_dict(self):
+        return {
+            'id': self.id,
+            'wer_score': float(self.wer_score or 0.0),
+            'metadata': {
+                'filename': self.filename or 'Manual Analysis',
+                'created': self.created_at.isoformat() if self.created_at else None,
+                'type': self.file_type,
+                'extension': self.file_extension or 'N/A',
+                'size': self.file_size if self.file_size is not None else 'N/A',
+                'reference_words': self.reference_word_count,
+                'transcribed_words': self.transcribed_word_count
+            },
+        }
+
+    def set_artifacts(self, analysis_results: dict, nlp_results: dict):
+        """Store small analysis fields on the row and compress plots, diffs and NLP output into blobs"""
+        analysis_results = analysis_results or {}
+        self.analysis_results = json.dumps({
+            key: value for key, value in analysis_results.items()
+            if key not in ('plots', 'differences', 'word_differences')
+        })
+        self.nlp_results = None
+        artifacts = {
+            'plots': analysis_results.get('plots', {}),
+            'differences': {
+                'differences': analysis_results.get('differences', []),
+                'word_differences': analysis_results.get('word_differences', [])
+            },
+            'nlp_results': nlp_results or {}
+        }
+        self.blobs = [TranscriptionBlob.from_value(kind, value) for kind, value in artifacts.items()]
+
+    def load_blob(self, kind: str):
+        """Decompress one artifact; only that blob row is read"""
+        blob = None
+        if self.id is not None:
+            blob = db.session.get(TranscriptionBlob, (self.id, kind))
+        return blob.value() if blob else None
+
+    def load_analysis_results(self, kinds=('plots', 'differences')) -> dict:
+        """Analysis results with the requested heavy artifacts merged back in"""
+        results = json.loads(self.analysis_results) if self.analysis_results else {}
+        if 'plots' in kinds and 'plots' not in results:
+            plots = self.load_blob('plots')
+            if plots is not None:
+                results['plots'] = plots
+        if 'differences' in kinds and 'differences' not in results:
+            results.update(self.load_blob('differences') or {})
+        return results
+
+    def load_nlp_results(self):
+        # Rows saved before blob storage still carry NLP output inline
+        if self.nlp_results:
+            return json.loads(self.nlp_results)
+        return self.load_blob('nlp_results')
+
+    def to_dict(self, include_blobs: bool = True):
+        if include_blobs:
+            analysis_results = self.load_analysis_results()
+            nlp_results = self.load_nlp_results()
+        else:
+            analysis_results = json.loads(self.analysis_results) if self.analysis_results else None
+            nlp_results = None
         return {
             'id': self.id,
             'filename': self.filename,
@@ -21,7 +145,73 @@ class Transcription(db.Model):
             'transcribed_text': self.transcribed_text,
             'reference_text': self.reference_text,
             'wer_score': self.wer_score,
-            'nlp_results': json.loads(self.nlp_results) if self.nlp_results else None,
-            'analysis_results': json.loads(self.analysis_results) if self.analysis_results else None,
+            'nlp_results': nlp_results,
+            'analysis_results': analysis_results or None,
             'file_metadata': json.loads(self.file_metadata) if self.file_metadata else None
-        } 
\ No newline at end of file
+        }
+
+def preload_texts(rows) -> list:
+    """Load the TextEntry rows behind a page of transcriptions with one IN query.
+
+    Afterwards transcribed_text/reference_text find them in the session's
+    identity map instead of querying per row. That map holds weak
+    references, so keep the returned list alive while the rows are used.
+    """
+    hashes = {h for row in rows for h in (row.transcribed_hash, row.reference_hash) if h}
+    if not hashes:
+        return []
+    return TextEntry.query.filter(TextEntry.hash.in_(hashes)).all()
+
+def preload_blobs(rows, kinds=BLOB_KINDS) -> list:
+    """Load the given artifact blobs of a page of transcriptions with one IN query (see preload_texts)"""
+    ids = [row.id for row in rows if row.id is not None]
+    if not ids or not kinds:
+        return []
+    return TranscriptionBlob.query.filter(TranscriptionBlob.transcription_id.in_(ids),
+                                          TranscriptionBlob.kind.in_(kinds)).all()
+
+# Deduplicated reference/transcribed texts, keyed by SHA-256 of the content
+class TextEntry(db.Model):
+    __tablename__ = 'text_entry'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    content = db.Column(db.Text, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)  # Transcription columns pointing here
+
+class TranscriptionBlob(db.Model):
+    __tablename__ = 'transcription_blob'
+
+    transcription_id = db.Column(db.Integer, db.ForeignKey('transcription.id', ondelete='CASCADE'), primary_key=True)
+    kind = db.Column(db.String(32), primary_key=True)  # one of BLOB_KINDS
+    codec = db.Column(db.String(8), nullable=False)  # 'zstd', 'zlib' or 'none'
+    raw_size = db.Column(db.Integer)  # uncompressed JSON size in bytes
+    data = db.Column(db.LargeBinary)
+
+    @classmethod
+    def from_value(cls, kind: str, value):
+        codec, payload, raw_size = blob_codec.dumps(value)
+        return cls(kind=kind, codec=codec, raw_size=raw_size, data=payload)
+
+    def value(self):
+        return blob_codec.loads(self.codec, self.data)
+
+# Corpus-wide error counts, maintained incrementally by error_stats
+class WordErrorStat(db.Model):
+    __tablename__ = 'word_error_stat'
+    __table_args__ = (
+        # Top-K queries per kind
+        db.Index('ix_word_error_stat_kind_count', 'kind', 'count'),
+    )
+
+    kind = db.Column(db.String(16), primary_key=True)  # 'substitution', 'deletion' or 'insertion'
+    ref_word = db.Column(db.String(255), primary_key=True)  # '' for insertions
+    hyp_word = db.Column(db.String(255), primary_key=True)  # '' for deletions
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'ref_word': self.ref_word or None,
+            'hyp_word': self.hyp_word or None,
+            'count': self.count
+        }
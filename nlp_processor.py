@@ -1,22 +1,51 @@
-import nltk
-import spacy
-from nltk.stem import PorterStemmer, WordNetLemmatizer
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.corpus import wordnet
 import re
+import threading
 
-# Download required NLTK data
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
-nltk.download('averaged_perceptron_tagger')
+# NLTK resources as (download name, nltk.data path)
+NLTK_RESOURCES = [
+    ('punkt', 'tokenizers/punkt'),
+    ('stopwords', 'corpora/stopwords'),
+    ('wordnet', 'corpora/wordnet'),
+    ('averaged_perceptron_tagger', 'taggers/averaged_perceptron_tagger'),
+]
+SPACY_MODEL = 'en_core_web_sm'
 
-# Load spaCy model
-nlp = spacy.load('en_core_web_sm')
+# spaCy and NLTK are loaded on first use, not at import time
+_nlp = None
+_nltk_ready = False
+_load_lock = threading.Lock()
+
+def ensure_nltk_data():
+    """Download the NLTK resources that are not installed yet"""
+    global _nltk_ready
+    if _nltk_ready:
+        return
+    import nltk
+    with _load_lock:
+        for name, path in NLTK_RESOURCES:
+            try:
+                nltk.data.find(path)
+            except LookupError:
+                nltk.download(name, quiet=True)
+        _nltk_ready = True
+
+def load_spacy():
+    global _nlp
+    if _nlp is None:
+        with _load_lock:
+            if _nlp is None:
+                import spacy
+                _nlp = spacy.load(SPACY_MODEL)
+    return _nlp
+
+def nlp_loaded() -> bool:
+    return _nlp is not None and _nltk_ready
 
 class NLPProcessor:
     def __init__(self):
+        ensure_nltk_data()
+        from nltk.stem import PorterStemmer, WordNetLemmatizer
+        from nltk.corpus import stopwords
         self.stemmer = PorterStemmer()
         self.lemmatizer = WordNetLemmatizer()
         self.stop_words = set(stopwords.words('english'))
@@ -29,6 +58,7 @@ class NLPProcessor:
         return text
 
     def tokenize(self, text):
+        from nltk.tokenize import word_tokenize
         return word_tokenize(text)
 
     def remove_stopwords(self, tokens):
@@ -41,14 +71,15 @@ class NLPProcessor:
         return [self.lemmatizer.lemmatize(token) for token in tokens]
 
     def get_pos_tags(self, text):
-        doc = nlp(text)
+        doc = load_spacy()(text)
         return [(token.text, token.pos_) for token in doc]
 
     def get_named_entities(self, text):
-        doc = nlp(text)
+        doc = load_spacy()(text)
         return [(ent.text, ent.label_) for ent in doc.ents]
 
     def expand_synonyms(self, tokens):
+        from nltk.corpus import wordnet
         synonyms = []
         for token in tokens:
             synsets = wordnet.synsets(token)
@@ -0,0 +1,237 @@
+"""ReportLab vector versions of the six analysis charts for PDF reports.
+
+The Plotly figures only visualize simple series (word counts, word-length
+box statistics, radar metrics, per-position word lengths and edit operation
+counts), so the PDF draws them directly from the normalized texts as vector
+graphics: no Kaleido/Chromium, a few milliseconds per chart and a few KB
+per page instead of 3x PNGs. Selected with PDF_CHART_BACKEND = 'vector'.
+"""
+from collections import Counter
+from typing import Dict, List
+import numpy as np
+from reportlab.lib import colors
+from reportlab.graphics import renderPDF
+from reportlab.graphics.shapes import Drawing, Rect, Line, String
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.lineplots import LinePlot
+from reportlab.graphics.charts.spider import SpiderChart
+from wer_calculator import WERCalculator
+
+CHART_NAMES = ('confusion_matrix', 'word_count_comparison', 'statistics_plot',
+               'radar_chart', 'linear_regression', 'bar_chart')
+TITLES = {
+    'confusion_matrix': 'Word Confusion Matrix',
+    'word_count_comparison': 'Word Count Comparison',
+    'statistics_plot': 'Word Length Statistics',
+    'radar_chart': 'Text Metrics Radar Chart',
+    'linear_regression': 'Word Length Linear Regression',
+    'bar_chart': 'Edit Operations Bar Chart',
+}
+# Plotly's default trace colours, so the PDF matches the web view
+REFERENCE_COLOR = colors.HexColor('#636EFA')
+HYPOTHESIS_COLOR = colors.HexColor('#EF553B')
+MATCH_COLOR = colors.HexColor('#FDE725')
+MISMATCH_COLOR = colors.HexColor('#440154')
+# Long transcripts would make these charts unreadable (and huge), so they are capped
+MAX_MATRIX_WORDS = 40
+MAX_BAR_WORDS = 15
+MAX_LINE_POINTS = 400
+
+
+def chart_data(reference: str, hypothesis: str) -> Dict[str, Dict]:
+    """Series behind each chart, computed from normalized reference/hypothesis texts"""
+    calculator = WERCalculator()
+    ref_words = calculator.transformation(reference)
+    hyp_words = calculator.transformation(hypothesis)
+    ref_lengths = [len(w) for w in ref_words]
+    hyp_lengths = [len(w) for w in hyp_words]
+    ref_counts, hyp_counts = Counter(ref_words), Counter(hyp_words)
+    top_words = [w for w, _ in (ref_counts + hyp_counts).most_common(MAX_BAR_WORDS)]
+    ref_matrix, hyp_matrix = ref_words[:MAX_MATRIX_WORDS], hyp_words[:MAX_MATRIX_WORDS]
+    return {
+        'confusion_matrix': {
+            'ref_words': ref_matrix,
+            'hyp_words': hyp_matrix,
+            'matches': [[ref == hyp for hyp in hyp_matrix] for ref in ref_matrix],
+        },
+        'word_count_comparison': {
+            'words': top_words,
+            'reference': [ref_counts.get(w, 0) for w in top_words],
+            'hypothesis': [hyp_counts.get(w, 0) for w in top_words],
+        },
+        'statistics_plot': {
+            'reference': _box_stats(ref_lengths),
+            'hypothesis': _box_stats(hyp_lengths),
+        },
+        'radar_chart': {
+            'metrics': ['Word Count', 'Unique Words', 'Avg Word Length'],
+            'reference': [len(ref_words), len(set(ref_words)), float(np.mean(ref_lengths)) if ref_lengths else 0],
+            'hypothesis': [len(hyp_words), len(set(hyp_words)), float(np.mean(hyp_lengths)) if hyp_lengths else 0],
+        },
+        'linear_regression': {
+            'reference': _decimate(ref_lengths),
+            'hypothesis': _decimate(hyp_lengths),
+        },
+        'bar_chart': calculator.count_edit_operations(ref_words, hyp_words),
+    }
+
+
+def _box_stats(values: List[int]) -> Dict:
+    if not values:
+        return {}
+    q0, q1, q2, q3, q4 = np.percentile(values, [0, 25, 50, 75, 100])
+    return {'min': float(q0), 'q1': float(q1), 'median': float(q2), 'q3': float(q3), 'max': float(q4)}
+
+
+def _decimate(values: List[int]) -> List[tuple]:
+    """(position, value) points, thinned to at most MAX_LINE_POINTS"""
+    step = max(1, -(-len(values) // MAX_LINE_POINTS))
+    return [(i, values[i]) for i in range(0, len(values), step)]
+
+
+def _frame(name: str, width: float, height: float) -> Drawing:
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 10, TITLES[name], fontName='Helvetica-Bold',
+                       fontSize=8, textAnchor='middle'))
+    return drawing
+
+
+def _legend(drawing: Drawing, x: float, y: float):
+    for i, (label, color) in enumerate((('Reference', REFERENCE_COLOR), ('Hypothesis', HYPOTHESIS_COLOR))):
+        drawing.add(Rect(x, y - i * 9, 6, 6, fillColor=color, strokeColor=None))
+        drawing.add(String(x + 9, y - i * 9, label, fontName='Helvetica', fontSize=6))
+
+
+def _confusion_matrix(drawing: Drawing, data: Dict, width: float, height: float):
+    ref_words, hyp_words = data['ref_words'], data['hyp_words']
+    if not ref_words or not hyp_words:
+        return
+    left, bottom = 50, 30
+    cell_w = (width - left - 10) / len(hyp_words)
+    cell_h = (height - bottom - 18) / len(ref_words)
+    for i, row in enumerate(data['matches']):
+        for j, match in enumerate(row):
+            drawing.add(Rect(left + j * cell_w, height - 18 - (i + 1) * cell_h, cell_w, cell_h,
+                             fillColor=MATCH_COLOR if match else MISMATCH_COLOR, strokeColor=None))
+    font_size = min(5, cell_h * 0.9)
+    if font_size >= 2.5:
+        for i, word in enumerate(ref_words):
+            drawing.add(String(left - 2, height - 18 - (i + 0.75) * cell_h, word[:12], fontName='Helvetica',
+                               fontSize=font_size, textAnchor='end'))
+    drawing.add(String(left + (width - left - 10) / 2, 8, 'Hypothesis Words', fontName='Helvetica',
+                       fontSize=6, textAnchor='middle'))
+
+
+def _word_count_comparison(drawing: Drawing, data: Dict, width: float, height: float):
+    if not data['words']:
+        return
+    chart = VerticalBarChart()
+    chart.x, chart.y, chart.width, chart.height = 30, 35, width - 100, height - 55
+    chart.data = [data['reference'], data['hypothesis']]
+    chart.bars[0].fillColor, chart.bars[1].fillColor = REFERENCE_COLOR, HYPOTHESIS_COLOR
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 5
+    chart.valueAxis.labels.fontName = chart.categoryAxis.labels.fontName = 'Helvetica'
+    chart.categoryAxis.categoryNames = [w[:12] for w in data['words']]
+    chart.categoryAxis.labels.fontSize = 5
+    chart.categoryAxis.labels.angle = 45
+    chart.categoryAxis.labels.boxAnchor = 'ne'
+    drawing.add(chart)
+    _legend(drawing, width - 62, height - 28)
+
+
+def _statistics_plot(drawing: Drawing, data: Dict, width: float, height: float):
+    series = [(label, data[key], color) for label, key, color in
+              (('Reference', 'reference', REFERENCE_COLOR), ('Hypothesis', 'hypothesis', HYPOTHESIS_COLOR))
+              if data[key]]
+    if not series:
+        return
+    left, bottom, top = 30, 20, height - 20
+    vmax = max(stats['max'] for _, stats, _ in series) or 1
+
+    def to_y(value):
+        return bottom + (top - bottom) * value / vmax
+
+    drawing.add(Line(left, bottom, left, top, strokeWidth=0.5))
+    for tick in np.linspace(0, vmax, 5):
+        drawing.add(String(left - 3, to_y(tick) - 2, f'{tick:g}', fontName='Helvetica', fontSize=5, textAnchor='end'))
+    slot = (width - left - 10) / len(series)
+    for i, (label, stats, color) in enumerate(series):
+        center = left + slot * (i + 0.5)
+        box_w = slot * 0.35
+        drawing.add(Line(center, to_y(stats['min']), center, to_y(stats['max']), strokeColor=color, strokeWidth=0.7))
+        drawing.add(Rect(center - box_w / 2, to_y(stats['q1']), box_w, to_y(stats['q3']) - to_y(stats['q1']),
+                         fillColor=colors.Color(color.red, color.green, color.blue, alpha=0.3), strokeColor=color))
+        drawing.add(Line(center - box_w / 2, to_y(stats['median']), center + box_w / 2, to_y(stats['median']),
+                         strokeColor=color, strokeWidth=1.2))
+        drawing.add(String(center, bottom - 9, label, fontName='Helvetica', fontSize=6, textAnchor='middle'))
+
+
+def _radar_chart(drawing: Drawing, data: Dict, width: float, height: float):
+    chart = SpiderChart()
+    chart.x, chart.y, chart.width, chart.height = 30, 8, width - 110, height - 28
+    chart.data = [data['reference'], data['hypothesis']]
+    chart.labels = data['metrics']
+    chart.strands[0].strokeColor, chart.strands[1].strokeColor = REFERENCE_COLOR, HYPOTHESIS_COLOR
+    chart.strands[0].fillColor = colors.Color(REFERENCE_COLOR.red, REFERENCE_COLOR.green, REFERENCE_COLOR.blue, alpha=0.3)
+    chart.strands[1].fillColor = colors.Color(HYPOTHESIS_COLOR.red, HYPOTHESIS_COLOR.green, HYPOTHESIS_COLOR.blue, alpha=0.3)
+    chart.strandLabels.fontSize = 5
+    chart.spokeLabels.fontSize = 6
+    chart.spokeLabels.fontName = 'Helvetica'
+    drawing.add(chart)
+    _legend(drawing, width - 62, height - 28)
+
+
+def _linear_regression(drawing: Drawing, data: Dict, width: float, height: float):
+    if not data['reference'] and not data['hypothesis']:
+        return
+    chart = LinePlot()
+    chart.x, chart.y, chart.width, chart.height = 30, 20, width - 100, height - 40
+    chart.data = [data['reference'] or [(0, 0)], data['hypothesis'] or [(0, 0)]]
+    chart.lines[0].strokeColor, chart.lines[1].strokeColor = REFERENCE_COLOR, HYPOTHESIS_COLOR
+    chart.lines[0].strokeWidth = chart.lines[1].strokeWidth = 0.6
+    chart.xValueAxis.labels.fontSize = chart.yValueAxis.labels.fontSize = 5
+    chart.xValueAxis.labels.fontName = chart.yValueAxis.labels.fontName = 'Helvetica'
+    chart.yValueAxis.valueMin = 0
+    drawing.add(chart)
+    _legend(drawing, width - 62, height - 28)
+
+
+def _bar_chart(drawing: Drawing, data: Dict, width: float, height: float):
+    chart = VerticalBarChart()
+    chart.x, chart.y, chart.width, chart.height = 30, 25, width - 50, height - 45
+    chart.data = [[data['deletions'], data['substitutions'], data['insertions']]]
+    chart.bars[0].fillColor = REFERENCE_COLOR
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 5
+    chart.valueAxis.labels.fontName = chart.categoryAxis.labels.fontName = 'Helvetica'
+    chart.categoryAxis.categoryNames = ['Deletions', 'Substitutions', 'Insertions']
+    chart.categoryAxis.labels.fontSize = 6
+    drawing.add(chart)
+
+
+_BUILDERS = {
+    'confusion_matrix': _confusion_matrix,
+    'word_count_comparison': _word_count_comparison,
+    'statistics_plot': _statistics_plot,
+    'radar_chart': _radar_chart,
+    'linear_regression': _linear_regression,
+    'bar_chart': _bar_chart,
+}
+
+
+def build_chart(name: str, data: Dict, width: float = 300, height: float = 170) -> Drawing:
+    drawing = _frame(name, width, height)
+    _BUILDERS[name](drawing, data, width, height)
+    return drawing
+
+
+def build_charts(reference: str, hypothesis: str, width: float = 300, height: float = 170) -> Dict[str, Drawing]:
+    """All six charts as ReportLab Drawings, from normalized texts"""
+    data = chart_data(reference, hypothesis)
+    return {name: build_chart(name, data[name], width, height) for name in CHART_NAMES}
+
+
+def draw_chart(canvas, drawing: Drawing, x: float, y: float):
+    """Draw a chart onto a reportlab canvas with its lower-left corner at (x, y)"""
+    renderPDF.draw(drawing, canvas, x, y)
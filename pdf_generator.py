@@ -3,9 +3,9 @@ from jinja2 import Template
 import json
 import os
 from datetime import datetime
-import plotly.io as pio
 import base64
 from io import BytesIO
+from plot_renderer import plot_renderer
 
 class PDFGenerator:
     def __init__(self, template_dir: str):
@@ -28,9 +28,17 @@ class PDFGenerator:
 
     def _convert_plot_to_base64(self, plot):
         """Convert Plotly figure to base64 string"""
-        img_bytes = pio.to_image(plot, format='png')
+        img_bytes = plot_renderer.render(plot, scale=1)
         return base64.b64encode(img_bytes).decode()
 
+    def _convert_plots_to_base64(self, plots: dict) -> dict:
+        """Render all figures in parallel on the shared renderer pool"""
+        images = plot_renderer.render_batch(plots, 'png', 1)
+        for plot_name, img_bytes in images.items():
+            if isinstance(img_bytes, Exception):
+                raise img_bytes
+        return {plot_name: base64.b64encode(images[plot_name]).decode() for plot_name in plots}
+
     def _create_html_content(self, data: dict) -> str:
         """Create HTML content from analysis data"""
         template_str = '''
@@ -163,9 +171,7 @@ class PDFGenerator:
     def generate_pdf(self, data: dict, output_path: str):
         """Generate PDF report from analysis data"""
         # Convert plots to base64
-        plots = {}
-        for plot_name, plot in data['plots'].items():
-            plots[plot_name] = self._convert_plot_to_base64(plot)
+        plots = self._convert_plots_to_base64(data['plots'])
 
         # Create data dictionary for template
         template_data = {
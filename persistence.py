@@ -0,0 +1,236 @@
+"""Persistence layer around extensions.db.
+
+init_persistence() configures the SQLite engine (WAL journal, synchronous
+level, busy timeout, connection pool) before binding db to the app.
+save_analyses() inserts many analyses in a single transaction and keeps the
+derived data (error statistics, analytics cache) in step; the request
+handlers, batch_ingest and imports all save through it. Texts are
+deduplicated through text_store on save and released on delete.
+"""
+import os
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List
+from flask import current_app
+from sqlalchemy import event
+from werkzeug.utils import secure_filename
+from extensions import db
+from models import Transcription, TranscriptionBlob
+from analytics import wer_analytics_cache, row_keys
+import error_stats
+import text_store
+from plot_cache import plot_image_cache
+from metrics import timed
+
+SQLITE_DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    # NORMAL is durable in WAL mode except for the last commits on power loss
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT_MS': 10000,
+    'SQLITE_CACHE_SIZE_KB': 20000,
+    'SQLITE_POOL_SIZE': 10,
+    'SQLITE_MAX_OVERFLOW': 20,
+}
+
+
+def _is_file_sqlite(uri: str) -> bool:
+    return uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') not in ('sqlite:', 'sqlite:/')
+
+
+def init_persistence(app, tuned: bool = True):
+    """Configure the engine and bind db to app; tuned=False keeps SQLite defaults (for benchmarks)"""
+    for key, value in SQLITE_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if tuned and _is_file_sqlite(uri):
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('pool_size', app.config['SQLITE_POOL_SIZE'])
+        options.setdefault('max_overflow', app.config['SQLITE_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', 30)
+        connect_args = options.setdefault('connect_args', {})
+        connect_args.setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000.0)
+        # Pooled connections are handed to whichever request thread checks them out
+        connect_args.setdefault('check_same_thread', False)
+    db.init_app(app)
+    if tuned and uri.startswith('sqlite'):
+        with app.app_context():
+            _install_pragmas(db.engine, app.config)
+
+
+def _install_pragmas(engine, config):
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA cache_size=-{int(config['SQLITE_CACHE_SIZE_KB'])}",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA foreign_keys=ON",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def probe_upload_metadata(filename: str) -> Dict:
+    """Size and media details of an uploaded file, from the cached header probe"""
+    from file_handler import FileHandler
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    file_path = os.path.join(upload_folder, secure_filename(filename))
+    if not os.path.exists(file_path):
+        return {}
+    handler = FileHandler(upload_folder)
+    return handler.get_file_metadata(file_path)
+
+
+def build_transcription(data: Dict) -> Transcription:
+    """Build a Transcription row from a save-analysis payload"""
+    filename = data.get('filename', 'Analysis')
+    transcribed_text = data.get('transcribed_text', '')
+    reference_text = data.get('reference_text', '')
+    wer_results = data.get('wer_results', {})
+    nlp_results = data.get('nlp_results', {})
+    file_metadata = data.get('file_metadata', {})
+    # Ensure created date in file_metadata
+    if not file_metadata.get('created'):
+        file_metadata['created'] = datetime.now().isoformat()
+    # Use provided file_metadata if available, fallback only if missing fields
+    if file_metadata:
+        # Fill missing fields if any
+        if not file_metadata.get('filename') or not file_metadata.get('type') or not file_metadata.get('size'):
+            if 'recording' in filename.lower() or filename.lower().endswith('.webm'):
+                file_metadata['filename'] = file_metadata.get('filename', 'Voice Recording')
+                file_metadata['extension'] = file_metadata.get('extension', 'webm')
+                file_metadata['type'] = file_metadata.get('type', 'Audio')
+                file_metadata['size'] = file_metadata.get('size', len(transcribed_text.encode('utf-8')))
+            else:
+                ext = filename.split('.')[-1].lower() if '.' in filename else ''
+                file_metadata['filename'] = file_metadata.get('filename', filename)
+                file_metadata['extension'] = file_metadata.get('extension', ext)
+                if ext in ['mp3', 'wav', 'webm']:
+                    file_metadata['type'] = file_metadata.get('type', 'Audio')
+                elif ext in ['mp4', 'mkv']:
+                    file_metadata['type'] = file_metadata.get('type', 'Video')
+                elif ext in ['jpg', 'jpeg', 'png']:
+                    file_metadata['type'] = file_metadata.get('type', 'Image')
+                else:
+                    file_metadata['type'] = file_metadata.get('type', 'Unknown')
+                if not file_metadata.get('size'):
+                    probed = probe_upload_metadata(filename)
+                    for key, value in probed.items():
+                        file_metadata.setdefault(key, value)
+                    file_metadata['size'] = probed.get('size') or len(transcribed_text.encode('utf-8'))
+    else:
+        file_metadata = {}
+        if 'recording' in filename.lower() or filename.lower().endswith('.webm'):
+            file_metadata['filename'] = 'Voice Recording'
+            file_metadata['extension'] = 'webm'
+            file_metadata['type'] = 'Audio'
+            file_metadata['size'] = len(transcribed_text.encode('utf-8'))
+        else:
+            ext = filename.split('.')[-1].lower() if '.' in filename else ''
+            file_metadata['filename'] = filename
+            file_metadata['extension'] = ext
+            if ext in ['mp3', 'wav', 'webm']:
+                file_metadata['type'] = 'Audio'
+            elif ext in ['mp4', 'mkv']:
+                file_metadata['type'] = 'Video'
+            elif ext in ['jpg', 'jpeg', 'png']:
+                file_metadata['type'] = 'Image'
+            else:
+                file_metadata['type'] = 'Unknown'
+            probed = probe_upload_metadata(filename)
+            for key, value in probed.items():
+                file_metadata.setdefault(key, value)
+            file_metadata['size'] = probed.get('size') or len(transcribed_text.encode('utf-8'))
+    # After finalizing file_metadata, set the top-level filename to match file_metadata['filename'] if present
+    filename = file_metadata.get('filename', filename)
+    # Ensure differences, word_differences, statistics are present
+    differences = wer_results.get('differences', [])
+    word_differences = wer_results.get('word_differences', [])
+    statistics = wer_results.get('statistics', {})
+    plots = wer_results.get('plots', {
+        'confusion_matrix': {'data': [], 'layout': {}},
+        'word_count_comparison': {'data': [], 'layout': {}},
+        'statistics_plot': {'data': [], 'layout': {}},
+        'radar_chart': {'data': [], 'layout': {}}
+    })
+    wer_score = wer_results.get('wer_score', 0.0)
+    analysis_results = {
+        'wer_score': wer_score,
+        'differences': differences,
+        'word_differences': word_differences,
+        'statistics': statistics,
+        'plots': plots
+    }
+    transcription = Transcription(
+        filename=filename,
+        transcribed_text=transcribed_text,
+        reference_text=reference_text,
+        wer_score=wer_score,
+        file_metadata=json.dumps(file_metadata)
+    )
+    if data.get('created_at'):
+        # Imported analyses keep their original timestamp
+        transcription.created_at = datetime.fromisoformat(data['created_at'])
+    transcription.set_artifacts(analysis_results, nlp_results)
+    transcription.update_summary(analysis_results, file_metadata)
+    return transcription
+
+
+def save_analyses(payloads: Iterable[Dict]) -> List[Transcription]:
+    """Insert many save-analysis payloads in one transaction.
+
+    Error statistics are updated in the same transaction and the analytics
+    cache is invalidated for the affected groups once it commits.
+    """
+    rows = []
+    try:
+        for data in payloads:
+            transcription = build_transcription(data)
+            rows.append(transcription)
+            error_stats.record_analysis((data.get('wer_results') or {}).get('differences', []))
+        # Text entries must exist before the rows referencing them are flushed
+        text_store.intern_texts(rows)
+        db.session.add_all(rows)
+        with timed('db_commit'):
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    wer_analytics_cache.invalidate([row_keys(t) for t in rows])
+    return rows
+
+
+def save_analysis(data: Dict) -> Transcription:
+    return save_analyses([data])[0]
+
+
+def delete_analysis(transcription: Transcription):
+    keys = row_keys(transcription)
+    analysis_id = transcription.id
+    error_stats.forget_analysis(transcription)
+    db.session.delete(transcription)
+    # Release texts only once the row is gone, or the foreign key would still point at them
+    db.session.flush()
+    text_store.release_texts([transcription])
+    db.session.commit()
+    wer_analytics_cache.invalidate([keys])
+    plot_image_cache.invalidate(analysis_id)
+
+
+def delete_all_analyses():
+    # Bulk query deletes skip ORM cascades, so clear the blob table explicitly
+    TranscriptionBlob.query.delete()
+    Transcription.query.delete()
+    text_store.clear()
+    error_stats.clear()
+    db.session.commit()
+    wer_analytics_cache.reset()
+    plot_image_cache.clear()
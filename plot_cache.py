@@ -0,0 +1,101 @@
+"""On-disk cache of rendered Plotly figures for PDF reports.
+
+Each Kaleido render takes seconds, so PNGs are kept per analysis id, figure
+and scale under PLOT_CACHE_DIR. File names also carry a digest of the figure
+JSON: SQLite can hand a deleted row's id to a new analysis, and a stale image
+must never be served for it. Images are rendered in the background right
+after an analysis is saved, or on the first PDF download otherwise; misses
+are rendered in parallel by plot_renderer.
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from plot_renderer import plot_renderer
+
+PDF_PLOT_NAMES = ('confusion_matrix', 'word_count_comparison', 'statistics_plot',
+                  'radar_chart', 'linear_regression', 'bar_chart')
+PDF_PLOT_SCALE = 3
+
+
+def figure_digest(figure: Dict) -> str:
+    return hashlib.sha1(json.dumps(figure, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+class PlotImageCache:
+    """PNG renders of analysis plots keyed by (analysis id, figure, scale)"""
+
+    def __init__(self, cache_dir: str, workers: int = 1):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _path(self, analysis_id: int, name: str, figure: Dict, scale: int) -> str:
+        return os.path.join(self.cache_dir, str(analysis_id), f'{name}@{scale}x-{figure_digest(figure)}.png')
+
+    def _store(self, path: str, image: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so readers never see a partial file
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(image)
+        os.replace(tmp_path, path)
+
+    def get_many(self, analysis_id: int, plots: Dict[str, Dict], scale: int = PDF_PLOT_SCALE,
+                 timeout: Optional[float] = None) -> Dict[str, object]:
+        """PNG bytes per figure name; misses are rendered as one parallel batch and stored.
+
+        Figures that failed or timed out map to the Exception instead.
+        """
+        results, missing = {}, {}
+        for name, figure in plots.items():
+            path = self._path(analysis_id, name, figure, scale)
+            try:
+                with open(path, 'rb') as f:
+                    results[name] = f.read()
+            except FileNotFoundError:
+                missing[name] = (path, figure)
+        if missing:
+            # A download racing the background prerender may render twice; the rename keeps it safe
+            rendered = plot_renderer.render_batch({name: figure for name, (_, figure) in missing.items()},
+                                                  'png', scale, timeout)
+            for name, image in rendered.items():
+                if not isinstance(image, Exception):
+                    self._store(missing[name][0], image)
+                results[name] = image
+        return results
+
+    def get(self, analysis_id: int, name: str, figure: Dict, scale: int = PDF_PLOT_SCALE) -> bytes:
+        """Cached PNG bytes of a figure, rendering and storing it on a miss"""
+        image = self.get_many(analysis_id, {name: figure}, scale)[name]
+        if isinstance(image, Exception):
+            raise image
+        return image
+
+    def prerender(self, analysis_id: int, plots: Optional[Dict], scale: int = PDF_PLOT_SCALE):
+        figures = {name: plots[name] for name in PDF_PLOT_NAMES if plots and plots.get(name)}
+        for name, image in self.get_many(analysis_id, figures, scale).items():
+            if isinstance(image, Exception):
+                print(f'PLOT PRERENDER ERROR ({analysis_id}/{name}):', image)
+
+    def prerender_async(self, analysis_id: int, plots: Optional[Dict], scale: int = PDF_PLOT_SCALE):
+        """Render the PDF figures of a freshly saved analysis on a background thread"""
+        if not plots:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='plot-prerender')
+        self._executor.submit(self.prerender, analysis_id, plots, scale)
+
+    def invalidate(self, analysis_id: int):
+        shutil.rmtree(os.path.join(self.cache_dir, str(analysis_id)), ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+plot_image_cache = PlotImageCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plot_cache'))
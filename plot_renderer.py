@@ -0,0 +1,143 @@
+"""Long-lived pool of warm Plotly/Kaleido renderer processes.
+
+A Kaleido render costs seconds and runs single-threaded, so PDF generation
+used to take the sum of all its figures. PlotRenderService keeps a process
+pool whose workers import plotly and start Kaleido once (warm-up), then
+renders whole batches of figures in parallel: a report waits for its slowest
+figure instead of all of them. Every batch has a deadline; figures that miss
+it come back as TimeoutError instead of blocking the request.
+"""
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_TIMEOUT = 60.0
+WARMUP_FIGURE = {'data': [{'type': 'bar', 'x': ['a'], 'y': [1]}], 'layout': {}}
+
+
+def _render(figure: Dict, fmt: str, scale: int) -> bytes:
+    """Worker: render one figure; plotly and Kaleido stay loaded between calls"""
+    import plotly.io as pio
+    return pio.to_image(figure, format=fmt, scale=scale)
+
+
+def _warm_up():
+    _render(WARMUP_FIGURE, 'png', 1)
+    return os.getpid()
+
+
+class PlotRenderService:
+    """Parallel figure rendering on a persistent process pool"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, timeout: float = DEFAULT_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._queued = 0  # figures submitted but not finished
+        self.rendered = 0
+        self.timeouts = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Created from request or warm-up threads, so never fork: a forked child would
+                # inherit whatever locks those threads held
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        """Drop a pool whose worker died; the next _pool() call starts a fresh one"""
+        with self._lock:
+            if self._executor is pool:
+                self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        pool = self._pool()
+        try:
+            return pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard(pool)
+            return self._pool().submit(fn, *args)
+
+    def warm(self, wait_seconds: Optional[float] = None):
+        """Start every worker and load Kaleido in it before the first real request"""
+        futures = [self._submit(_warm_up) for _ in range(self.workers)]
+        done, _ = wait(futures, timeout=wait_seconds)
+        return sorted({f.result() for f in done if f.exception() is None})
+
+    def _finished(self, future):
+        with self._lock:
+            self._queued -= 1
+            if not future.cancelled() and future.exception() is None:
+                self.rendered += 1
+
+    def render_batch(self, figures: Dict[str, Dict], fmt: str = 'png', scale: int = 3,
+                     timeout: Optional[float] = None) -> Dict[str, object]:
+        """Render {name: figure} in parallel; values are image bytes or the Exception raised"""
+        if not figures:
+            return {}
+        futures = {}
+        for name, figure in figures.items():
+            with self._lock:
+                self._queued += 1
+            try:
+                future = self._submit(_render, figure, fmt, scale)
+            except Exception:
+                with self._lock:
+                    self._queued -= 1
+                raise
+            future.add_done_callback(self._finished)
+            futures[future] = name
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        done, pending = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        results = {}
+        for future in done:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                # A worker died mid-render (e.g. Kaleido crashed); replace the pool for the next batch
+                with self._lock:
+                    broken = self._executor
+                if broken is not None:
+                    self._discard(broken)
+            results[futures[future]] = error if error is not None else future.result()
+        for future in pending:
+            # Queued figures are dropped; one already rendering finishes in its worker
+            future.cancel()
+            results[futures[future]] = TimeoutError(f'Rendering {futures[future]} timed out')
+        if pending:
+            with self._lock:
+                self.timeouts += len(pending)
+        return results
+
+    def render(self, figure: Dict, fmt: str = 'png', scale: int = 3, timeout: Optional[float] = None) -> bytes:
+        result = self.render_batch({'figure': figure}, fmt, scale, timeout)['figure']
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'started': self._executor is not None,
+                'queue_depth': self._queued,
+                'rendered': self.rendered,
+                'timeouts': self.timeouts,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+plot_renderer = PlotRenderService()
@@ -0,0 +1,218 @@
+"""Opt-in profiling of individual requests.
+
+An admin can run one request under a profiler by sending the
+X-Profile: 1 header (or ?profile=1) together with X-Admin-Token matching
+PROFILING_TOKEN. pyinstrument (sampling) is used when it is installed,
+otherwise cProfile. Each profile is written to PROFILE_DIR next to a JSON
+file with the endpoint, duration, stage timings and input sizes. The
+directory is pruned to PROFILE_MAX_FILES profiles no older than
+PROFILE_MAX_AGE_DAYS. /api/admin/profiles lists them.
+"""
+import os
+import io
+import hmac
+import json
+import time
+import uuid
+import pstats
+import cProfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_HEADER = 'X-Admin-Token'
+TOP_FUNCTIONS = 40  # rows of the cProfile text summary
+
+
+def _truthy(value: Optional[str]) -> bool:
+    return (value or '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def is_admin(request, config) -> bool:
+    token = config.get('PROFILING_TOKEN')
+    supplied = request.headers.get(TOKEN_HEADER, '')
+    return bool(config.get('PROFILING_ENABLED') and token and hmac.compare_digest(supplied, token))
+
+
+def profile_requested(request, config) -> bool:
+    wanted = _truthy(request.headers.get(PROFILE_HEADER)) or _truthy(request.args.get('profile'))
+    return wanted and is_admin(request, config)
+
+
+def note_inputs(**sizes):
+    """Record input sizes (word counts, bytes, ...) for the current request's profile"""
+    from flask import g, has_request_context
+    if has_request_context() and 'profiler' in g:
+        g.profile_inputs.update(sizes)
+
+
+class _CProfileSession:
+    kind = 'cprofile'
+    extension = 'prof'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def save(self, path: str) -> str:
+        """Dump binary stats (for snakeviz/pstats) and return a short text summary"""
+        self.profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        return out.getvalue()
+
+
+class _PyinstrumentSession:
+    kind = 'pyinstrument'
+    extension = 'html'
+
+    def __init__(self):
+        from pyinstrument import Profiler
+        self.profiler = Profiler()
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def save(self, path: str) -> str:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.profiler.output_html())
+        return self.profiler.output_text()
+
+
+def new_session():
+    try:
+        return _PyinstrumentSession()
+    except ImportError:
+        return _CProfileSession()
+
+
+class ProfileStore:
+    """Profiles on disk: <id>.<prof|html>, <id>.txt summary and <id>.json metadata"""
+
+    def __init__(self, directory: str, max_files: int = 50, max_age_days: float = 7):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_age_days = max_age_days
+
+    def save(self, session, meta: Dict) -> Dict:
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:8]
+        filename = f'{profile_id}.{session.extension}'
+        summary = session.save(os.path.join(self.directory, filename))
+        with open(os.path.join(self.directory, f'{profile_id}.txt'), 'w', encoding='utf-8') as f:
+            f.write(summary)
+        meta = dict(meta, id=profile_id, profiler=session.kind, file=filename, summary=f'{profile_id}.txt')
+        with open(os.path.join(self.directory, f'{profile_id}.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        self.prune()
+        return meta
+
+    def list(self, limit: int = 50) -> List[Dict]:
+        """Most recent profiles first"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f'PROFILE READ ERROR ({name}):', e)
+            if len(entries) >= limit:
+                break
+        return entries
+
+    def path(self, profile_id: str, filename: str) -> Optional[str]:
+        """Path of one of a profile's files, or None for unknown ids/names"""
+        if not filename.startswith(profile_id + '.') or os.path.basename(filename) != filename:
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def _delete(self, profile_id: str):
+        for name in os.listdir(self.directory):
+            if name.startswith(profile_id + '.'):
+                os.remove(os.path.join(self.directory, name))
+
+    def prune(self):
+        """Drop profiles beyond max_files or older than max_age_days"""
+        ids = sorted({name.split('.')[0] for name in os.listdir(self.directory)}, reverse=True)
+        cutoff = time.time() - self.max_age_days * 86400
+        for index, profile_id in enumerate(ids):
+            meta_path = os.path.join(self.directory, f'{profile_id}.json')
+            expired = not os.path.exists(meta_path) or os.path.getmtime(meta_path) < cutoff
+            if index >= self.max_files or expired:
+                self._delete(profile_id)
+
+
+profile_store = ProfileStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+
+
+def init_profiling(app):
+    """Profile requests that ask for it and serve the admin listing"""
+    from flask import g, jsonify, request, send_file
+
+    @app.before_request
+    def start_profile():
+        if not profile_requested(request, app.config):
+            return
+        g.profile_inputs = {'content_length': request.content_length or 0}
+        g.profile_started = time.perf_counter()
+        session = new_session()
+        try:
+            session.start()
+        except (RuntimeError, ValueError) as e:
+            # Another profiler is already active in this thread
+            print('PROFILE START ERROR:', e)
+            return
+        g.profiler = session
+
+    @app.after_request
+    def save_profile(response):
+        session = g.pop('profiler', None)
+        if session is None:
+            return response
+        session.stop()
+        meta = {
+            'created_at': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'args': request.args.to_dict(),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - g.profile_started) * 1000, 1),
+            'inputs': g.profile_inputs,
+            'stages_ms': [[stage, round(elapsed * 1000, 1)] for stage, elapsed in g.get('stage_timings', [])],
+        }
+        try:
+            saved = profile_store.save(session, meta)
+            response.headers['X-Profile-Id'] = saved['id']
+        except Exception as e:
+            print('PROFILE SAVE ERROR:', e)
+        return response
+
+    @app.route('/api/admin/profiles', methods=['GET'])
+    def list_profiles():
+        if not is_admin(request, app.config):
+            return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
+        limit = request.args.get('limit', 50, type=int)
+        return jsonify({'status': 'success', 'profiles': profile_store.list(max(1, min(limit, 500)))})
+
+    @app.route('/api/admin/profiles/<profile_id>/<filename>', methods=['GET'])
+    def download_profile(profile_id, filename):
+        if not is_admin(request, app.config):
+            return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
+        path = profile_store.path(profile_id, filename)
+        if path is None:
+            return jsonify({'status': 'error', 'message': 'Profile not found'}), 404
+        return send_file(path, as_attachment=True, download_name=filename)
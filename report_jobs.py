@@ -0,0 +1,261 @@
+"""Background batch PDF reports.
+
+A job renders the per-analysis report_pdf layout for many analyses on a
+process pool. Each worker binds its own Flask app and engine to the
+database. Results are collected into either a ZIP of individual PDFs or
+one merged PDF that opens with a summary table. The request handlers only
+enqueue jobs and poll their progress; finished files live under
+BATCH_REPORT_DIR until the job expires.
+"""
+import os
+import time
+import uuid
+import shutil
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+FORMATS = ('zip', 'merged')
+JOB_TTL_SECONDS = 3600
+
+# Per-process Flask app used by the render workers
+_worker_app = None
+
+
+def _init_worker(database_uri: str):
+    global _worker_app
+    from flask import Flask
+    from persistence import init_persistence
+    _worker_app = Flask(__name__)
+    _worker_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    init_persistence(_worker_app)
+
+
+def render_analysis(analysis_id: int, path: str, mode: str, max_pages: int, chart_backend: str) -> Dict:
+    """Worker: write one analysis report to path"""
+    from extensions import db
+    from models import Transcription
+    import report_pdf
+    with _worker_app.app_context():
+        transcription = db.session.get(Transcription, analysis_id)
+        if transcription is None:
+            return {'id': analysis_id, 'error': 'Analysis not found'}
+        with open(path, 'wb') as f:
+            builder = report_pdf.write_report(transcription, f, mode, max_pages, chart_backend)
+        return {
+            'id': analysis_id,
+            'path': path,
+            'filename': transcription.filename,
+            'wer_score': transcription.wer_score,
+            'created_at': transcription.created_at.isoformat() if transcription.created_at else '',
+            'pages': builder.pages,
+        }
+
+
+def write_summary_pdf(path: str, rows: List[Dict], failed: List[Dict]):
+    """Cover page(s) of a merged report: one line per analysis"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(path, pagesize=letter)
+    width, height = letter
+
+    def header(y):
+        c.setFont('Helvetica-Bold', 11)
+        for x, title in ((30, 'ID'), (80, 'Filename'), (330, 'WER'), (400, 'Created'), (540, 'Pages')):
+            c.drawString(x, y, title)
+        c.line(30, y - 4, width - 30, y - 4)
+        c.setFont('Helvetica', 10)
+        return y - 18
+
+    c.setFont('Helvetica-Bold', 18)
+    c.drawString(30, height - 40, 'WER Batch Report')
+    c.setFont('Helvetica', 11)
+    c.drawString(30, height - 60, f"{len(rows)} analyses, generated {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    y = header(height - 90)
+    for row in rows:
+        if y < 50:
+            c.showPage()
+            y = header(height - 40)
+        c.drawString(30, y, str(row['id']))
+        c.drawString(80, y, (row['filename'] or '')[:45])
+        c.drawString(330, y, f"{(row['wer_score'] or 0.0):.2%}")
+        c.drawString(400, y, row['created_at'][:19].replace('T', ' '))
+        c.drawString(540, y, str(row['pages']))
+        y -= 14
+    for row in failed:
+        if y < 50:
+            c.showPage()
+            y = header(height - 40)
+        c.drawString(30, y, str(row['id']))
+        c.drawString(80, y, f"[not rendered: {row['error']}]"[:80])
+        y -= 14
+    c.save()
+
+
+class ReportJob:
+    def __init__(self, ids: List[int], fmt: str, mode: str, max_pages: int, chart_backend: str, directory: str):
+        self.id = uuid.uuid4().hex
+        self.ids = ids
+        self.format = fmt
+        self.mode = mode
+        self.max_pages = max_pages
+        self.chart_backend = chart_backend
+        self.directory = os.path.join(directory, self.id)
+        self.status = 'queued'
+        self.completed = 0
+        self.errors = []
+        self.output_path = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def download_name(self) -> str:
+        return f'wer_reports_{self.id[:8]}.' + ('zip' if self.format == 'zip' else 'pdf')
+
+    def to_dict(self) -> Dict:
+        total = len(self.ids)
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'format': self.format,
+            'mode': self.mode,
+            'total': total,
+            'completed': self.completed,
+            'progress': self.completed / total if total else 1.0,
+            'errors': self.errors[:50],
+            'ready': self.status == 'done',
+        }
+
+
+class ReportJobManager:
+    """Queues batch report jobs and renders them on a shared process pool"""
+
+    def __init__(self, output_dir: str, workers: int = max(1, (os.cpu_count() or 2) // 2)):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._database_uri = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # First created from a report-job thread inside the server, so never fork (see plot_renderer)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                     initargs=(self._database_uri,),
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        """Drop a pool whose worker died; the next _pool() call starts a fresh one"""
+        with self._lock:
+            if self._executor is pool:
+                self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        """Submit to the shared pool, replacing it once if it is already broken; returns (pool, future)"""
+        pool = self._pool()
+        try:
+            return pool, pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard(pool)
+            pool = self._pool()
+            return pool, pool.submit(fn, *args)
+
+    def submit(self, ids: List[int], fmt: str, mode: str, max_pages: int, chart_backend: str,
+               database_uri: str) -> ReportJob:
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+        self._database_uri = self._database_uri or database_uri
+        self.expire()
+        job = ReportJob(ids, fmt, mode, max_pages, chart_backend, self.output_dir)
+        os.makedirs(job.directory, exist_ok=True)
+        with self._lock:
+            self.jobs[job.id] = job
+        threading.Thread(target=self._run, args=(job,), name=f'report-job-{job.id[:8]}', daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job: ReportJob):
+        job.status = 'running'
+        try:
+            futures, pools = {}, {}
+            for analysis_id in job.ids:
+                pool, future = self._submit(render_analysis, analysis_id,
+                                            os.path.join(job.directory, f'wer_analysis_{analysis_id}.pdf'),
+                                            job.mode, job.max_pages, job.chart_backend)
+                futures[future], pools[future] = analysis_id, pool
+            results = {}
+            archive = None
+            if job.format == 'zip':
+                job.output_path = os.path.join(job.directory, job.download_name)
+                # PDFs are already compressed, so the archive only stores them
+                archive = zipfile.ZipFile(job.output_path, 'w', zipfile.ZIP_STORED)
+            try:
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool as e:
+                        # A worker died (OOM, a crash in ReportLab/PyPDF2): fail the ids it took
+                        # down and replace the pool so later jobs start on a fresh one
+                        self._discard(pools[future])
+                        result = {'id': futures[future], 'error': str(e)}
+                    except Exception as e:
+                        result = {'id': futures[future], 'error': str(e)}
+                    if result.get('error'):
+                        job.errors.append({'id': result['id'], 'error': result['error']})
+                    else:
+                        results[result['id']] = result
+                        if archive is not None:
+                            archive.write(result['path'], os.path.basename(result['path']))
+                            os.remove(result['path'])
+                    job.completed += 1
+            finally:
+                if archive is not None:
+                    archive.close()
+            if job.format == 'merged':
+                job.output_path = self._merge(job, [results[i] for i in job.ids if i in results])
+            job.status = 'done'
+        except Exception as e:
+            print(f'BATCH REPORT ERROR ({job.id}):', e)
+            job.errors.append({'id': None, 'error': str(e)})
+            job.status = 'error'
+        job.finished_at = time.time()
+
+    def _merge(self, job: ReportJob, rows: List[Dict]) -> str:
+        from PyPDF2 import PdfWriter
+        summary_path = os.path.join(job.directory, 'summary.pdf')
+        write_summary_pdf(summary_path, rows, job.errors)
+        writer = PdfWriter()
+        writer.append(summary_path)
+        for row in rows:
+            writer.append(row['path'])
+        output_path = os.path.join(job.directory, job.download_name)
+        with open(output_path, 'wb') as f:
+            writer.write(f)
+        writer.close()
+        for row in rows:
+            os.remove(row['path'])
+        os.remove(summary_path)
+        return output_path
+
+    def expire(self, ttl: float = JOB_TTL_SECONDS):
+        """Forget finished jobs older than ttl and delete their files"""
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self.jobs.values() if job.finished_at and now - job.finished_at > ttl]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.directory, ignore_errors=True)
+
+
+report_jobs = ReportJobManager(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batch_reports'))
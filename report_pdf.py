@@ -0,0 +1,493 @@
+"""Per-analysis PDF report (the /api/download-pdf layout).
+
+ReportBuilder draws the report section by section onto a ReportLab canvas,
+wrapping transcripts lazily line by line and flushing every finished page
+into the canvas' compressed page stream. The document is written to a
+SpooledTemporaryFile (spilled to disk past SPOOL_MAX_SIZE) and handed back
+as a chunk iterator, so the response body is never one big bytes object.
+max_pages caps very long transcripts; mode='summary' leaves out the texts
+and the detailed word differences.
+"""
+import io
+import re
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+import pdf_charts
+from metrics import timed
+from plot_cache import PDF_PLOT_NAMES
+from wer_calculator import normalize_text
+
+MODES = ('full', 'summary')
+DEFAULT_MAX_PAGES = 200
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+TEXT_LINE_LENGTH = 90
+
+
+class PageLimitReached(Exception):
+    pass
+
+
+def iter_text_lines(text: str, max_len: int = TEXT_LINE_LENGTH) -> Iterator[str]:
+    """Greedy word wrap that yields one line at a time instead of wrapping the whole text up front"""
+    line = ''
+    for match in re.finditer(r'\S+', text or ''):
+        word = match.group()
+        while len(word) > max_len:
+            # Break words longer than a line, like textwrap does
+            if line:
+                yield line
+                line = ''
+            yield word[:max_len]
+            word = word[max_len:]
+        if not line:
+            line = word
+        elif len(line) + 1 + len(word) <= max_len:
+            line += ' ' + word
+        else:
+            yield line
+            line = word
+    if line:
+        yield line
+
+
+def count_edit_operations(word_diffs):
+    """Substituted, inserted and deleted words of a word_differences list"""
+    substituted, inserted, deleted = [], [], []
+    i = 0
+    while i < len(word_diffs):
+        if word_diffs[i].get('type') == 'deleted' and i+1 < len(word_diffs) and word_diffs[i+1].get('type') == 'inserted':
+            substituted.append(word_diffs[i]['text'])
+            i += 2
+        elif word_diffs[i].get('type') == 'inserted':
+            inserted.append(word_diffs[i]['text'])
+            i += 1
+        elif word_diffs[i].get('type') == 'deleted':
+            deleted.append(word_diffs[i]['text'])
+            i += 1
+        elif word_diffs[i].get('type') == 'substituted':
+            substituted.append(word_diffs[i]['text'])
+            i += 1
+        else:
+            i += 1
+    return substituted, inserted, deleted
+
+
+def report_data(transcription, chart_backend: str = 'vector') -> Dict:
+    """Everything the report draws; plots are only decompressed for the Plotly backend"""
+    kinds = ('plots', 'differences') if chart_backend == 'plotly' else ('differences',)
+    wer_results = transcription.load_analysis_results(kinds=kinds)
+    return {
+        'id': transcription.id,
+        'wer_score': wer_results.get('wer_score', transcription.wer_score or 0.0),
+        'created_at': transcription.created_at.isoformat() if transcription.created_at else '',
+        'file_metadata': transcription.to_dict(include_blobs=False)['file_metadata'] or {},
+        'transcribed_text': transcription.transcribed_text or '',
+        'reference_text': transcription.reference_text or '',
+        'wer_results': wer_results,
+        'nlp_results': transcription.load_nlp_results() or {},
+    }
+
+
+class ReportBuilder:
+    """Draws one analysis report; sections fail independently with a placeholder line"""
+
+    def __init__(self, output, mode: str = 'full', max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+                 chart_backend: str = 'vector'):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+        self.c = canvas.Canvas(output, pagesize=letter, pageCompression=1)
+        self.width, self.height = letter
+        self.y = self.height - 40
+        self.mode = mode
+        self.max_pages = max_pages
+        self.chart_backend = chart_backend
+        self.pages = 1
+        self.truncated = False
+
+    def new_page(self):
+        if self.max_pages and self.pages >= self.max_pages:
+            raise PageLimitReached()
+        self.c.showPage()
+        self.pages += 1
+        self.y = self.height - 40
+
+    def ensure_space(self, minimum: float):
+        if self.y < minimum:
+            self.new_page()
+
+    def section_heading(self, text, size=15):
+        c = self.c
+        c.setFont('Helvetica-Bold', size)
+        c.drawString(30, self.y, text)
+        self.y -= 6
+        c.setStrokeColor(colors.grey)
+        c.setLineWidth(1)
+        c.line(30, self.y, self.width-30, self.y)
+        self.y -= 18
+
+    def placeholder(self, text, x=40):
+        self.c.setFont('Helvetica', 11)
+        self.c.drawString(x, self.y, text)
+        self.y -= 14
+
+    def _section(self, label, draw, placeholder, x=40):
+        try:
+            draw()
+        except PageLimitReached:
+            raise
+        except Exception as e:
+            print(f'PDF {label} ERROR:', e)
+            self.placeholder(placeholder, x)
+
+    def build(self, data: Dict):
+        sections = [
+            ('HEADER', self.draw_header, "[Header not available]", 30),
+            ('FILE INFO', self.draw_file_info, "[File information not available]", 40),
+        ]
+        if self.mode == 'full':
+            sections += [
+                ('TRANSCRIBED TEXT', lambda d: self.draw_text("Transcribed Text", d['transcribed_text']),
+                 "[Transcribed text not available]", 40),
+                ('REFERENCE TEXT', lambda d: self.draw_text("Reference Text", d['reference_text']),
+                 "[Reference text not available]", 40),
+            ]
+        sections.append(('WORD DIFFERENCES', self.draw_difference_counts, "[Word differences not available]", 40))
+        if self.mode == 'full':
+            sections += [
+                ('DETAILED WORD DIFFERENCES', self.draw_detailed_differences,
+                 "[Detailed word differences not available]", 40),
+                ('EDIT OPERATIONS TABLE', self.draw_edit_operations, "[Edit operations table not available]", 40),
+            ]
+        sections += [
+            ('STATISTICS', self.draw_statistics, "[Statistics not available]", 40),
+            ('NLP RESULTS', self.draw_nlp_results, "[NLP results not available]", 40),
+            ('VISUALIZATIONS', self.draw_visualizations, "[Visualizations not available]", 30),
+        ]
+        try:
+            for label, draw, placeholder, x in sections:
+                self._section(label, lambda: draw(data), placeholder, x)
+        except PageLimitReached:
+            self.truncated = True
+            self.c.setFillColorRGB(0, 0, 0)
+            self.c.setFont('Helvetica-Oblique', 10)
+            self.c.drawString(30, 30, f"[Report truncated at {self.max_pages} pages]")
+        self.c.save()
+
+    def draw_header(self, data):
+        self.section_heading("WER Analysis Report", 18)
+        c = self.c
+        c.setFont('Helvetica', 12)
+        c.drawString(30, self.y, f"WER Score: {data['wer_score']:.2%}")
+        self.y -= 18
+        c.drawString(30, self.y, f"Created: {data['created_at']}")
+        self.y -= 24
+
+    def draw_file_info(self, data):
+        # File Metadata Section (like History page)
+        meta = data['file_metadata']
+        self.section_heading("File Information", 14)
+        self.c.setFont('Helvetica', 11)
+        file_info_lines = []
+        file_info_lines.append(f"Filename: {meta.get('filename', 'Voice Recording')}")
+        file_info_lines.append(f"Type: {meta.get('type', 'Unknown')}")
+        size = meta.get('size')
+        if size:
+            if size < 1024:
+                size_str = f"{size} bytes"
+            elif size < 1024*1024:
+                size_str = f"{size/1024:.1f} KB"
+            else:
+                size_str = f"{size/1024/1024:.2f} MB"
+        else:
+            size_str = 'N/A'
+        file_info_lines.append(f"Size: {size_str}")
+        created = meta.get('created')
+        if created:
+            try:
+                created_str = datetime.fromisoformat(created).strftime('%m/%d/%Y, %I:%M:%S %p')
+            except Exception:
+                created_str = str(created)
+        else:
+            created_str = 'N/A'
+        file_info_lines.append(f"{created_str}")
+        for line in file_info_lines:
+            self.c.drawString(40, self.y, line)
+            self.y -= 14
+        self.y -= 6
+
+    def draw_text(self, title, text):
+        self.section_heading(title, 14)
+        self.c.setFont('Helvetica', 11)
+        for line in iter_text_lines(text):
+            self.c.drawString(40, self.y, line)
+            self.y -= 14
+            if self.y < 60:
+                self.new_page()
+                self.c.setFont('Helvetica', 11)
+        self.y -= 16
+
+    def draw_difference_counts(self, data):
+        # Word Differences (use word_differences logic for counts)
+        self.section_heading("Word Differences", 14)
+        substituted, inserted, deleted = count_edit_operations(data['wer_results'].get('word_differences', []))
+        c, y = self.c, self.y
+        for label, label_x, value_x, count in (("Deletions: ", 40, 110, len(deleted)),
+                                               ("Substitutions: ", 180, 270, len(substituted)),
+                                               ("Insertions: ", 350, 420, len(inserted))):
+            c.setFont('Helvetica-Bold', 11)
+            c.drawString(label_x, y, label)
+            c.setFont('Helvetica', 11)
+            c.drawString(value_x, y, str(count))
+        self.y -= 18
+
+    def _highlighted_word(self, x, word, background, foreground):
+        c = self.c
+        word_width = c.stringWidth(word, 'Helvetica', 11)
+        c.setFillColorRGB(*background)
+        c.setStrokeColorRGB(*background)
+        c.rect(x-2, self.y-2, word_width+4, 12, fill=1, stroke=0)
+        c.setFillColorRGB(*foreground)
+        c.drawString(x, self.y, word)
+        return word_width
+
+    def draw_detailed_differences(self, data):
+        # Detailed Word Differences (as paragraph, with improved highlights)
+        self.section_heading("Detailed Word Differences", 14)
+        c = self.c
+        c.setFont('Helvetica', 11)
+        word_diffs = data['wer_results'].get('word_differences', [])
+        x = start_x = 40
+        max_x = self.width - 40
+        space_width = c.stringWidth(' ', 'Helvetica', 11)
+        i = 0
+        while i < len(word_diffs):
+            diff = word_diffs[i]
+            # Substitution: deleted followed by inserted (correction)
+            if (diff.get('type') == 'deleted' and i+1 < len(word_diffs) and word_diffs[i+1].get('type') == 'inserted'):
+                # Original (yellow background), then the correction in blue with an underline
+                x += self._highlighted_word(x, diff['text'], (0.996, 0.953, 0.78), (0.7, 0.27, 0.04)) + space_width
+                corr_word = word_diffs[i+1]['text']
+                corr_width = c.stringWidth(corr_word, 'Helvetica', 11)
+                c.setFillColorRGB(0.12, 0.25, 0.67)
+                c.drawString(x, self.y, corr_word)
+                c.setStrokeColorRGB(0.12, 0.51, 0.96)
+                c.setLineWidth(2)
+                c.line(x, self.y-1, x+corr_width, self.y-1)
+                x += corr_width + space_width
+                i += 2
+            elif diff.get('type') == 'substituted':
+                x += self._highlighted_word(x, diff['text'], (0.996, 0.953, 0.78), (0.7, 0.27, 0.04)) + space_width
+                i += 1
+            elif diff.get('type') == 'inserted':
+                # Italic with a strikethrough
+                word_width = c.stringWidth(diff['text'], 'Helvetica-Oblique', 11)
+                c.setFont('Helvetica-Oblique', 11)
+                c.setFillColorRGB(0, 0, 0)
+                c.drawString(x, self.y, diff['text'])
+                c.setStrokeColorRGB(0, 0, 0)
+                c.setLineWidth(1)
+                c.line(x, self.y+2, x+word_width, self.y+2)
+                x += word_width + space_width
+                c.setFont('Helvetica', 11)
+                i += 1
+            elif diff.get('type') == 'deleted':
+                x += self._highlighted_word(x, diff['text'], (0.725, 0.11, 0.11), (1, 1, 1)) + space_width
+                i += 1
+            else:
+                c.setFillColorRGB(0, 0, 0)
+                c.drawString(x, self.y, diff['text'])
+                x += c.stringWidth(diff['text'], 'Helvetica', 11) + space_width
+                i += 1
+            # Wrap to next line if needed
+            if x > max_x:
+                x = start_x
+                self.y -= 16
+                if self.y < 60:
+                    self.new_page()
+                    c.setFont('Helvetica', 11)
+        self.y -= 18
+
+    def draw_edit_operations(self, data):
+        # Edit Operations Table (horizontal, comma-separated, with wrapping)
+        self.section_heading("Edit Operations Table", 14)
+        c = self.c
+        col_words = count_edit_operations(data['wer_results'].get('word_differences', []))
+        c.setFont('Helvetica-Bold', 11)
+        col_width = (self.width - 80) // 3
+        col_xs = [40, 40 + col_width, 40 + 2*col_width]
+        col_titles = ["Substituted:", "Inserted:", "Deleted:"]
+        col_colors = [(0.8, 0.6, 0), (0, 0, 0), (0.8, 0, 0)]
+        for idx, (title, color) in enumerate(zip(col_titles, col_colors)):
+            c.setFillColorRGB(*color)
+            c.drawString(col_xs[idx], self.y, title)
+        self.y -= 14
+        # Wrap each column into lines first, then draw row by row so long tables can break pages
+        columns = []
+        for words in col_words:
+            lines, line = [], ''
+            for w in words:
+                w_str = w + ', '
+                if c.stringWidth(line + w_str, 'Helvetica', 10) > col_width - 10 and line:
+                    lines.append(line.rstrip(', '))
+                    line = ''
+                line += w_str
+            if line:
+                lines.append(line.rstrip(', '))
+            columns.append(lines)
+        c.setFont('Helvetica', 10)
+        for row in range(max(len(lines) for lines in columns)):
+            for idx, lines in enumerate(columns):
+                if row < len(lines):
+                    c.setFillColorRGB(*col_colors[idx])
+                    c.drawString(col_xs[idx], self.y, lines[row])
+            self.y -= 12
+            if self.y < 60:
+                self.new_page()
+                c.setFont('Helvetica', 10)
+        self.y -= 18
+
+    def draw_statistics(self, data):
+        stats = data['wer_results'].get('statistics', {})
+        if not stats:
+            return
+        self.section_heading("Statistics", 14)
+        c = self.c
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont('Helvetica-Bold', 11)
+        c.drawString(40, self.y, "Metric"); c.drawString(180, self.y, "Transcribed"); c.drawString(320, self.y, "Reference")
+        self.y -= 14
+        c.setFont('Helvetica', 11)
+        for metric, values in stats.items():
+            c.drawString(40, self.y, str(metric))
+            c.drawString(180, self.y, str(values.get('transcribed', '')))
+            c.drawString(320, self.y, str(values.get('reference', '')))
+            self.y -= 14
+            if self.y < 60:
+                self.new_page()
+                c.setFont('Helvetica', 11)
+        self.y -= 10
+
+    def _nlp_line(self, text):
+        self.c.drawString(65, self.y, text)
+        self.y -= 11
+        if self.y < 60:
+            self.new_page()
+            self.c.setFont('Helvetica', 10)
+
+    def draw_nlp_results(self, data):
+        nlp_results = data['nlp_results']
+        if not nlp_results:
+            return
+        self.section_heading("NLP Analysis Results", 14)
+        c = self.c
+        c.setFillColorRGB(0, 0, 0)
+        for label, nlp in nlp_results.items():
+            self.ensure_space(90)
+            c.setFont('Helvetica-Bold', 12)
+            c.drawString(40, self.y, f"{label.title()} Analysis:")
+            self.y -= 14
+            for key, value in nlp.items():
+                self.ensure_space(72)
+                c.setFont('Helvetica-Bold', 10)
+                c.drawString(50, self.y, f"{key.replace('_', ' ').title()}:")
+                self.y -= 12
+                c.setFont('Helvetica', 10)
+                if isinstance(value, list):
+                    # Print horizontally with bullets, wrap as needed
+                    line = ''
+                    for v in value:
+                        item = f"• {v} "
+                        if len(line) + len(item) > 100:
+                            self._nlp_line(line.strip())
+                            line = ''
+                        line += item
+                    if line:
+                        self._nlp_line(line.strip())
+                else:
+                    for line in iter_text_lines(str(value)):
+                        self._nlp_line(line)
+                self.y -= 4
+            self.y -= 8
+
+    def draw_visualizations(self, data):
+        # Plots (avoid cutting off last graph)
+        self.section_heading("Visualizations", 14)
+        c = self.c
+        vector_charts = self.chart_backend == 'vector'
+        if vector_charts:
+            # Drawn from the texts as vector graphics, no Kaleido needed
+            charts = pdf_charts.build_charts(normalize_text(data['reference_text']),
+                                             normalize_text(data['transcribed_text']))
+        else:
+            # Higher resolution images (scale=3): cached per analysis, misses rendered in parallel
+            from plot_cache import plot_image_cache
+            plots = data['wer_results'].get('plots', {})
+            charts = plot_image_cache.get_many(data['id'], {name: plots[name] for name in PDF_PLOT_NAMES if name in plots},
+                                               scale=3)
+        for plot_name in PDF_PLOT_NAMES:
+            if plot_name not in charts:
+                continue
+            try:
+                chart = charts[plot_name]
+                if isinstance(chart, Exception):
+                    raise chart
+                # Check if enough space is left, else start new page
+                self.ensure_space(220)
+                # Center chart
+                if vector_charts:
+                    pdf_charts.draw_chart(c, chart, self.width/2-150, self.y-180)
+                else:
+                    c.drawImage(ImageReader(io.BytesIO(chart)), self.width/2-125, self.y-180, width=250, height=150)
+                self.y -= 180
+                c.setFillColorRGB(0, 0, 0)
+                c.setFont('Helvetica-Oblique', 10)
+                c.drawCentredString(self.width/2, self.y-10, plot_name.replace('_', ' ').title())
+                self.y -= 30
+                if self.y < 100 and plot_name != PDF_PLOT_NAMES[-1]:
+                    self.new_page()
+            except PageLimitReached:
+                raise
+            except Exception as e:
+                print(f'PDF PLOT ERROR ({plot_name}):', e)
+                self.placeholder(f"[{plot_name.replace('_', ' ').title()} not available]", 30)
+                self.y -= 4
+
+
+def write_report(transcription, output, mode: str = 'full', max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+                 chart_backend: str = 'vector') -> ReportBuilder:
+    """Write one analysis report to a file-like object"""
+    builder = ReportBuilder(output, mode, max_pages, chart_backend)
+    with timed('pdf_render'):
+        builder.build(report_data(transcription, chart_backend))
+    return builder
+
+
+def iter_file(file, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a file's contents in chunks and close it at the end"""
+    try:
+        file.seek(0)
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+def render_report(transcription, mode: str = 'full', max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+                  chart_backend: str = 'vector') -> Iterator[bytes]:
+    """Build the report into a spooled temp file and return a chunk iterator over it"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        write_report(transcription, spool, mode, max_pages, chart_backend)
+    except Exception:
+        spool.close()
+        raise
+    return iter_file(spool)
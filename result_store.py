@@ -0,0 +1,106 @@
+"""Server-side store for intermediate results between requests.
+
+An upload, a transcript or an NLP result is kept here under an opaque
+random id, so the browser only carries that id: in the JSON body of the
+next call, or, for the upload -> transcribe steps, in the cookie session.
+Before this, the cookie carried the payload itself. Entries live in their
+own SQLite file (WAL, so every app process shares it) and expire after
+RESULT_TTL_SECONDS. Expired rows are invisible to reads right away and are
+deleted in bulk at most once per PURGE_INTERVAL.
+"""
+import os
+import json
+import time
+import sqlite3
+import secrets
+import threading
+from typing import Dict, Optional
+
+KINDS = ('upload', 'text', 'nlp')
+DEFAULT_TTL_SECONDS = 3600
+PURGE_INTERVAL = 60
+
+
+class ResultNotFound(LookupError):
+    """The id is unknown, of another kind, or has expired"""
+
+    def __init__(self, kind: str, result_id: str):
+        super().__init__(f'Unknown or expired {kind} id: {result_id}')
+        self.kind = kind
+        self.result_id = result_id
+
+
+class ResultStore:
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; SQLite connections must not be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'path', None) != self.path:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS result ('
+                         'id TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, '
+                         'created REAL NOT NULL, expires REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_result_expires ON result (expires)')
+            self._local.conn, self._local.path = conn, self.path
+        return conn
+
+    def put(self, kind: str, value, ttl: Optional[float] = None) -> str:
+        """Store a JSON-serializable value and return its new id"""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown result kind '{kind}', expected one of: {', '.join(KINDS)}")
+        result_id = secrets.token_urlsafe(16)
+        now = time.time()
+        self._connection().execute('INSERT INTO result (id, kind, value, created, expires) VALUES (?, ?, ?, ?, ?)',
+                                   (result_id, kind, json.dumps(value), now, now + (ttl or self.ttl)))
+        self._maybe_purge(now)
+        return result_id
+
+    def get(self, result_id: str, kind: str):
+        """The stored value, or None when the id is unknown, of another kind or expired"""
+        if not result_id:
+            return None
+        row = self._connection().execute('SELECT value FROM result WHERE id = ? AND kind = ? AND expires > ?',
+                                         (str(result_id), kind, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def require(self, result_id: str, kind: str):
+        """Like get, but raises ResultNotFound instead of returning None"""
+        value = self.get(result_id, kind)
+        if value is None:
+            raise ResultNotFound(kind, result_id)
+        return value
+
+    def delete(self, result_id: str):
+        self._connection().execute('DELETE FROM result WHERE id = ?', (str(result_id),))
+
+    def purge_expired(self) -> int:
+        return self._connection().execute('DELETE FROM result WHERE expires <= ?', (time.time(),)).rowcount
+
+    def _maybe_purge(self, now: float):
+        with self._lock:
+            if now - self._last_purge < PURGE_INTERVAL:
+                return
+            self._last_purge = now
+        try:
+            self.purge_expired()
+        except sqlite3.OperationalError as e:
+            # Another process holds the write lock; the next put retries
+            print('RESULT STORE PURGE ERROR:', e)
+
+    def stats(self) -> Dict:
+        rows = self._connection().execute('SELECT kind, COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM result '
+                                          'WHERE expires > ? GROUP BY kind', (time.time(),)).fetchall()
+        return {kind: {'entries': count, 'bytes': size} for kind, count, size in rows}
+
+
+result_store = ResultStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'results.db'))
@@ -0,0 +1,43 @@
+import random
+
+import numpy as np
+import pytest
+
+from token_store import TokenCorpus, build_corpus
+from wer_calculator import normalize_text, score_hypothesis, score_tokens
+
+
+def as_text(ids):
+    return ' '.join(f'w{token}' for token in ids)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_score_tokens_matches_werpy(seed):
+    # Small vocabularies make many equally cheap alignments, where the S/D/I split depends on tie-breaking
+    rng = random.Random(seed)
+    for _ in range(400):
+        vocabulary = rng.choice([2, 3, 5, 20])
+        ref = [rng.randrange(vocabulary) for _ in range(rng.randint(1, 30))]
+        hyp = [rng.randrange(vocabulary) for _ in range(rng.randint(0, 30))]
+        expected = score_hypothesis(as_text(ref), as_text(hyp))
+        assert score_tokens(np.array(ref, dtype=np.uint32), np.array(hyp, dtype=np.int64)) == expected
+
+
+def test_corpus_scores_like_werpy(tmp_path):
+    reference = 'The quick brown fox jumps over the lazy dog.'
+    hypothesis = normalize_text('the quick brown fax jumps over lazy dog today')
+    build_corpus([('ref', reference), ('other', 'an unrelated document')], str(tmp_path))
+    corpus = TokenCorpus(str(tmp_path))
+
+    assert corpus.text('ref') == normalize_text(reference)
+    assert score_tokens(corpus.tokens('ref'), corpus.encode(hypothesis)) == \
+        score_hypothesis(normalize_text(reference), hypothesis)
+
+
+def test_unknown_words_never_match(tmp_path):
+    build_corpus([('ref', 'a b')], str(tmp_path))
+    corpus = TokenCorpus(str(tmp_path))
+    encoded = corpus.encode('a zz b zz yy')
+    assert encoded[0] == corpus.tokens('ref')[0]
+    assert encoded[1] == encoded[3] >= 2
+    assert encoded[4] not in (encoded[1], *corpus.tokens('ref'))
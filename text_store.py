@@ -0,0 +1,68 @@
+"""Content-addressed storage for reference and transcribed texts.
+
+Many analyses score different hypotheses against the same reference, so
+texts live once in the text_entry table keyed by their SHA-256 and
+Transcription rows keep only the hash. Reference counts are adjusted with
+SQLite upserts in the caller's transaction, like error_stats, so concurrent
+saves of the same text never race on a read-modify-write.
+"""
+import hashlib
+from collections import Counter
+from typing import Iterable
+from sqlalchemy import text, bindparam
+from extensions import db
+from models import Transcription, TextEntry
+
+TEXT_FIELDS = ('transcribed', 'reference')
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _acquire(contents: Counter):
+    """Insert new texts and add references to existing ones"""
+    if not contents:
+        return
+    db.session.execute(text(
+        'INSERT INTO text_entry (hash, content, refcount) VALUES (:hash, :content, :n) '
+        'ON CONFLICT (hash) DO UPDATE SET refcount = refcount + excluded.refcount'
+    ), [{'hash': content_hash(content), 'content': content, 'n': n} for content, n in contents.items()])
+
+
+def _release(hashes: Counter):
+    """Drop references and delete entries nobody points at any more"""
+    if not hashes:
+        return
+    db.session.execute(text('UPDATE text_entry SET refcount = refcount - :n WHERE hash = :hash'),
+                       [{'hash': h, 'n': n} for h, n in hashes.items()])
+    db.session.execute(text('DELETE FROM text_entry WHERE refcount <= 0 AND hash IN :hashes')
+                       .bindparams(bindparam('hashes', expanding=True)), {'hashes': list(hashes)})
+
+
+def intern_texts(transcriptions: Iterable[Transcription]):
+    """Copy-on-save: move the inline texts of new rows into the store"""
+    contents = Counter()
+    for transcription in transcriptions:
+        for field in TEXT_FIELDS:
+            inline = getattr(transcription, f'_{field}_text')
+            if inline:
+                contents[inline] += 1
+                setattr(transcription, f'_{field}_text', None)
+                setattr(transcription, f'{field}_hash', content_hash(inline))
+    _acquire(contents)
+
+
+def release_texts(transcriptions: Iterable[Transcription]):
+    """Release the stored texts of rows about to be deleted"""
+    hashes = Counter()
+    for transcription in transcriptions:
+        for field in TEXT_FIELDS:
+            text_hash = getattr(transcription, f'{field}_hash')
+            if text_hash:
+                hashes[text_hash] += 1
+    _release(hashes)
+
+
+def clear():
+    TextEntry.query.delete()
@@ -0,0 +1,198 @@
+"""Memory-mapped store of tokenized reference texts.
+
+Scoring a large evaluation set used to make every worker process load and
+tokenize the same reference documents. A corpus is built once instead. It
+is a directory holding:
+- tokens.npy: every normalized reference as uint32 word ids, back to back
+- offsets.npy: int64 start of each document, plus the total at the end
+- words.bin / word_offsets.npy: the UTF-8 words, concatenated in id order
+- word_hashes.npy / word_ids.npy: 64-bit word hashes, sorted, and their ids
+- index.json: document keys (absolute reference paths) in order
+
+Workers open every array with mmap_mode='r', so they share the same
+page-cache pages. A reference is a slice view of tokens.npy, and hypotheses
+are encoded by binary search over the hash array, so memory stays flat as
+workers are added; not even the vocabulary is loaded per process.
+
+    python token_store.py build uploads --output references.corpus
+    python batch_ingest.py uploads --corpus references.corpus
+"""
+import os
+import sys
+import json
+import array
+import hashlib
+import argparse
+import tempfile
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 2
+TOKEN_DTYPE = np.uint32
+COPY_CHUNK = 1 << 22  # tokens copied per step when finalizing
+
+
+def corpus_key(path: str) -> str:
+    return os.path.abspath(path)
+
+
+def word_hash(word: str) -> int:
+    return int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _write_vocabulary(words: List[str], output: str):
+    encoded = [word.encode('utf-8') for word in words]
+    with open(os.path.join(output, 'words.bin'), 'wb') as f:
+        f.write(b''.join(encoded))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(word) for word in encoded], out=offsets[1:])
+    np.save(os.path.join(output, 'word_offsets.npy'), offsets)
+    hashes = np.array([word_hash(word) for word in words], dtype=np.uint64)
+    order = np.argsort(hashes, kind='stable')
+    np.save(os.path.join(output, 'word_hashes.npy'), hashes[order])
+    np.save(os.path.join(output, 'word_ids.npy'), order.astype(TOKEN_DTYPE))
+
+
+def build_corpus(documents: Iterable[Tuple[str, str]], output: str) -> Dict:
+    """Normalize, tokenize and write (key, raw text) documents to the corpus directory output"""
+    from wer_calculator import normalize_text
+    os.makedirs(output, exist_ok=True)
+    vocab: Dict[str, int] = {}
+    keys: List[str] = []
+    offsets = array.array('q', [0])
+    # Tokens are streamed to a scratch file so building never holds the whole corpus
+    with tempfile.TemporaryFile(dir=output) as scratch:
+        for key, text in documents:
+            ids = array.array('I', (vocab.setdefault(word, len(vocab)) for word in normalize_text(text).split()))
+            ids.tofile(scratch)
+            keys.append(key)
+            offsets.append(offsets[-1] + len(ids))
+        scratch.flush()
+        total = offsets[-1]
+        tokens = np.lib.format.open_memmap(os.path.join(output, 'tokens.npy'), mode='w+',
+                                           dtype=TOKEN_DTYPE, shape=(total,))
+        scratch.seek(0)
+        for start in range(0, total, COPY_CHUNK):
+            count = min(COPY_CHUNK, total - start)
+            tokens[start:start + count] = np.fromfile(scratch, dtype=TOKEN_DTYPE, count=count)
+        tokens.flush()
+        del tokens
+    np.save(os.path.join(output, 'offsets.npy'), np.frombuffer(offsets, dtype=np.int64))
+    words = [''] * len(vocab)
+    for word, index in vocab.items():
+        words[index] = word
+    _write_vocabulary(words, output)
+    info = {'version': FORMAT_VERSION, 'documents': len(keys), 'tokens': total, 'vocabulary': len(words)}
+    with open(os.path.join(output, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(info, keys=keys), f)
+    return info
+
+
+class TokenCorpus:
+    """Read-only view of a corpus directory; arrays are memory-mapped, never copied"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported corpus version {index.get('version')}")
+        self.keys = index['keys']
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+        self.token_array = np.load(os.path.join(path, 'tokens.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.vocabulary_size = index['vocabulary']
+        self.word_offsets = np.load(os.path.join(path, 'word_offsets.npy'), mmap_mode='r')
+        self.word_hashes = np.load(os.path.join(path, 'word_hashes.npy'), mmap_mode='r')
+        self.word_ids = np.load(os.path.join(path, 'word_ids.npy'), mmap_mode='r')
+        # An empty vocabulary can't be memory-mapped (zero-length file)
+        words_path = os.path.join(path, 'words.bin')
+        self.words = np.memmap(words_path, dtype=np.uint8, mode='r') if os.path.getsize(words_path) \
+            else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    def word(self, token: int) -> str:
+        return bytes(self.words[int(self.word_offsets[token]):int(self.word_offsets[token + 1])]).decode('utf-8')
+
+    def tokens(self, key) -> np.ndarray:
+        """Token ids of a document by key or position, as a view into the memory map"""
+        position = key if isinstance(key, (int, np.integer)) else self._positions[key]
+        return self.token_array[int(self.offsets[position]):int(self.offsets[position + 1])]
+
+    def encode(self, normalized_text: str) -> np.ndarray:
+        """Ids of a normalized text in this corpus's vocabulary.
+
+        Words the corpus has never seen get ids past the vocabulary, so they
+        can never match a reference token.
+        """
+        words = normalized_text.split()
+        distinct = list(dict.fromkeys(words))
+        hashes = np.array([word_hash(word) for word in distinct], dtype=np.uint64)
+        positions = np.searchsorted(self.word_hashes, hashes)
+        ids, unknown = {}, 0
+        for word, value, position in zip(distinct, hashes.tolist(), positions.tolist()):
+            # Equal hashes sit next to each other; confirm the word itself to rule out a collision
+            while position < len(self.word_hashes) and int(self.word_hashes[position]) == value:
+                token = int(self.word_ids[position])
+                if self.word(token) == word:
+                    ids[word] = token
+                    break
+                position += 1
+            else:
+                ids[word] = self.vocabulary_size + unknown
+                unknown += 1
+        return np.array([ids[word] for word in words], dtype=np.int64)
+
+    def text(self, key) -> str:
+        """The normalized reference text"""
+        return ' '.join(self.word(token) for token in self.tokens(key).tolist())
+
+
+def _reference_documents(paths: List[str]) -> Iterable[Tuple[str, str]]:
+    from file_handler import FileHandler
+    from batch_ingest import REFERENCE_EXTENSIONS
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if os.path.splitext(name)[1].lower() in REFERENCE_EXTENSIONS)
+        else:
+            files.append(path)
+    handler = FileHandler(tempfile.gettempdir())
+    for path in files:
+        result = handler.process_file(path)
+        if result.get('error'):
+            print(f"Skipping {path}: {result['error']}")
+            continue
+        yield corpus_key(path), result['text']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or inspect a memory-mapped reference corpus')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Tokenize reference documents (.txt/.pdf/.docx, or directories of them)')
+    build.add_argument('references', nargs='+')
+    build.add_argument('--output', required=True, help='Corpus directory')
+    info = commands.add_parser('info', help='Print the size of a corpus')
+    info.add_argument('corpus')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        result = build_corpus(_reference_documents(args.references), args.output)
+    else:
+        corpus = TokenCorpus(args.corpus)
+        result = {'documents': len(corpus), 'tokens': len(corpus.token_array),
+                  'bytes': corpus.token_array.nbytes + corpus.offsets.nbytes}
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
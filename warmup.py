@@ -0,0 +1,102 @@
+"""Background loading of the heavy models and readiness reporting.
+
+app.py no longer loads Whisper or spaCy at import, so a worker can serve
+text-only routes (WER calculation, history, reports) within a second of
+starting. The models are loaded on a background thread, started by the
+first request a server process handles (WARMUP_ON_START; a /readyz probe
+is enough) or via POST /api/warmup, and /readyz reports which
+capabilities are ready so a load balancer can route ASR traffic only to
+warm workers. Importing app alone never starts it.
+"""
+import time
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+def _load_asr():
+    from asr_backends import get_backend
+    get_backend().load('base')
+
+
+def _asr_loaded() -> bool:
+    from asr_backends import get_backend
+    return get_backend().is_loaded('base')
+
+
+def _load_nlp():
+    from nlp_processor import ensure_nltk_data, load_spacy
+    ensure_nltk_data()
+    load_spacy()
+
+
+def _nlp_loaded() -> bool:
+    from nlp_processor import nlp_loaded
+    return nlp_loaded()
+
+
+def _load_plot_renderer():
+    from plot_renderer import plot_renderer
+    plot_renderer.warm()
+
+
+def _plot_renderer_started() -> bool:
+    from plot_renderer import plot_renderer
+    return plot_renderer.stats()['started']
+
+
+# Component -> (loader, check); 'asr' backs the transcription routes, 'nlp' /api/preprocess.
+# The checks also catch components a request loaded on its own.
+COMPONENTS: Dict[str, Tuple[Callable, Callable]] = {
+    'asr': (_load_asr, _asr_loaded),
+    'nlp': (_load_nlp, _nlp_loaded),
+    'plot_renderer': (_load_plot_renderer, _plot_renderer_started),
+}
+DEFAULT_COMPONENTS = ('asr', 'nlp')
+
+
+class Warmup:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = {name: {'status': 'cold'} for name in COMPONENTS}
+        self.started = False
+
+    def _load(self, name: str):
+        with self._lock:
+            if self.state[name]['status'] in ('loading', 'ready'):
+                return
+            self.state[name] = {'status': 'loading'}
+        start = time.perf_counter()
+        try:
+            COMPONENTS[name][0]()
+            result = {'status': 'ready', 'seconds': round(time.perf_counter() - start, 2)}
+        except Exception as e:
+            print(f'WARMUP ERROR ({name}):', e)
+            result = {'status': 'error', 'error': str(e)}
+        with self._lock:
+            self.state[name] = result
+
+    def start(self, components: Optional[Iterable[str]] = None) -> threading.Thread:
+        """Load the given components one after another on a daemon thread"""
+        components = list(components or DEFAULT_COMPONENTS)
+        unknown = [name for name in components if name not in COMPONENTS]
+        if unknown:
+            raise ValueError(f"Unknown warm-up components: {', '.join(unknown)}")
+        self.started = True
+        thread = threading.Thread(target=lambda: [self._load(name) for name in components],
+                                  name='warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, Dict]:
+        with self._lock:
+            state = {name: dict(value) for name, value in self.state.items()}
+        for name, value in state.items():
+            if value['status'] != 'ready' and COMPONENTS[name][1]():
+                state[name] = {'status': 'ready'}
+        return state
+
+    def is_ready(self, name: str) -> bool:
+        return self.status()[name]['status'] == 'ready'
+
+
+warmup = Warmup()
@@ -1,11 +1,14 @@
-from werpy import wer
+from werpy import wer, metrics as wer_metrics
 import numpy as np
-from typing import Dict, List, Tuple
-import matplotlib.pyplot as plt
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
 import plotly.graph_objects as go
-import plotly.express as px
 from collections import Counter
 import difflib
+import json
+import re
+from metrics import timed
 
 def flatten_and_split(s):
     if isinstance(s, str):
@@ -21,6 +24,106 @@ def flatten_and_split(s):
     else:
         return []
 
+def normalize_text(text):
+    text = text.lower()
+    text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
+    text = re.sub(r'\s+', ' ', text).strip()  # Normalize whitespace
+    return text
+
+# Hypotheses are aligned on worker processes once reference x hypothesis words
+# exceed this; below it the pool round trip costs more than the alignment
+PARALLEL_MIN_CELLS = 4_000_000
+_alignment_pool = None
+_alignment_pool_lock = threading.Lock()
+
+def _alignment_executor():
+    global _alignment_pool
+    with _alignment_pool_lock:
+        if _alignment_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Spawned, not forked: the pool is first created from a request thread
+            _alignment_pool = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                                  mp_context=multiprocessing.get_context('spawn'))
+        return _alignment_pool
+
+def _discard_alignment_executor(pool):
+    """Drop a pool whose worker died; the next call starts a fresh one"""
+    global _alignment_pool
+    with _alignment_pool_lock:
+        if _alignment_pool is pool:
+            _alignment_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def score_hypothesis(reference: str, hypothesis: str) -> Dict:
+    """Levenshtein alignment counts of one normalized hypothesis (same alignment as calculate_wer)"""
+    if not hypothesis:
+        ref_count = len(reference.split())
+        return {'wer': 1.0 if ref_count else 0.0, 'substitutions': 0, 'deletions': ref_count, 'insertions': 0,
+                'hits': 0, 'reference_words': ref_count, 'hypothesis_words': 0}
+    score, distance, ref_count, insertions, deletions, substitutions = wer_metrics(reference, hypothesis)[:6]
+    return {
+        'wer': float(score),
+        'substitutions': int(substitutions),
+        'deletions': int(deletions),
+        'insertions': int(insertions),
+        'hits': int(ref_count) - int(substitutions) - int(deletions),
+        'reference_words': int(ref_count),
+        'hypothesis_words': len(hypothesis.split()),
+    }
+
+def score_tokens(ref_ids: np.ndarray, hyp_ids: np.ndarray) -> Dict:
+    """Levenshtein alignment counts of two integer token arrays, like score_hypothesis.
+
+    Fills the edit-distance matrix one reference row at a time in numpy, so
+    memory-mapped references are read in place, then walks back from the
+    end the way werpy does: a match, else a substitution, an insertion, a
+    deletion. Equally cheap alignments therefore split into the same S/D/I.
+    """
+    n, m = len(ref_ids), len(hyp_ids)
+    ramp = np.arange(m + 1, dtype=np.int64)
+    # Costs never exceed n + m; the full matrix is kept for the walk back, like werpy's
+    dist = np.empty((n + 1, m + 1), dtype=np.uint16 if n + m < 2 ** 16 else np.uint32)
+    dist[0] = ramp
+    prev = ramp.copy()
+    row = np.empty(m + 1, dtype=np.int64)
+    for i in range(n):
+        np.add(prev[:-1], hyp_ids != ref_ids[i], out=row[1:])
+        np.minimum(row[1:], prev[1:] + 1, out=row[1:])
+        row[0] = i + 1
+        # row[j] = min(row[j], row[j - 1] + 1) for all j at once
+        row -= ramp
+        np.minimum.accumulate(row, out=prev)
+        prev += ramp
+        dist[i + 1] = prev
+    substitutions = deletions = insertions = 0
+    i, j = n, m
+    while i > 0 and j > 0:
+        here = dist[i, j]
+        if ref_ids[i - 1] == hyp_ids[j - 1]:
+            i, j = i - 1, j - 1
+        elif here == dist[i - 1, j - 1] + 1:
+            substitutions += 1
+            i, j = i - 1, j - 1
+        elif here == dist[i, j - 1] + 1:
+            insertions += 1
+            j -= 1
+        else:
+            deletions += 1
+            i -= 1
+    deletions += i
+    insertions += j
+    cost = substitutions + deletions + insertions
+    return {
+        'wer': cost / n if n else float(m > 0),
+        'substitutions': substitutions,
+        'deletions': deletions,
+        'insertions': insertions,
+        'hits': n - substitutions - deletions,
+        'reference_words': n,
+        'hypothesis_words': m,
+    }
+
 class WERCalculator:
     def __init__(self):
         pass
@@ -45,8 +148,10 @@ class WERCalculator:
         return differences
 
     def analyze_texts(self, reference: str, hypothesis: str):
-        wer_score = self.calculate_wer(reference, hypothesis)
-        differences = self.get_word_differences(reference, hypothesis)
+        with timed('wer'):
+            wer_score = self.calculate_wer(reference, hypothesis)
+        with timed('alignment'):
+            differences = self.get_word_differences(reference, hypothesis)
         plots = {}
         for plot_name, plot_func in [
             ('confusion_matrix', self.generate_confusion_matrix),
@@ -57,7 +162,8 @@ class WERCalculator:
             ('bar_chart', self.generate_bar_chart)
         ]:
             try:
-                fig = plot_func(reference, hypothesis)
+                with timed(f'plot.{plot_name}'):
+                    fig = plot_func(reference, hypothesis)
                 plots[plot_name] = fig
             except Exception as e:
                 print(f"Failed to generate {plot_name}: {e}")
@@ -67,6 +173,177 @@ class WERCalculator:
             'plots': plots
         }
 
+    def build_results(self, reference: str, hypothesis: str) -> Dict:
+        """Analyze normalized texts and return the JSON-ready results used by the API and history"""
+        from plotly.utils import PlotlyJSONEncoder
+        analysis = self.analyze_texts(reference, hypothesis)
+
+        # Add word difference list and statistics for the frontend
+        ref_words = self.transformation(reference)
+        hyp_words = self.transformation(hypothesis)
+
+        # Word difference list (simple diff for now)
+        with timed('alignment'):
+            diff = list(difflib.ndiff(ref_words, hyp_words))
+        word_differences = []
+        for d in diff:
+            if d.startswith('- '):
+                word_differences.append({'type': 'deleted', 'text': d[2:]})
+            elif d.startswith('+ '):
+                word_differences.append({'type': 'inserted', 'text': d[2:]})
+            elif d.startswith('? '):
+                continue
+            else:
+                word_differences.append({'type': 'normal', 'text': d[2:]})
+
+        # Statistics
+        statistics = {
+            'Word Count': {
+                'transcribed': len(hyp_words),
+                'reference': len(ref_words)
+            },
+            'Unique Words': {
+                'transcribed': len(set(hyp_words)),
+                'reference': len(set(ref_words))
+            }
+        }
+
+        # Convert Plotly figures to JSON
+        plots_json = {}
+        with timed('plot_serialization'):
+            for key, fig in analysis['plots'].items():
+                plots_json[key] = json.loads(json.dumps(fig, cls=PlotlyJSONEncoder))
+
+        return {
+            'wer_score': analysis['wer_score'],
+            'differences': analysis['differences'],
+            'word_differences': word_differences,
+            'statistics': statistics,
+            'plots': plots_json
+        }
+
+    def compare_hypotheses(self, reference: str, hypotheses: Dict[str, str], parallel: Optional[bool] = None) -> Dict:
+        """Score several normalized hypotheses (name -> text) against one reference.
+
+        The reference is tokenized once; hypotheses are aligned on a process
+        pool when the texts are large (or parallel=True). Returns the
+        reference statistics, the ranking (best WER first, with S/D/I per
+        hypothesis) and combined Plotly figures.
+        """
+        ref_words = self.transformation(reference)
+        names = list(hypotheses)
+        if parallel is None:
+            cells = len(ref_words) * sum(len(hypotheses[name].split()) for name in names)
+            parallel = len(names) > 1 and cells >= PARALLEL_MIN_CELLS
+        with timed('alignment'):
+            scores = None
+            if parallel:
+                from concurrent.futures.process import BrokenProcessPool
+                executor = _alignment_executor()
+                try:
+                    scores = list(executor.map(score_hypothesis, [reference] * len(names),
+                                               [hypotheses[n] for n in names]))
+                except BrokenProcessPool as e:
+                    print(f"Alignment pool broke, scoring in process: {e}")
+                    _discard_alignment_executor(executor)
+            if scores is None:
+                scores = [score_hypothesis(reference, hypotheses[name]) for name in names]
+        ranking = sorted(({'name': name, **score} for name, score in zip(names, scores)),
+                         key=lambda row: (row['wer'], row['name']))
+        for rank, row in enumerate(ranking, 1):
+            row['rank'] = rank
+        plots = {}
+        for plot_name, plot_func in [
+            ('wer_ranking', self.generate_wer_ranking_chart),
+            ('error_breakdown', self.generate_error_breakdown_chart),
+            ('word_count_comparison', self.generate_hypothesis_length_chart),
+        ]:
+            try:
+                with timed(f'plot.{plot_name}'):
+                    plots[plot_name] = plot_func(ranking, len(ref_words), len(set(ref_words)))
+            except Exception as e:
+                print(f"Failed to generate {plot_name}: {e}")
+        return {
+            'reference': {'word_count': len(ref_words), 'unique_words': len(set(ref_words))},
+            'ranking': ranking,
+            'plots': plots,
+        }
+
+    def build_comparison_results(self, reference: str, hypotheses: Dict[str, str]) -> Dict:
+        """compare_hypotheses with the figures converted to JSON, for the API"""
+        from plotly.utils import PlotlyJSONEncoder
+        comparison = self.compare_hypotheses(reference, hypotheses)
+        with timed('plot_serialization'):
+            comparison['plots'] = {key: json.loads(json.dumps(fig, cls=PlotlyJSONEncoder))
+                                   for key, fig in comparison['plots'].items()}
+        return comparison
+
+    def calculate_wer_tokens(self, ref_ids: np.ndarray, hyp_ids: np.ndarray) -> float:
+        return score_tokens(ref_ids, hyp_ids)['wer']
+
+    def score_corpus(self, corpus, hypotheses: Dict[str, str]) -> Dict[str, Dict]:
+        """Score hypotheses (corpus key -> raw text) against a token_store.TokenCorpus.
+
+        References are read in place from the memory-mapped corpus; only the
+        hypotheses are normalized and encoded.
+        """
+        results = {}
+        for key, text in hypotheses.items():
+            with timed('wer'):
+                results[key] = score_tokens(corpus.tokens(key), corpus.encode(normalize_text(text)))
+        return results
+
+    def generate_wer_ranking_chart(self, ranking: List[Dict], ref_count: int, ref_unique: int) -> go.Figure:
+        names = [row['name'] for row in ranking]
+        fig = go.Figure([go.Bar(x=names, y=[row['wer'] for row in ranking],
+                                text=[f"{row['wer']:.1%}" for row in ranking], textposition='auto')])
+        fig.update_layout(
+            title='WER by Hypothesis',
+            yaxis_title='WER',
+            yaxis_tickformat='.0%',
+            autosize=True,
+            width=400,
+            height=350,
+            margin=dict(l=40, r=40, t=60, b=100),
+            xaxis_tickangle=-30
+        )
+        return fig
+
+    def generate_error_breakdown_chart(self, ranking: List[Dict], ref_count: int, ref_unique: int) -> go.Figure:
+        names = [row['name'] for row in ranking]
+        fig = go.Figure()
+        for key, label in (('substitutions', 'Substitutions'), ('deletions', 'Deletions'), ('insertions', 'Insertions')):
+            fig.add_trace(go.Bar(name=label, x=names, y=[row[key] for row in ranking]))
+        fig.update_layout(
+            title='Edit Operations by Hypothesis',
+            yaxis_title='Count',
+            barmode='stack',
+            autosize=True,
+            width=400,
+            height=350,
+            margin=dict(l=40, r=40, t=60, b=100),
+            xaxis_tickangle=-30
+        )
+        return fig
+
+    def generate_hypothesis_length_chart(self, ranking: List[Dict], ref_count: int, ref_unique: int) -> go.Figure:
+        names = [row['name'] for row in ranking]
+        fig = go.Figure()
+        fig.add_trace(go.Bar(name='Hypothesis Words', x=names, y=[row['hypothesis_words'] for row in ranking]))
+        fig.add_trace(go.Bar(name='Correct Words', x=names, y=[row['hits'] for row in ranking]))
+        fig.add_hline(y=ref_count, line_dash='dash', annotation_text=f'Reference ({ref_count} words)')
+        fig.update_layout(
+            title='Word Count Comparison',
+            yaxis_title='Words',
+            barmode='group',
+            autosize=True,
+            width=400,
+            height=350,
+            margin=dict(l=40, r=40, t=60, b=100),
+            xaxis_tickangle=-30
+        )
+        return fig
+
     def generate_confusion_matrix(self, reference: str, hypothesis: str) -> go.Figure:
         ref_words = self.transformation(reference)
         hyp_words = self.transformation(hypothesis)
@@ -210,16 +487,9 @@ class WERCalculator:
         # Compare deletions, substitutions, insertions (dummy values for now)
         ref_words = self.transformation(reference)
         hyp_words = self.transformation(hypothesis)
-        sm = difflib.SequenceMatcher(None, ref_words, hyp_words)
-        deletions = substitutions = insertions = 0
-        for tag, i1, i2, j1, j2 in sm.get_opcodes():
-            if tag == 'replace':
-                substitutions += max(i2 - i1, j2 - j1)
-            elif tag == 'delete':
-                deletions += i2 - i1
-            elif tag == 'insert':
-                insertions += j2 - j1
-        fig = go.Figure([go.Bar(x=['Deletions', 'Substitutions', 'Insertions'], y=[deletions, substitutions, insertions])])
+        counts = self.count_edit_operations(ref_words, hyp_words)
+        fig = go.Figure([go.Bar(x=['Deletions', 'Substitutions', 'Insertions'],
+                                y=[counts['deletions'], counts['substitutions'], counts['insertions']])])
         fig.update_layout(
             title='Edit Operations Bar Chart',
             yaxis_title='Count',
@@ -231,5 +501,17 @@ class WERCalculator:
         )
         return fig
 
+    def count_edit_operations(self, ref_words: List[str], hyp_words: List[str]) -> Dict[str, int]:
+        sm = difflib.SequenceMatcher(None, ref_words, hyp_words)
+        deletions = substitutions = insertions = 0
+        for tag, i1, i2, j1, j2 in sm.get_opcodes():
+            if tag == 'replace':
+                substitutions += max(i2 - i1, j2 - j1)
+            elif tag == 'delete':
+                deletions += i2 - i1
+            elif tag == 'insert':
+                insertions += j2 - j1
+        return {'deletions': deletions, 'substitutions': substitutions, 'insertions': insertions}
+
     def transformation(self, text: str):
         return text.split() 
\ No newline at end of file